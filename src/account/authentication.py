@@ -0,0 +1,128 @@
+# authentication.py
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.tiered_cache import TieredCache
+
+from .revocation import get_auth_cache_settings, token_denylist
+
+logger = logging.getLogger(__name__)
+
+# What authentication and the routers need; other fields load lazily on first access
+PRINCIPAL_FIELDS = ('id', 'is_active', 'is_staff', 'partition_key', 'tokens_valid_after')
+
+# Set by account.tokens.ShardedRefreshToken, so a principal miss reads only the user's shard
+PARTITION_KEY_CLAIM = 'partition_key'
+
+# Login time in epoch milliseconds, also set by ShardedRefreshToken: `iat` has whole seconds
+ISSUED_AT_MS_CLAIM = 'iat_ms'
+
+# In-process L1 over Redis; deletes are broadcast, so user writes reach every worker
+principal_cache = TieredCache()
+
+
+def principal_key(user_id):
+    return f"jwt_principal:{user_id}"
+
+
+def invalidate_principal(user_id):
+    principal_cache.delete(principal_key(user_id))
+
+
+def get_principal(user_id, partition_key=None):
+    """
+    The cached PRINCIPAL_FIELDS of a user, or None if there is no such user.
+    With the user's partition_key (a token claim) a miss reads one shard
+    instead of all of them.
+    """
+    key = principal_key(user_id)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+
+    fields = PRINCIPAL_FIELDS + (('password',) if api_settings.CHECK_REVOKE_TOKEN else ())
+    users = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+    if partition_key is not None:
+        users = users.for_partition(partition_key)
+    row = users.values(*fields).first()
+    if row is None:
+        return None
+
+    principal = {field: row[field] for field in PRINCIPAL_FIELDS}
+    if api_settings.CHECK_REVOKE_TOKEN:
+        # Only the hash the token claim is compared with is cached, never the password
+        principal['password_hash'] = get_md5_hash_password(row['password'])
+
+    principal_cache.set(key, principal, get_auth_cache_settings().get('PRINCIPAL_TIMEOUT', 60))
+    return principal
+
+
+def issued_before_watermark(token, principal):
+    """
+    True for tokens from a login at or before the user's last "log out
+    everywhere". The watermark keeps microseconds and the login time travels
+    in milliseconds, so logging back in within the same second works. Tokens
+    without that claim fall back to `iat`, rejecting that whole second.
+    """
+    watermark = principal.get('tokens_valid_after')
+    if watermark is None:
+        return False
+    issued_at_ms = token.get(ISSUED_AT_MS_CLAIM)
+    if issued_at_ms is None:
+        return token.get('iat', 0) <= int(watermark.timestamp())
+    return issued_at_ms <= int(watermark.timestamp() * 1000)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request user query.
+
+    The user's principal (PRINCIPAL_FIELDS) is cached for
+    JWT_AUTH_CACHE['PRINCIPAL_TIMEOUT'] seconds and dropped on every save of
+    the user, and request.user is a CustomUser built from it with the other
+    fields deferred. Revoked access tokens are rejected through the jti
+    denylist and the user's tokens_valid_after watermark, so a warm request
+    does no database or network I/O.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti and token_denylist.is_revoked(jti):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+        principal = get_principal(user_id, validated_token.get(PARTITION_KEY_CLAIM))
+        if principal is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not principal['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if issued_before_watermark(validated_token, principal):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != principal['password_hash']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return self.build_user(principal)
+
+    def build_user(self, principal):
+        """A CustomUser as if loaded with only(*PRINCIPAL_FIELDS)"""
+        field_names = [
+            field.attname for field in self.user_model._meta.concrete_fields
+            if field.attname in PRINCIPAL_FIELDS
+        ]
+        db = router.db_for_read(self.user_model, partition_key=principal['partition_key'])
+        return self.user_model.from_db(db, field_names, [principal[name] for name in field_names])
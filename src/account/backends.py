@@ -0,0 +1,60 @@
+# backends.py
+import logging
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .hashing import hashing_executor
+
+logger = logging.getLogger(__name__)
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend with the password check run in the hashing pool. A correct
+    password stored under an older hasher is rehashed (in the pool too) to
+    the first entry of PASSWORD_HASHERS and saved.
+    """
+
+    def get_credentials(self, username, kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        return UserModel, username
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel, username = self.get_credentials(username, kwargs)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Pay for a hash anyway, so response time does not tell which emails exist
+            hashing_executor.hash(password)
+            return None
+
+        valid, rehashed = hashing_executor.verify(password, user.password)
+        if valid and rehashed:
+            user.password = rehashed
+            user.save(update_fields=['password'])
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        UserModel, username = self.get_credentials(username, kwargs)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            await hashing_executor.ahash(password)
+            return None
+
+        valid, rehashed = await hashing_executor.averify(password, user.password)
+        if valid and rehashed:
+            user.password = rehashed
+            await user.asave(update_fields=['password'])
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,177 @@
+# hashing.py
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import Throttled
+
+logger = logging.getLogger(__name__)
+
+
+def get_hashing_settings():
+    return getattr(settings, 'PASSWORD_HASHING_POOL', {})
+
+
+class HashingSaturated(Throttled):
+    """Every hashing slot is taken; answered with 429 and Retry-After"""
+    default_detail = 'Too many sign-ins in progress, please retry shortly.'
+    default_code = 'hashing_saturated'
+
+
+def setup_worker():
+    # Spawned workers start from a bare interpreter; hashers read settings
+    import django
+    django.setup()
+
+
+def verify_password(password, encoded):
+    """
+    Runs in a pool process. Returns (valid, rehashed): rehashed is the
+    password under the preferred hasher when `encoded` uses another one
+    (or weaker parameters), else None.
+    """
+    valid, must_update = hashers.verify_password(password, encoded)
+    return valid, hashers.make_password(password) if valid and must_update else None
+
+
+def make_password(password):
+    """Runs in a pool process"""
+    return hashers.make_password(password)
+
+
+class HashingExecutor:
+    """
+    Password hashing in a pool of worker processes, so PBKDF2/scrypt work
+    neither holds the GIL nor competes with request threads for the web
+    worker's core.
+
+    At most WORKERS + QUEUE_SIZE hashes are in flight per web process. A
+    caller waits up to QUEUE_TIMEOUT for a slot and then gets
+    HashingSaturated (429), so a login storm is shed at the door instead of
+    queueing until every request times out. With ENABLED off, hashes run
+    inline in the calling thread.
+
+    Every web worker process has its own pool, so the effective bound on a
+    host is web workers x WORKERS hashing processes (and web workers x
+    (WORKERS + QUEUE_SIZE) slots). WORKERS defaults to a small fixed number
+    rather than the CPU count for that reason: size it so the product fits
+    the cores left over after the web workers themselves.
+    """
+    default_workers = 2
+
+    def __init__(self):
+        self._current = None  # (pool, slots, pid), replaced as one
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return get_hashing_settings().get('ENABLED', True)
+
+    def get_pool(self):
+        """
+        (pool, slots) from one snapshot, so a concurrent reset() cannot hand
+        a caller a pool without its semaphore. Created lazily under the
+        lock, and again after a fork: a pool cannot cross into a child process.
+        """
+        current = self._current
+        if current is None or current[2] != os.getpid():
+            with self._lock:
+                current = self._current
+                if current is None or current[2] != os.getpid():
+                    config = get_hashing_settings()
+                    workers = config.get('WORKERS') or self.default_workers
+                    queue_size = config.get('QUEUE_SIZE')
+                    if queue_size is None:
+                        queue_size = 2 * workers
+                    pool = ProcessPoolExecutor(
+                        max_workers=workers,
+                        mp_context=multiprocessing.get_context(config.get('START_METHOD', 'spawn')),
+                        initializer=setup_worker
+                    )
+                    current = self._current = (pool, threading.BoundedSemaphore(workers + queue_size), os.getpid())
+        return current[0], current[1]
+
+    def reset(self, pool=None):
+        """Drop a broken `pool` (by default the current one); the next hash starts a new one"""
+        with self._lock:
+            current = self._current
+            if current is None:
+                return
+            # Another caller may already have replaced the broken pool with a working one
+            if pool is None or current[0] is pool:
+                self._current = None
+        (pool or current[0]).shutdown(wait=False, cancel_futures=True)
+
+    def saturated(self):
+        config = get_hashing_settings()
+        logger.warning("Password hashing pool is saturated; shedding load with 429")
+        return HashingSaturated(wait=config.get('RETRY_AFTER', 1))
+
+    def start(self, pool, slots, function, args):
+        try:
+            future = pool.submit(function, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def run(self, function, *args):
+        if not self.enabled:
+            return function(*args)
+
+        pool, slots = self.get_pool()
+        if not slots.acquire(timeout=get_hashing_settings().get('QUEUE_TIMEOUT', 0.5)):
+            raise self.saturated()
+        try:
+            return self.start(pool, slots, function, args).result()
+        except BrokenProcessPool:
+            self.reset(pool)
+            raise
+
+    async def arun(self, function, *args):
+        """run() for async views: the event loop keeps serving while the pool hashes"""
+        if not self.enabled:
+            return function(*args)
+
+        pool, slots = self.get_pool()
+        if not slots.acquire(blocking=False) and not await self.await_slot(slots):
+            raise self.saturated()
+        try:
+            return await asyncio.wrap_future(self.start(pool, slots, function, args))
+        except BrokenProcessPool:
+            self.reset(pool)
+            raise
+
+    async def await_slot(self, slots):
+        """Wait for a slot in a thread, so the event loop neither blocks nor polls"""
+        timeout = get_hashing_settings().get('QUEUE_TIMEOUT', 0.5)
+        waiter = asyncio.get_running_loop().run_in_executor(None, functools.partial(slots.acquire, timeout=timeout))
+        try:
+            return await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # The thread may still get the slot after the request is gone; hand it back
+            waiter.add_done_callback(lambda future: future.result() and slots.release())
+            raise
+
+    def verify(self, password, encoded):
+        return self.run(verify_password, password, encoded)
+
+    async def averify(self, password, encoded):
+        return await self.arun(verify_password, password, encoded)
+
+    def hash(self, password):
+        return self.run(make_password, password)
+
+    async def ahash(self, password):
+        return await self.arun(make_password, password)
+
+
+hashing_executor = HashingExecutor()
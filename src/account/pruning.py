@@ -0,0 +1,159 @@
+# pruning.py
+import logging
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from core.performance_monitoring import PerformanceMetrics
+
+logger = logging.getLogger(__name__)
+
+
+def get_pruning_settings():
+    return getattr(settings, 'TOKEN_BLACKLIST_PRUNING', {})
+
+
+class ExpiredTokenPruner:
+    """
+    Deletes OutstandingToken rows, and their BlacklistedToken rows, that
+    expired before a fixed cutoff. An expired token already fails signature
+    validation, so these rows only slow down the lookups refresh and logout
+    make.
+
+    Rows are walked in primary-key order, one keyset batch per short
+    transaction, so locks are held for one batch at a time and never on a
+    live token. The batch size adapts toward TARGET_BATCH_SECONDS, and after
+    each batch the pruner sleeps THROTTLE_RATIO times as long as the batch
+    took. A run stops after MAX_RUNTIME_SECONDS and its state (cursor,
+    batch size, totals) lets the next run continue.
+    """
+    lock_key = 'token_pruning:lock'
+    min_batch_size = 100
+
+    def __init__(self, state=None, using=None):
+        config = get_pruning_settings()
+        self.using = using or router.db_for_write(OutstandingToken)
+        self.target_seconds = config.get('TARGET_BATCH_SECONDS', 0.1)
+        self.throttle_ratio = config.get('THROTTLE_RATIO', 1.0)
+        self.max_batch_size = config.get('MAX_BATCH_SIZE', 10000)
+        self.state = state or {
+            'cutoff': (timezone.now() - timedelta(seconds=config.get('GRACE_SECONDS', 3600))).isoformat(),
+            'last_id': 0,
+            'batch_size': config.get('BATCH_SIZE', 1000),
+            'outstanding_deleted': 0,
+            'blacklisted_deleted': 0,
+            'batches': 0,
+            'busy_seconds': 0.0,  # Time spent in batch transactions, excluding throttle sleeps
+            'started_at': timezone.now().isoformat(),
+            'sizes_before': self.get_table_sizes(),
+        }
+
+    @property
+    def cutoff(self):
+        return datetime.fromisoformat(self.state['cutoff'])
+
+    def get_table_sizes(self):
+        tables = [OutstandingToken._meta.db_table, BlacklistedToken._meta.db_table]
+        return PerformanceMetrics.get_table_sizes(tables=tables, using=self.using, pretty=False)
+
+    def prune_batch(self):
+        """Delete the next keyset batch; returns False once no expired rows are left"""
+        start = time.perf_counter()
+        with transaction.atomic(using=self.using):
+            ids = list(
+                OutstandingToken.objects.using(self.using)
+                .filter(id__gt=self.state['last_id'], expires_at__lte=self.cutoff)
+                .order_by('id')
+                .values_list('id', flat=True)[:self.state['batch_size']]
+            )
+            if not ids:
+                return False
+            # One range per table instead of the deletion collector's
+            # 100-row IN lists; the cascade is done by hand, so go first
+            in_range = {'id__gt': self.state['last_id'], 'id__lte': ids[-1], 'expires_at__lte': self.cutoff}
+            blacklisted, _ = BlacklistedToken.objects.using(self.using).filter(
+                **{f"token__{lookup}": value for lookup, value in in_range.items()}
+            ).delete()
+            outstanding = self.delete_outstanding(ids[-1])
+        elapsed = time.perf_counter() - start
+
+        self.state['last_id'] = ids[-1]
+        self.state['outstanding_deleted'] += outstanding
+        self.state['blacklisted_deleted'] += blacklisted
+        self.state['batches'] += 1
+        self.state['busy_seconds'] += elapsed
+
+        # Halve slow batches at once; grow fast ones gradually
+        batch_size = self.state['batch_size']
+        if elapsed > self.target_seconds:
+            batch_size = max(self.min_batch_size, batch_size // 2)
+        elif elapsed < self.target_seconds / 2:
+            batch_size = min(self.max_batch_size, batch_size + batch_size // 2)
+        self.state['batch_size'] = batch_size
+
+        time.sleep(elapsed * self.throttle_ratio)
+        return True
+
+    def delete_outstanding(self, last_id):
+        """
+        One ranged DELETE for the batch. Its blacklist rows are already gone,
+        but QuerySet.delete() would still load every row to look for them.
+        """
+        connection = connections[self.using]
+        quote = connection.ops.quote_name
+        expires_at = OutstandingToken._meta.get_field('expires_at')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {quote(OutstandingToken._meta.db_table)} "
+                f"WHERE {quote('id')} > %s AND {quote('id')} <= %s AND {quote(expires_at.column)} <= %s",
+                [self.state['last_id'], last_id, expires_at.get_db_prep_value(self.cutoff, connection)]
+            )
+            return cursor.rowcount
+
+    def run(self, max_seconds=None):
+        """Prune until done or `max_seconds` have passed; returns True when done"""
+        if max_seconds is None:
+            max_seconds = get_pruning_settings().get('MAX_RUNTIME_SECONDS', 60)
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            if not self.prune_batch():
+                return True
+        return False
+
+    def report(self):
+        deleted = self.state['outstanding_deleted'] + self.state['blacklisted_deleted']
+        busy = self.state['busy_seconds']
+        wall = (timezone.now() - datetime.fromisoformat(self.state['started_at'])).total_seconds()
+        return {
+            'cutoff': self.state['cutoff'],
+            'outstanding_deleted': self.state['outstanding_deleted'],
+            'blacklisted_deleted': self.state['blacklisted_deleted'],
+            'batches': self.state['batches'],
+            'rows_per_second': round(deleted / busy) if busy else 0,
+            'rows_per_second_throttled': round(deleted / wall) if wall else 0,
+            'table_bytes_before': self.state['sizes_before'],
+            'table_bytes_after': self.get_table_sizes(),
+        }
+
+    @classmethod
+    def acquire(cls):
+        """Only one pruning chain at a time; continuations refresh the lock"""
+        return cache.add(cls.lock_key, 1, cls.lock_timeout())
+
+    @classmethod
+    def refresh_lock(cls):
+        cache.set(cls.lock_key, 1, cls.lock_timeout())
+
+    @classmethod
+    def release(cls):
+        cache.delete(cls.lock_key)
+
+    @staticmethod
+    def lock_timeout():
+        # Outlives a run plus its re-queue, but frees the lock if a worker dies
+        return get_pruning_settings().get('MAX_RUNTIME_SECONDS', 60) * 5
@@ -0,0 +1,285 @@
+# revocation.py
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+logger = logging.getLogger(__name__)
+
+
+def get_auth_cache_settings():
+    return getattr(settings, 'JWT_AUTH_CACHE', {})
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings: no false negatives, `error_rate` false positives at `capacity`"""
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class RevocationUnavailable(APIException):
+    """The revocation could not be broadcast, so the token may still be accepted elsewhere"""
+    status_code = 503
+    default_detail = 'Logout could not be completed, please retry.'
+    default_code = 'revocation_unavailable'
+
+
+class TokenDenylist:
+    """
+    Revoked access-token jtis.
+
+    The exact record is one cache key per jti that expires with the token.
+    Each worker also keeps an in-process Bloom filter of revoked jtis, loaded
+    from a Redis sorted set (jti scored by expiry) and kept current over
+    pub/sub. A jti the filter has never seen is not revoked, so checking a
+    live token costs no I/O; filter hits (revoked tokens and rare false
+    positives) read the exact key. Without Redis, or while the listener is
+    disconnected, every check reads the exact key. A revocation that cannot
+    be published raises RevocationUnavailable rather than pass silently.
+    """
+    channel = 'jwt:revoked'
+    index_key = 'jwt:revoked:index'
+    key_prefix = 'jwt_revoked'
+
+    def __init__(self, alias=None):
+        self.alias = alias
+        self._bloom = None  # None until in sync with Redis
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    @property
+    def cache_alias(self):
+        return self.alias or get_auth_cache_settings().get('DENYLIST_CACHE_ALIAS', 'default')
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_redis_connection(self):
+        """Raw Redis client behind the cache alias, or None for non-Redis backends"""
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection(self.cache_alias)
+        except (ImportError, NotImplementedError):
+            return None
+
+    def make_key(self, jti):
+        return f"{self.key_prefix}:{jti}"
+
+    def revoke(self, jti, expires_at):
+        """Deny `jti` until `expires_at` (epoch seconds), after which the token is dead anyway"""
+        timeout = max(1, math.ceil(expires_at - time.time()))
+        # The exact key goes first: a worker whose filter has the jti must find it
+        self.cache.set(self.make_key(jti), 1, timeout)
+
+        bloom = self._bloom
+        if bloom is not None:
+            bloom.add(jti)
+
+        connection = self.get_redis_connection()
+        if connection is None:
+            return
+        # Workers whose filter misses the jti never read the exact key, so an
+        # unannounced revocation is not a revocation: retry, then fail loudly
+        retries = get_auth_cache_settings().get('BROADCAST_RETRIES', 3)
+        for attempt in range(retries + 1):
+            try:
+                pipeline = connection.pipeline(transaction=False)
+                pipeline.zadd(self.index_key, {jti: expires_at})
+                pipeline.publish(self.channel, jti)
+                pipeline.execute()
+                return
+            except Exception as e:
+                logger.error(f"Revocation broadcast failed for {jti} (attempt {attempt + 1}): {str(e)}")
+                if attempt < retries:
+                    time.sleep(0.05 * 2 ** attempt)
+        # Undo the exact key so the token is either revoked everywhere or
+        # nowhere, and the client can retry the logout with it
+        self.cache.delete(self.make_key(jti))
+        raise RevocationUnavailable()
+
+    def is_revoked(self, jti):
+        self.ensure_listener()
+        bloom = self._bloom
+        if bloom is not None and jti not in bloom:
+            return False
+        return self.cache.get(self.make_key(jti)) is not None
+
+    def load(self, connection):
+        """A filter holding every unexpired revoked jti"""
+        config = get_auth_cache_settings()
+        now = time.time()
+        connection.zremrangebyscore(self.index_key, '-inf', now)
+        jtis = connection.zrangebyscore(self.index_key, now, '+inf')
+
+        bloom = BloomFilter(
+            max(config.get('BLOOM_CAPACITY', 100000), 2 * len(jtis)),
+            config.get('BLOOM_ERROR_RATE', 0.001)
+        )
+        for jti in jtis:
+            bloom.add(jti.decode() if isinstance(jti, bytes) else jti)
+        return bloom
+
+    def ensure_listener(self):
+        if self._listener is not None:
+            return
+        with self._listener_lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self.listen, name='jwt-denylist-listener', daemon=True)
+            self._listener.start()
+
+    def listen(self):
+        """Keep this worker's filter in sync; rebuilt periodically so expired jtis drop out"""
+        backoff = 1
+        while True:
+            connection = self.get_redis_connection()
+            if connection is None:
+                return
+
+            try:
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                # Subscribe before loading, so no revocation falls between the two
+                pubsub.subscribe(self.channel)
+                self._bloom = self.load(connection)
+                rebuild_at = time.monotonic() + get_auth_cache_settings().get('BLOOM_REBUILD_SECONDS', 300)
+                backoff = 1
+
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        jti = message['data']
+                        self._bloom.add(jti.decode() if isinstance(jti, bytes) else jti)
+                    if time.monotonic() >= rebuild_at:
+                        self._bloom = self.load(connection)
+                        rebuild_at = time.monotonic() + get_auth_cache_settings().get('BLOOM_REBUILD_SECONDS', 300)
+            except Exception as e:
+                logger.warning(f"JWT denylist listener disconnected: {str(e)}")
+
+            # Revocations may be missed while disconnected: fall back to exact checks
+            self._bloom = None
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+token_denylist = TokenDenylist()
+
+
+def blacklist_outstanding_tokens(user_id, issued_before, batch_size=1000):
+    """
+    Blacklist the user's unexpired refresh tokens issued at or before
+    `issued_before`; returns how many were added. On PostgreSQL and SQLite
+    this is one INSERT ... SELECT on the user's shard, so no token id makes
+    a round trip; other backends insert keyset batches of `batch_size`.
+    """
+    from .tokens import get_token_owner
+
+    using, _principal = get_token_owner(user_id)
+    connection = connections[using]
+    now = timezone.now()
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return blacklist_outstanding_token_batches(using, user_id, issued_before, now, batch_size)
+
+    qn = connection.ops.quote_name
+    outstanding, blacklisted = OutstandingToken._meta, BlacklistedToken._meta
+    column = lambda meta, name: qn(meta.get_field(name).column)
+    prep = lambda name, value: outstanding.get_field(name).get_db_prep_value(value, connection)
+    with connection.cursor() as cursor:
+        # NOT EXISTS skips tokens blacklisted earlier; ON CONFLICT those a
+        # concurrent logout or rotation blacklists while this runs
+        cursor.execute(
+            f"INSERT INTO {qn(blacklisted.db_table)} "
+            f"({column(blacklisted, 'token')}, {column(blacklisted, 'blacklisted_at')}) "
+            f"SELECT outstanding.{qn('id')}, %s FROM {qn(outstanding.db_table)} outstanding "
+            f"WHERE outstanding.{column(outstanding, 'user')} = %s "
+            f"AND outstanding.{column(outstanding, 'created_at')} <= %s "
+            f"AND outstanding.{column(outstanding, 'expires_at')} > %s "
+            f"AND NOT EXISTS (SELECT 1 FROM {qn(blacklisted.db_table)} blacklisted "
+            f"WHERE blacklisted.{column(blacklisted, 'token')} = outstanding.{qn('id')}) "
+            f"ON CONFLICT ({column(blacklisted, 'token')}) DO NOTHING",
+            [
+                blacklisted.get_field('blacklisted_at').get_db_prep_value(now, connection),
+                prep('user', user_id),
+                prep('created_at', issued_before),
+                prep('expires_at', now),
+            ]
+        )
+        return cursor.rowcount
+
+
+def blacklist_outstanding_token_batches(using, user_id, issued_before, now, batch_size):
+    """Portable fallback: walk the user's pending tokens by primary key, one bulk INSERT per batch"""
+    pending = OutstandingToken.objects.using(using).filter(
+        user_id=user_id,
+        created_at__lte=issued_before,
+        expires_at__gt=now,
+        blacklistedtoken__isnull=True
+    ).order_by('id')
+    added, last_id = 0, 0
+    while True:
+        ids = list(pending.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return added
+        # ignore_conflicts: a concurrent logout or rotation may blacklist the same token
+        BlacklistedToken.objects.using(using).bulk_create(
+            [BlacklistedToken(token_id=token_id, blacklisted_at=now) for token_id in ids],
+            ignore_conflicts=True
+        )
+        added += len(ids)
+        last_id = ids[-1]
+
+
+def revoke_user_tokens(user_id, partition_key=None):
+    """
+    "Log out everywhere" in O(1): move the user's tokens_valid_after
+    watermark to now, which authentication and token refresh enforce from
+    the next request on. Blacklisting the outstanding refresh tokens only
+    keeps the blacklist tables complete, so by default it runs in Celery
+    after commit. Returns (watermark, tokens blacklisted or None if deferred).
+    """
+    from .authentication import get_principal, invalidate_principal
+    from .tasks import blacklist_outstanding_tokens_task
+
+    watermark = timezone.now()
+    users = get_user_model().objects.filter(pk=user_id)
+    principal = get_principal(user_id, partition_key)
+    if principal is not None:
+        # Straight to the user's shard instead of an UPDATE on every shard
+        users = users.for_partition(principal['partition_key'])
+    users.update(tokens_valid_after=watermark)
+    # update() sends no post_save, so drop the cached principal here
+    invalidate_principal(user_id)
+
+    if get_auth_cache_settings().get('DEFER_LOGOUT_ALL_BLACKLIST', True):
+        transaction.on_commit(
+            lambda: blacklist_outstanding_tokens_task.delay(str(user_id), watermark.isoformat())
+        )
+        return watermark, None
+    return watermark, blacklist_outstanding_tokens(user_id, watermark)
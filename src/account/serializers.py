@@ -1,19 +1,25 @@
 
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from core.models import CustomUser
-from django.contrib.auth import login,authenticate
+from django.contrib.auth import aauthenticate, authenticate
+from .authentication import PARTITION_KEY_CLAIM, get_principal, issued_before_watermark
+from .hashing import hashing_executor
+from .tokens import ShardedRefreshToken
 
 
 class RegisterSerializer(serializers.ModelSerializer):
-    password1=serializers.CharField(write_only=True)
-    password2=serializers.CharField(write_only=True)
+    password1=serializers.CharField(write_only=True, trim_whitespace=False)
+    password2=serializers.CharField(write_only=True, trim_whitespace=False)
 
     class Meta:
         model=CustomUser
         fields=['first_name','last_name','email','bio','profile_pic','password1','password2']
 
     def validate(self, attrs):
-        if len(attrs['passwords1'])!=len(attrs['password']) or attrs['password1']!=attrs['password2']:
+        if attrs['password1']!=attrs['password2']:
             raise serializers.ValidationError('Passwords not matched please check you password ')
         if attrs['first_name']==attrs['last_name']:
             raise serializers.ValidationError('First name and last name not be the same ')
@@ -21,21 +27,20 @@ class RegisterSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
-        password=validated_data('password1').pop()
-        validated_data('password2').pop()
-        user=CustomUser.objects.create_user(password=password,**validated_data)
+        # Views hash in the pool beforehand and pass password_hash to save()
+        password=validated_data.pop('password1')
+        validated_data.pop('password2')
+        if 'password_hash' not in validated_data:
+            validated_data['password_hash']=hashing_executor.hash(password)
+        user=CustomUser.objects.create_user(**validated_data)
         return user
 
 
-class LoginSerializer(serializers.ModelSerializer):
-    email=serializers.CharField(write_only=True)
-    password=serializers.CharField(write_only=True)
-
-    def validate(self, attrs):
-        email=attrs.get('email')
-        password=attrs.get('password')
-        user=authenticate(email=email,password=password)
+class LoginSerializer(serializers.Serializer):
+    email=serializers.EmailField(write_only=True)
+    password=serializers.CharField(write_only=True, trim_whitespace=False)
 
+    def check_user(self, attrs, user):
         if user is None:
             raise serializers.ValidationError('Invalid username or password')
 
@@ -43,4 +48,26 @@ class LoginSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('User is disabled ')
 
         attrs['user']=user
-        return attrs
\ No newline at end of file
+        return attrs
+
+    def validate(self, attrs):
+        user=authenticate(self.context.get('request'),email=attrs['email'],password=attrs['password'])
+        return self.check_user(attrs, user)
+
+    async def acheck_credentials(self, attrs):
+        """validate() for async views, on to_internal_value() attrs: the password check awaited in the hashing pool"""
+        user=await aauthenticate(self.context.get('request'),email=attrs['email'],password=attrs['password'])
+        return self.check_user(attrs, user)
+
+
+class WatermarkTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses refresh tokens issued before the user's last "log out everywhere" """
+    token_class = ShardedRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
+        principal = get_principal(user_id, refresh.get(PARTITION_KEY_CLAIM)) if user_id else None
+        if principal is not None and issued_before_watermark(refresh, principal):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return super().validate(attrs)
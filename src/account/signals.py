@@ -0,0 +1,13 @@
+# signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import CustomUser
+
+from .authentication import invalidate_principal
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_cached_principal(sender, instance, **kwargs):
+    """Deactivation, staff changes and deletes take effect on the next request, on every worker"""
+    invalidate_principal(instance.pk)
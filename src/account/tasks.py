@@ -0,0 +1,62 @@
+import logging
+from datetime import datetime
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, acks_late=True, max_retries=5, default_retry_delay=30)
+def blacklist_outstanding_tokens_task(self, user_id, issued_before):
+    """Blacklist rows for a "log out everywhere"; the watermark already rejects these tokens"""
+    from .revocation import blacklist_outstanding_tokens
+
+    try:
+        return blacklist_outstanding_tokens(user_id, datetime.fromisoformat(issued_before))
+    except Exception as e:
+        raise self.retry(exc=e)
+
+
+@shared_task(bind=True, acks_late=True, max_retries=5, default_retry_delay=30)
+def prune_expired_tokens_task(self, state=None, databases=None):
+    """
+    Scheduled cleanup of expired refresh tokens, a time-boxed run at a time:
+    re-queues itself with its cursor until done, then logs the report and
+    moves on to the next database holding token rows (one per shard).
+    """
+    from .pruning import ExpiredTokenPruner
+    from .tokens import get_token_databases
+
+    if databases is None:
+        if not ExpiredTokenPruner.acquire():
+            logger.info("Token pruning is already running; skipping this run")
+            return None
+        databases = get_token_databases()
+
+    pruner = ExpiredTokenPruner(state, using=databases[0])
+    try:
+        complete = pruner.run()
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            ExpiredTokenPruner.release()
+            raise
+        raise self.retry(exc=e, kwargs={'state': pruner.state, 'databases': databases})
+
+    if not complete:
+        ExpiredTokenPruner.refresh_lock()
+        prune_expired_tokens_task.delay(pruner.state, databases)
+        return None
+
+    report = pruner.report()
+    logger.info(
+        f"Pruned {report['outstanding_deleted']} outstanding and {report['blacklisted_deleted']} "
+        f"blacklisted tokens on {databases[0]} in {report['batches']} batches ({report['rows_per_second']} rows/s, "
+        f"{report['rows_per_second_throttled']} rows/s throttled); "
+        f"table bytes {report['table_bytes_before']} -> {report['table_bytes_after']}"
+    )
+    if len(databases) > 1:
+        ExpiredTokenPruner.refresh_lock()
+        prune_expired_tokens_task.delay(None, databases[1:])
+    else:
+        ExpiredTokenPruner.release()
+    return report
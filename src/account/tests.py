@@ -1,3 +1,341 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+import fakeredis
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from redis import Redis
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import CustomUser
+from core.sharding import get_shard_map
+from core.testing import ShardedTestCase
+
+from .authentication import invalidate_principal
+from .hashing import HashingSaturated, hashing_executor
+from .pruning import ExpiredTokenPruner
+from .revocation import blacklist_outstanding_token_batches, blacklist_outstanding_tokens, token_denylist
+from .throttling import SlidingWindowLimiter
+
+# Fast hashes inline: these tests are about routing, not the hashing pool
+FAST_HASHING = {
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    'PASSWORD_HASHING_POOL': {'ENABLED': False},
+}
+
+
+class AccountTestCase(ShardedTestCase):
+    password = 'correct-horse-battery'
+
+    def setUp(self):
+        # Throttle counters and cached principals live in the caches
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        self.user = CustomUser.objects.create_user(
+            'sharded.user@example.com', self.password, first_name='Ada', last_name='Lovelace'
+        )
+        self.shard = get_shard_map().shard_for(self.user.partition_key)
+
+    def login(self, email=None, password=None):
+        return self.client.post(
+            '/api/login/',
+            {'email': email or self.user.email, 'password': password or self.password},
+            content_type='application/json'
+        )
+
+    def auth(self, access_token):
+        return {'HTTP_AUTHORIZATION': f"Bearer {access_token}"}
+
+
+@override_settings(**FAST_HASHING)
+class ShardedLoginTests(AccountTestCase):
+    """Run with --settings=src.settings_sharded to put users on separate shard databases"""
+
+    def test_unhinted_reads_find_a_sharded_user(self):
+        self.assertStoredOn(self.user, self.shard)
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk), self.user)
+        self.assertTrue(CustomUser.objects.filter(email=self.user.email).exists())
+        self.assertEqual(CustomUser.objects.filter(pk=self.user.pk).count(), 1)
+
+    def test_login_refresh_and_logout(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200, response.content)
+        tokens = response.json()
+        # The outstanding token sits next to the user its foreign key points at
+        self.assertStoredOn(OutstandingToken.objects.using(self.shard).get(user=self.user), self.shard)
+
+        response = self.client.get('/leads/', **self.auth(tokens['access_token']))
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.client.post(
+            '/api/token/refresh/', {'refresh': tokens['refresh_token']}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        rotated = response.json()
+        self.assertTrue(BlacklistedToken.objects.using(self.shard).filter(token__user=self.user).exists())
+
+        response = self.client.post(
+            '/api/token/refresh/', {'refresh': tokens['refresh_token']}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.post(
+            '/api/logout/', {'refresh_token': rotated['refresh']},
+            content_type='application/json', **self.auth(tokens['access_token'])
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.get('/leads/', **self.auth(tokens['access_token']))
+        self.assertEqual(response.status_code, 401)
+
+    def test_login_in_the_second_of_a_logout_everywhere(self):
+        before = self.login().json()
+        response = self.client.post('/api/logout-all/', **self.auth(before['access_token']))
+        self.assertEqual(response.status_code, 200, response.content)
+        time.sleep(0.002)
+        after = self.login().json()
+
+        # Pin the watermark a millisecond before the new login, in the same second as it
+        issued_at_ms = AccessToken(after['access_token'])['iat_ms']
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            tokens_valid_after=datetime.fromtimestamp((issued_at_ms - 1) / 1000, tz=timezone.utc)
+        )
+        invalidate_principal(self.user.pk)
+
+        self.assertEqual(self.client.get('/leads/', **self.auth(after['access_token'])).status_code, 200)
+        self.assertEqual(self.client.get('/leads/', **self.auth(before['access_token'])).status_code, 401)
+
+    def test_wrong_password_is_rejected(self):
+        self.assertEqual(self.login(password='wrong-password').status_code, 401)
+
+
+@override_settings(**FAST_HASHING)
+class RevocationBroadcastTests(AccountTestCase):
+    """Logout against a Redis whose zadd/publish pipeline fails"""
+
+    def setUp(self):
+        super().setUp()
+        self.tokens = self.login().json()
+        self.redis = mock.Mock()
+        # No listener thread: the mock only stands in for the broadcast
+        for patcher in (
+            mock.patch.object(token_denylist, 'ensure_listener'),
+            mock.patch.object(token_denylist, 'get_redis_connection', return_value=self.redis),
+            mock.patch('account.revocation.time.sleep'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def logout(self):
+        return self.client.post(
+            '/api/logout/', {'refresh_token': self.tokens['refresh_token']},
+            content_type='application/json', **self.auth(self.tokens['access_token'])
+        )
+
+    def jti(self):
+        return AccessToken(self.tokens['access_token'])['jti']
+
+    def test_failed_broadcast_fails_the_logout(self):
+        execute = self.redis.pipeline.return_value.execute
+        execute.side_effect = ConnectionError('redis is down')
+        self.assertEqual(self.logout().status_code, 503)
+        self.assertEqual(execute.call_count, 4)
+        # Nothing was revoked, so the client can retry the logout with the same tokens
+        self.assertFalse(BlacklistedToken.objects.using(self.shard).exists())
+        self.assertFalse(token_denylist.is_revoked(self.jti()))
+
+        execute.side_effect = None
+        self.assertEqual(self.logout().status_code, 200)
+        self.assertTrue(BlacklistedToken.objects.using(self.shard).exists())
+        self.assertTrue(token_denylist.is_revoked(self.jti()))
+        self.assertEqual(self.client.get('/leads/', **self.auth(self.tokens['access_token'])).status_code, 401)
+
+    def test_broadcast_is_retried(self):
+        execute = self.redis.pipeline.return_value.execute
+        execute.side_effect = [ConnectionError('redis blipped'), [1, 1]]
+        self.assertEqual(self.logout().status_code, 200)
+        self.assertEqual(execute.call_count, 2)
+
+
+@override_settings(**FAST_HASHING)
+class LoginThrottleTests(AccountTestCase):
+
+    @override_settings(LOGIN_THROTTLE={'RATES': {}, 'FAILURE_RATES': {'login': {'email': (3, 900)}}})
+    def test_only_failed_logins_count_against_the_email(self):
+        for _ in range(5):
+            self.assertEqual(self.login().status_code, 200)
+        for _ in range(3):
+            self.assertEqual(self.login(password='wrong-password').status_code, 401)
+        # Locked, even with the right password, until the failures age out
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # The limit is per email
+        other = CustomUser.objects.create_user('other.user@example.com', self.password)
+        self.assertEqual(self.login(email=other.email).status_code, 200)
+
+    @override_settings(LOGIN_THROTTLE={'RATES': {'login': {'ip': (2, 60)}}, 'FAILURE_RATES': {}})
+    def test_every_attempt_counts_against_the_ip(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login(password='wrong-password').status_code, 401)
+        self.assertEqual(self.login().status_code, 429)
+
+    @override_settings(LOGIN_THROTTLE={'RATES': {}, 'FAILURE_RATES': {'login': {'email': (1, 900)}}})
+    def test_malformed_input_is_a_400_and_not_a_failure(self):
+        for data in ({'email': 'not-an-email', 'password': 'x'}, {'password': self.password}, ['not', 'a', 'dict']):
+            response = self.client.post('/api/login/', data, content_type='application/json')
+            self.assertEqual(response.status_code, 400, data)
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login(password='wrong-password').status_code, 401)
+        self.assertEqual(self.login().status_code, 429)
+
+
+REDIS_SERVER = fakeredis.FakeServer()
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'throttle': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://throttle:6379/0',
+        'KEY_PREFIX': 'crm',
+        'VERSION': 2,
+        'OPTIONS': {'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection, 'server': REDIS_SERVER}},
+    },
+})
+class RedisSlidingWindowTests(SimpleTestCase):
+
+    def setUp(self):
+        self.limiter = SlidingWindowLimiter(alias='throttle')
+        self.limiter.cache.clear()
+        self.limits = [('login:ip:203.0.113.7', 2, 60)]
+
+    def test_counters_respect_key_prefix_and_version(self):
+        self.assertEqual(self.limiter.hit(self.limits, now=90), (True, 0))
+        self.limiter.record(self.limits, now=90)
+        self.assertEqual(self.limiter.get_redis_connection().keys('*'), [b'crm:2:throttle:login:ip:203.0.113.7:1'])
+        # The same counter the cache API sees
+        self.assertEqual(self.limiter.cache.get('throttle:login:ip:203.0.113.7:1'), 2)
+        self.assertEqual(self.limiter.check(self.limits, now=90), (False, 60))
+        self.assertEqual(self.limiter.hit(self.limits, now=90), (False, 60))
+
+    def test_script_is_registered_once(self):
+        with mock.patch('account.throttling._sliding_window_script', None), \
+                mock.patch('redis.Redis.register_script', autospec=True, side_effect=Redis.register_script) as register:
+            for _ in range(3):
+                self.limiter.hit(self.limits, now=90)
+        self.assertEqual(register.call_count, 1)
+
+
+class TokenPruningTests(AccountTestCase):
+    def test_expired_tokens_are_pruned_from_the_users_shard(self):
+        now = datetime.now(timezone.utc)
+        tokens = OutstandingToken.objects.using(self.shard).bulk_create([
+            OutstandingToken(
+                user=self.user, jti=f"jti-{i}", token='token', created_at=now - timedelta(days=2),
+                expires_at=now - timedelta(days=1) if i % 3 else now + timedelta(days=1)
+            )
+            for i in range(30)
+        ])
+        BlacklistedToken.objects.using(self.shard).bulk_create([BlacklistedToken(token=token) for token in tokens[::2]])
+
+        pruner = ExpiredTokenPruner(using=self.shard)
+        self.assertTrue(pruner.run())
+        self.assertEqual((pruner.state['outstanding_deleted'], pruner.state['blacklisted_deleted']), (20, 10))
+        self.assertEqual(OutstandingToken.objects.using(self.shard).count(), 10)
+        self.assertFalse(OutstandingToken.objects.using(self.shard).filter(expires_at__lte=now).exists())
+
+
+class LogoutEverywhereBlacklistTests(AccountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = datetime.now(timezone.utc)
+        # Live and issued before the watermark, expired, issued after it
+        self.tokens = OutstandingToken.objects.using(self.shard).bulk_create([
+            OutstandingToken(
+                user=self.user, jti=f"jti-{i}", token='token',
+                created_at=self.now - timedelta(hours=1) if i < 8 else self.now + timedelta(hours=1),
+                expires_at=self.now - timedelta(days=1) if i % 4 == 3 else self.now + timedelta(days=1)
+            )
+            for i in range(10)
+        ])
+        BlacklistedToken.objects.using(self.shard).create(token=self.tokens[0])
+
+    def assertBlacklisted(self, expected):
+        blacklisted = BlacklistedToken.objects.using(self.shard).values_list('token__jti', flat=True)
+        self.assertEqual(sorted(blacklisted), sorted(f"jti-{i}" for i in expected))
+
+    def test_one_statement_blacklists_what_is_left(self):
+        self.assertEqual(blacklist_outstanding_tokens(self.user.pk, self.now), 5)
+        self.assertBlacklisted([0, 1, 2, 4, 5, 6])
+        self.assertEqual(blacklist_outstanding_tokens(self.user.pk, self.now), 0)
+
+    def test_portable_fallback_walks_keyset_batches(self):
+        added = blacklist_outstanding_token_batches(self.shard, self.user.pk, self.now, self.now, batch_size=2)
+        self.assertEqual(added, 5)
+        self.assertBlacklisted([0, 1, 2, 4, 5, 6])
+
+
+# One worker and one queued hash: two slots in all
+POOLED_HASHING = {'ENABLED': True, 'WORKERS': 1, 'QUEUE_SIZE': 1, 'QUEUE_TIMEOUT': 0.05, 'RETRY_AFTER': 3}
+
+
+@override_settings(PASSWORD_HASHING_POOL=POOLED_HASHING)
+class HashingPoolTests(AccountTestCase):
+    """
+    Real worker processes. They load this settings module, so hashes come
+    out under its first PASSWORD_HASHERS entry (scrypt).
+    """
+
+    def setUp(self):
+        super().setUp()
+        hashing_executor.reset()
+        self.addCleanup(hashing_executor.reset)
+
+    def hold_every_slot(self):
+        _pool, slots = hashing_executor.get_pool()
+        for _ in range(2):
+            self.assertTrue(slots.acquire(blocking=False))
+        self.addCleanup(lambda: [slots.release() for _ in range(2)])
+
+    def test_register_and_login_through_the_pool(self):
+        response = self.client.post('/api/register/', {
+            'email': 'pooled@example.com', 'first_name': 'Grace', 'last_name': 'Hopper',
+            'password1': self.password, 'password2': self.password,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(CustomUser.objects.get(email='pooled@example.com').password.startswith('scrypt$'))
+
+        self.assertEqual(self.login(email='pooled@example.com').status_code, 200)
+        self.assertEqual(self.login(email='pooled@example.com', password='wrong-password').status_code, 401)
+        pool, _slots = hashing_executor.get_pool()
+        self.assertEqual(len(pool._processes), 1)
+
+    def test_login_rehashes_an_older_hasher(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            password=make_password(self.password, hasher='pbkdf2_sha1')
+        )
+        self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(CustomUser.objects.get(pk=self.user.pk).password.startswith('scrypt$'))
+
+    def test_saturated_pool_answers_429(self):
+        self.hold_every_slot()
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3')
+        with self.assertRaises(HashingSaturated):
+            hashing_executor.hash(self.password)
+
+    def test_waiting_for_a_slot_does_not_poll(self):
+        _pool, slots = hashing_executor.get_pool()
+        self.hold_every_slot()
+        # A slot freed while the coroutine waits is picked up by the waiting thread
+        threading.Timer(0.01, slots.release).start()
+        with mock.patch('account.hashing.asyncio.sleep') as sleep:
+            self.assertTrue(async_to_sync(hashing_executor.await_slot)(slots))
+        sleep.assert_not_called()
@@ -0,0 +1,311 @@
+# throttling.py
+import hashlib
+import ipaddress
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+_sliding_window_script = None
+
+# KEYS: previous and current window counter per limit, in pairs.
+# ARGV: limit, window seconds and elapsed fraction of the current window per limit.
+# Either every counter is incremented or, if any limit would be exceeded, none is.
+SLIDING_WINDOW_LUA = """
+local counts = {}
+local allowed = 1
+for i = 1, #KEYS / 2 do
+    local previous = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+    local current = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+    local limit = tonumber(ARGV[3 * i - 2])
+    local elapsed = tonumber(ARGV[3 * i])
+    if previous * (1 - elapsed) + current + 1 > limit then
+        allowed = 0
+    end
+    counts[2 * i - 1] = previous
+    counts[2 * i] = current
+end
+if allowed == 1 then
+    for i = 1, #KEYS / 2 do
+        local current = redis.call('INCR', KEYS[2 * i])
+        redis.call('EXPIRE', KEYS[2 * i], 2 * tonumber(ARGV[3 * i - 1]))
+        counts[2 * i] = current - 1
+    end
+end
+table.insert(counts, 1, allowed)
+return counts
+"""
+
+
+def get_throttle_settings():
+    return getattr(settings, 'LOGIN_THROTTLE', {})
+
+
+def get_sliding_window_script(connection):
+    """SLIDING_WINDOW_LUA, registered once per process; callers pass their own client"""
+    global _sliding_window_script
+    if _sliding_window_script is None:
+        # register_script() only hashes the script; calls run EVALSHA and load it on a miss
+        _sliding_window_script = connection.register_script(SLIDING_WINDOW_LUA)
+    return _sliding_window_script
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counters: each key keeps one counter per fixed window,
+    and the count over the trailing window is estimated as the previous
+    window's counter, weighted by how much of it still overlaps, plus the
+    current one. Two integers per key, whatever the traffic.
+
+    On Redis one Lua script checks and increments every limit of a request
+    atomically. Other cache backends (LocMem) increment first and roll the
+    increments back when a limit is exceeded, so concurrent attempts cannot
+    overshoot a limit either. Rejected attempts are not counted. Both paths
+    name counters through cache.make_key(), so KEY_PREFIX and VERSION apply
+    on Redis too.
+    """
+    key_prefix = 'throttle'
+
+    def __init__(self, alias=None):
+        self.alias = alias
+
+    @property
+    def cache_alias(self):
+        return self.alias or get_throttle_settings().get('CACHE_ALIAS', 'default')
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_redis_connection(self):
+        """Raw Redis client behind the cache alias, or None for non-Redis backends"""
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection(self.cache_alias)
+        except (ImportError, NotImplementedError):
+            return None
+
+    def make_keys(self, windows):
+        """Previous and current counter per window, as the cache backend names them (KEY_PREFIX, VERSION)"""
+        return [self.cache.make_key(key) for previous, current, *_ in windows for key in (previous, current)]
+
+    def get_windows(self, limits, now):
+        """(previous key, current key, limit, window, elapsed fraction) per (key, limit, window)"""
+        windows = []
+        for key, limit, window in limits:
+            index, elapsed = divmod(now, window)
+            index = int(index)
+            windows.append((
+                f"{self.key_prefix}:{key}:{index - 1}",
+                f"{self.key_prefix}:{key}:{index}",
+                limit,
+                window,
+                elapsed / window,
+            ))
+        return windows
+
+    def hit(self, limits, now=None):
+        """
+        Count one attempt against every (key, limit, window) in `limits`.
+        Returns (allowed, seconds until a rejected attempt would pass).
+        """
+        if not limits:
+            return True, 0
+        windows = self.get_windows(limits, time.time() if now is None else now)
+
+        connection = self.get_redis_connection()
+        if connection is None:
+            allowed, counts = self.hit_cache(windows)
+        else:
+            allowed, counts = self.hit_redis(connection, windows)
+        if allowed:
+            return True, 0
+        return False, max(self.wait(window, previous, current) for window, (previous, current) in zip(windows, counts))
+
+    def check(self, limits, now=None):
+        """
+        Whether one more attempt fits under every (key, limit, window) in
+        `limits`, without counting it. Returns (allowed, seconds to wait).
+        """
+        if not limits:
+            return True, 0
+        windows = self.get_windows(limits, time.time() if now is None else now)
+
+        connection = self.get_redis_connection()
+        if connection is None:
+            keys = [key for previous, current, *_ in windows for key in (previous, current)]
+            found = self.cache.get_many(keys)
+            values = [found.get(key) for key in keys]
+        else:
+            values = connection.mget(self.make_keys(windows))
+        counts = [(int(values[i] or 0), int(values[i + 1] or 0)) for i in range(0, len(values), 2)]
+        waits = [
+            self.wait(window, previous, current)
+            for window, (previous, current) in zip(windows, counts)
+            if previous * (1 - window[4]) + current + 1 > window[2]
+        ]
+        return not waits, max(waits, default=0)
+
+    def record(self, limits, now=None):
+        """Count one attempt against every limit, over or not (e.g. a login that already failed)"""
+        if not limits:
+            return
+        windows = self.get_windows(limits, time.time() if now is None else now)
+
+        connection = self.get_redis_connection()
+        if connection is None:
+            for _, current, _, window, _ in windows:
+                self.incr(self.cache, current, 2 * window)
+            return
+        pipeline = connection.pipeline(transaction=False)
+        for _, current, _, window, _ in windows:
+            key = self.cache.make_key(current)
+            pipeline.incr(key)
+            pipeline.expire(key, 2 * window)
+        pipeline.execute()
+
+    def hit_redis(self, connection, windows):
+        args = [value for *_, limit, window, elapsed in windows for value in (limit, window, elapsed)]
+        result = get_sliding_window_script(connection)(keys=self.make_keys(windows), args=args, client=connection)
+        counts = [(int(result[i]), int(result[i + 1])) for i in range(1, len(result), 2)]
+        return bool(result[0]), counts
+
+    def hit_cache(self, windows):
+        cache = self.cache
+        previous_counts = cache.get_many([previous for previous, *_ in windows])
+
+        incremented, counts, allowed = [], [], True
+        for previous, current, limit, window, elapsed in windows:
+            count = self.incr(cache, current, 2 * window)
+            incremented.append(current)
+            previous_count = previous_counts.get(previous, 0)
+            counts.append((previous_count, count - 1))
+            if previous_count * (1 - elapsed) + count > limit:
+                allowed = False
+
+        if not allowed:
+            for key in incremented:
+                try:
+                    cache.decr(key)
+                except ValueError:
+                    pass  # Expired in between; nothing to give back
+        return allowed, counts
+
+    def incr(self, cache, key, timeout):
+        cache.add(key, 0, timeout)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.set(key, 1, timeout)
+            return 1
+
+    def wait(self, window, previous, current):
+        """Seconds until previous * (1 - elapsed) + current + 1 fits under the limit again"""
+        _, _, limit, seconds, elapsed = window
+        if current + 1 <= limit:
+            # The previous window's weight has to decay far enough in this one
+            needed = 1 - (limit - 1 - current) / previous if previous else 0
+            return max(0, needed - elapsed) * seconds
+        # Only the next window can help: this window becomes its "previous"
+        needed = 1 - (limit - 1) / current if current else 0
+        return (1 - elapsed + max(0, needed)) * seconds
+
+
+login_limiter = SlidingWindowLimiter()
+
+
+def get_subnet(ip):
+    """The /24 (IPv4) or /64 (IPv6) network an address belongs to, per LOGIN_THROTTLE"""
+    config = get_throttle_settings()
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    prefix = config.get('IPV4_SUBNET', 24) if address.version == 4 else config.get('IPV6_SUBNET', 64)
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def hash_identifier(value):
+    # Bounded keys, and no email addresses sitting in the cache
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+class LoginRateThrottle(BaseThrottle):
+    """
+    Credential-stuffing shield for the login endpoint: sliding-window limits
+    per client IP and per subnet from LOGIN_THROTTLE['RATES'][scope], and
+    per submitted email from LOGIN_THROTTLE['FAILURE_RATES'][scope], each as
+    {kind: (attempts, window seconds)}. RATES count every attempt. FAILURE_RATES
+    are only checked here and counted by the view through record_failure(),
+    so someone guessing a user's password cannot lock them out with it, and
+    the user's own logins never use it up. DRF checks throttles before the
+    handler runs, so over-limit attempts never reach a database lookup or a
+    password hash. The client IP comes from BaseThrottle.get_ident
+    (REST_FRAMEWORK['NUM_PROXIES']).
+    """
+    scope = 'login'
+    limiter = login_limiter
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_identifiers(self, request):
+        ip = self.get_ident(request)
+        identifiers = {'ip': ip, 'subnet': get_subnet(ip)}
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if isinstance(email, str) and email.strip():
+            identifiers['email'] = hash_identifier(email.strip().lower())
+        return identifiers
+
+    def get_limits(self, identifiers, rates, prefix):
+        return [
+            (f"{prefix}:{kind}:{identifiers[kind]}", attempts, window)
+            for kind, (attempts, window) in rates.items()
+            if identifiers.get(kind)
+        ]
+
+    def allow_request(self, request, view):
+        config = get_throttle_settings()
+        rates = config.get('RATES', {}).get(self.scope, {})
+        failure_rates = config.get('FAILURE_RATES', {}).get(self.scope, {})
+        if not rates and not failure_rates:
+            return True
+
+        identifiers = self.get_identifiers(request)
+        try:
+            allowed, self.retry_after = self.limiter.check(
+                self.get_limits(identifiers, failure_rates, f"{self.scope}:failed")
+            )
+            if allowed:
+                allowed, self.retry_after = self.limiter.hit(self.get_limits(identifiers, rates, self.scope))
+        except Exception as e:
+            # The password hashing pool still bounds the damage while the cache is down
+            logger.error(f"Login throttle unavailable, allowing request: {str(e)}")
+            return True
+
+        if not allowed:
+            logger.warning(f"Throttled {self.scope} attempt from {identifiers['ip']}")
+        return allowed
+
+    def record_failure(self, request):
+        """Count a rejected attempt against FAILURE_RATES"""
+        failure_rates = get_throttle_settings().get('FAILURE_RATES', {}).get(self.scope, {})
+        limits = self.get_limits(self.get_identifiers(request), failure_rates, f"{self.scope}:failed")
+        try:
+            self.limiter.record(limits)
+        except Exception as e:
+            logger.error(f"Could not record failed {self.scope} attempt: {str(e)}")
+
+    def wait(self):
+        return math.ceil(self.retry_after) if self.retry_after else None
+
+
+class RegisterRateThrottle(LoginRateThrottle):
+    scope = 'register'
@@ -0,0 +1,84 @@
+# tokens.py
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from core.sharding import get_shard_map
+
+from .authentication import ISSUED_AT_MS_CLAIM, PARTITION_KEY_CLAIM, get_principal
+
+
+def get_token_owner(user_id, partition_key=None):
+    """
+    (database, principal) for a user's token rows: the shard holding the
+    user, since OutstandingToken.user cannot point across databases. Tokens
+    of a deleted user (principal None) go where the router sends them.
+    """
+    principal = get_principal(user_id, partition_key) if user_id else None
+    if principal is None:
+        return router.db_for_write(OutstandingToken), None
+    return get_shard_map().shard_for(principal['partition_key']), principal
+
+
+class ShardedRefreshToken(RefreshToken):
+    """
+    RefreshToken whose OutstandingToken and BlacklistedToken rows live on the
+    user's shard. BlacklistMixin's queries carry no routing hint, so they
+    would all run on 'default', where a sharded user does not exist. The
+    user's partition_key travels as a claim (copied into access tokens too)
+    so finding that shard never has to ask every shard, next to the login
+    time in milliseconds for the logout-everywhere watermark.
+    """
+
+    def get_owner(self):
+        return get_token_owner(self.payload.get(api_settings.USER_ID_CLAIM), self.payload.get(PARTITION_KEY_CLAIM))
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        using, _principal = self.get_owner()
+        if BlacklistedToken.objects.using(using).filter(token__jti=jti).exists():
+            raise TokenError(_("Token is blacklisted"))
+
+    def get_or_create_outstanding(self, using, principal):
+        return OutstandingToken.objects.using(using).get_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            defaults={
+                'user_id': principal['id'] if principal else None,
+                'created_at': self.current_time,
+                'token': str(self),
+                'expires_at': datetime_from_epoch(self.payload['exp']),
+            }
+        )
+
+    def outstand(self):
+        return self.get_or_create_outstanding(*self.get_owner())
+
+    def blacklist(self):
+        using, principal = self.get_owner()
+        token, _created = self.get_or_create_outstanding(using, principal)
+        return BlacklistedToken.objects.using(using).get_or_create(token=token)
+
+    @classmethod
+    def for_user(cls, user):
+        # Token.for_user builds the claims; BlacklistMixin's unrouted insert is replaced here
+        token = super(BlacklistMixin, cls).for_user(user)
+        token[PARTITION_KEY_CLAIM] = user.partition_key
+        # Copied into access tokens and kept on rotation: the login a token descends from
+        token[ISSUED_AT_MS_CLAIM] = int(token.current_time.timestamp() * 1000)
+        OutstandingToken.objects.using(get_shard_map().shard_for(user.partition_key)).create(
+            user=user,
+            jti=token[api_settings.JTI_CLAIM],
+            token=str(token),
+            created_at=token.current_time,
+            expires_at=datetime_from_epoch(token['exp'])
+        )
+        return token
+
+
+def get_token_databases():
+    """Every database that can hold token rows: each shard, plus where ownerless rows are routed"""
+    return list(dict.fromkeys([*get_shard_map().shards, router.db_for_write(OutstandingToken)]))
@@ -1,30 +1,42 @@
+from asgiref.sync import sync_to_async
 from rest_framework.views import APIView
-from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from core.async_views import AsyncAPIViewMixin
+from .hashing import HashingSaturated, hashing_executor
+from .revocation import RevocationUnavailable, revoke_user_tokens, token_denylist
 from .serializers import RegisterSerializer, LoginSerializer
+from .throttling import LoginRateThrottle, RegisterRateThrottle
+from .tokens import ShardedRefreshToken
 from rest_framework import status
 import logging
 
 logger = logging.getLogger(__name__)
 
-class RegisterAPiView(APIView):
+class RegisterAPiView(AsyncAPIViewMixin, APIView):
+    """Async so the event loop keeps serving while the password is hashed in the pool"""
     permission_classes = [AllowAny]
+    # No token lookup, so the throttle is the first thing that runs
+    authentication_classes = []
+    throttle_classes = [RegisterRateThrottle]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         try:
             serializer = RegisterSerializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            user = serializer.save()
+            # The unique email check queries the database
+            await sync_to_async(serializer.is_valid)(raise_exception=True)
+            password_hash = await hashing_executor.ahash(serializer.validated_data['password1'])
+            user = await sync_to_async(serializer.save)(password_hash=password_hash)
 
-            refresh = RefreshToken.for_user(user)
+            refresh = await sync_to_async(ShardedRefreshToken.for_user)(user)
 
             return Response(
                 {
                     'user': {
                         'id': user.id,
-                        'username': user.username,
+                        'username': user.get_username(),
                         'email': user.email
                     },
                     'refresh_token': str(refresh),
@@ -32,6 +44,8 @@ class RegisterAPiView(APIView):
                 },
                 status=status.HTTP_201_CREATED
             )
+        except HashingSaturated:
+            raise
         except Exception as e:
             logger.error(f"Registration error: {str(e)}")
             return Response(
@@ -39,22 +53,31 @@ class RegisterAPiView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class LoginAPIView(APIView):
+class LoginAPIView(AsyncAPIViewMixin, APIView):
+    """Async so the event loop keeps serving while the password is verified in the pool"""
     permission_classes = [AllowAny]
+    # No token lookup, so the throttle is the first thing that runs
+    authentication_classes = []
+    throttle_classes = [LoginRateThrottle]
+
+    async def post(self, request, *args, **kwargs):
+        serializer = LoginSerializer(data=request.data, context={'request': request})
+        try:
+            attrs = serializer.to_internal_value(request.data)
+        except ValidationError as e:
+            # Malformed input never reaches a password check, so it is not a failed login
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
 
-    def post(self, request, *args, **kwargs):
         try:
-            serializer = LoginSerializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            user = serializer.validated_data['user']
+            user = (await serializer.acheck_credentials(attrs))['user']
 
-            refresh = RefreshToken.for_user(user)
+            refresh = await sync_to_async(ShardedRefreshToken.for_user)(user)
 
             return Response(
                 {
                     'user': {
                         'id': user.id,
-                        'username': user.username,
+                        'username': user.get_username(),
                         'email': user.email
                     },
                     'refresh_token': str(refresh),
@@ -62,6 +85,16 @@ class LoginAPIView(APIView):
                 },
                 status=status.HTTP_200_OK
             )
+        except HashingSaturated:
+            raise
+        except ValidationError as e:
+            # Wrong credentials: the only attempts the per-email limit counts
+            await sync_to_async(LoginRateThrottle().record_failure)(request)
+            logger.error(f"Login error: {str(e)}")
+            return Response(
+                {'error': 'Invalid credentials'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
         except Exception as e:
             logger.error(f"Login error: {str(e)}")
             return Response(
@@ -82,31 +115,31 @@ class LogoutAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            token = RefreshToken(refresh_token)
+            token = ShardedRefreshToken(refresh_token)
 
-            # Verify the token belongs to the current user
-            token_user_id = token.get('user_id')
-            if token_user_id != request.user.id:
+            # Verify the token belongs to the current user (the claim holds the id as a string)
+            token_user_id = token.get(api_settings.USER_ID_CLAIM)
+            if token_user_id != str(request.user.id):
                 return Response(
                     {'error': 'Invalid token for user'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            token.blacklist()
-
-            # Also blacklist the access token if it exists in outstanding tokens
+            # Access tokens are never stored, so revoke this one by its jti. It goes
+            # first: if the broadcast fails the refresh token still works for a retry
             access_token = request.auth
-            if access_token:
-                try:
-                    OutstandingToken.objects.filter(token=str(access_token)).delete()
-                except Exception:
-                    pass
+            if access_token is not None:
+                token_denylist.revoke(access_token[api_settings.JTI_CLAIM], access_token['exp'])
+
+            token.blacklist()
 
             return Response(
                 {'message': 'Successfully logged out'},
                 status=status.HTTP_200_OK
             )
 
+        except RevocationUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Logout error: {str(e)}")
             return Response(
@@ -119,17 +152,14 @@ class LogoutAllView(APIView):
 
     def post(self, request):
         try:
-            tokens = OutstandingToken.objects.filter(user_id=request.user.id)
-            blacklisted_count = 0
-
-            for token in tokens:
-                # Use get_or_create to avoid duplicates
-                blacklisted_token, created = BlacklistedToken.objects.get_or_create(token=token)
-                if created:
-                    blacklisted_count += 1
+            # One UPDATE however many tokens the user holds; see revoke_user_tokens
+            watermark, blacklisted_count = revoke_user_tokens(request.user.id, request.user.partition_key)
 
+            message = 'Successfully logged out from all devices.'
+            if blacklisted_count is not None:
+                message = f'{message} {blacklisted_count} tokens blacklisted.'
             return Response(
-                {'message': f'Successfully logged out from all devices. {blacklisted_count} tokens blacklisted.'},
+                {'message': message, 'tokens_valid_after': watermark},
                 status=status.HTTP_200_OK
             )
 
@@ -138,4 +168,4 @@ class LogoutAllView(APIView):
             return Response(
                 {'error': 'Logout from all devices failed'},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
@@ -1,6 +1,18 @@
 # views.py
-from rest_framework.exceptions import PermissionDenied
-from .base_views import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.response import Response
+from .async_views import AsyncListCreateAPIView, AsyncRetrieveUpdateDestroyAPIView
+from .base_views import BaseModelAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from .bulk_operations import BulkOperations
+from .bulk_transitions import ClientStatusTransition
+from .cache_tags import TaggedCache
+from .pagination import KeysetPagination
+from .performance_monitoring import can_view_metrics, query_metrics
+from .read_through import ReadThroughCache
+from .tiered_cache import designation_cache
 from .models import DesignationModel, LeadModel, ClientModel
 from .serializers import (
     DesignationSerializer,
@@ -15,6 +27,10 @@ class DesignationListAPIView(ListCreateAPIView):
     serializer_class = DesignationSerializer
     cache_prefix = "designations"
     cache_timeout = 3600  # 1 hour
+    query_budget = {'get': 2}  # auth user + designations
+    # Read-heavy: served from the in-process L1 in front of Redis
+    tagged_cache = TaggedCache(designation_cache)
+    read_through_cache = ReadThroughCache(designation_cache)
 
     def get_queryset(self):
         # Using indexed field 'name' for ordering
@@ -22,95 +38,213 @@ class DesignationListAPIView(ListCreateAPIView):
 
     def get_cache_key(self, user_id=None):
         # Designations are global, no user-specific caching
-        return self.get_cache_key(self.cache_prefix, "all")
+        return self.make_cache_key(self.cache_prefix, "all")
+
+    def get_cache_tags(self, request):
+        return ["designations:all"]
+
+    def invalidate_caches(self, request, instance):
+        # Handled by the DesignationModel signals so admin writes are covered too
+        pass
 
 class DesignationDetailAPIView(RetrieveUpdateDestroyAPIView):
     """Designation detail view"""
     model = DesignationModel
     serializer_class = DesignationSerializer
     cache_prefix = "designation"
+    tagged_cache = DesignationListAPIView.tagged_cache
+    read_through_cache = DesignationListAPIView.read_through_cache
 
     def invalidate_caches(self, request, instance, deleted=False):
-        cache.delete(self.get_cache_key("designations", "all"))
-        cache.delete(self.get_cache_key(instance.id))
+        # Handled by the DesignationModel signals so admin writes are covered too
+        pass
 
 class LeadListCreateAPIView(ListCreateAPIView):
     """Lead list and create view with user-specific caching"""
     model = LeadModel
     serializer_class = LeadClientSerializer
     cache_prefix = "leads"
+    pagination_class = KeysetPagination
+    query_budget = {'get': 3}  # auth user + page + prefetched clients
+    export_fields = [
+        'id', 'user__email', 'designation__name', 'experience', 'salary',
+        'status', 'performance_score', 'last_review_date', 'created_at',
+    ]
 
     def get_queryset(self):
-        # Using indexed fields and select_related for optimization
-        return LeadModel.objects.filter(
-            user=self.request.user
-        ).select_related('user').order_by('-created_at')
+        # Joins, the managed_clients prefetch and columns come from the query planner.
+        # A user's leads live in the user's partition, so only that shard is read
+        user = self.request.user
+        return LeadModel.objects.for_partition(user.partition_key).filter(user=user).order_by('-created_at')
 
     def perform_create(self, serializer):
         return serializer.save(user=self.request.user)
 
     def invalidate_caches(self, request, instance):
-        # Invalidate user-specific leads cache
-        cache.delete(self.get_cache_key(request.user.id))
-        # Invalidate any pattern-based caches if using Redis
-        self.invalidate_pattern(f"user_{self.cache_prefix}_*")
+        # Handled by the model signals after commit, which also cover admin and ORM writes
+        pass
+
+    def get_cache_tags(self, request):
+        # Pages are cached individually; one tag covers every page of the list.
+        # Pages embed the leads' clients, so client writes must drop them too
+        return [f"leads:user:{request.user.id}", f"clients:user:{request.user.id}"]
 
 class LeadDetailAPIView(RetrieveUpdateDestroyAPIView):
     """Lead detail view with ownership validation"""
     model = LeadModel
     serializer_class = LeadSerializer
     cache_prefix = "lead"
+    owner_field = 'user'
 
     def get_queryset(self):
         return LeadModel.objects.select_related('user')
 
-    def get_object(self, pk):
-        instance = super().get_object(pk)
+    def check_object(self, instance):
         # Validate ownership
-        if instance.user != self.request.user:
+        if instance.user_id != self.request.user.id:
             raise PermissionDenied("You don't have permission to access this lead")
-        return instance
 
     def invalidate_caches(self, request, instance, deleted=False):
-        user_id = request.user.id
-        cache.delete(self.get_cache_key(instance.id))
-        cache.delete(self.get_cache_key("leads", user_id))
+        # Handled by the model signals after commit, which also cover admin and ORM writes
+        pass
 
 class ClientListCreateAPIView(ListCreateAPIView):
     """Client list and create view"""
     model = ClientModel
     serializer_class = ClientSerializer
     cache_prefix = "clients"
+    pagination_class = KeysetPagination
+    query_budget = {'get': 2}  # auth user + page
+    export_fields = [
+        'id', 'full_name', 'email', 'phone', 'client_tier', 'status',
+        'lifetime_value', 'last_purchase_date', 'country_code', 'created_at',
+    ]
 
     def get_queryset(self):
-        return ClientModel.objects.filter(
-            manage_by=self.request.user
-        ).select_related('manage_by').order_by('-created_at')
+        # manage_by points at the user's lead profile, not the user itself
+        user = self.request.user
+        return ClientModel.objects.for_partition(user.partition_key).filter(
+            manage_by__user=user
+        ).order_by('-created_at')
 
     def perform_create(self, serializer):
-        return serializer.save(manage_by=self.request.user)
+        # manage_by is the user's lead profile, in the user's partition
+        user = self.request.user
+        lead = LeadModel.objects.for_partition(user.partition_key).filter(user=user).first()
+        if lead is None:
+            raise ValidationError({"detail": "Only users with a lead profile can manage clients"})
+        email = serializer.validated_data['email']
+        if ClientModel.objects.for_partition(lead.partition_key).filter(email=email).exists():
+            raise ValidationError({"email": "A client with this email already exists"})
+        return serializer.save(manage_by=lead)
 
     def invalidate_caches(self, request, instance):
-        cache.delete(self.get_cache_key(request.user.id))
-        self.invalidate_pattern(f"user_{self.cache_prefix}_*")
+        # Handled by the model signals after commit, which also cover admin and ORM writes
+        pass
+
+    def get_cache_tags(self, request):
+        return [f"clients:user:{request.user.id}"]
+
+class ClientBulkUpsertAPIView(BaseModelAPIView):
+    """
+    Create or update many clients in one request, keyed on (email, partition_key).
+    Accepts a list of client objects or {"clients": [...]}; returns one outcome per row.
+    """
+    model = ClientModel
+    max_rows = 5000
+    batch_size = 500
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data.get('clients') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            raise ValidationError({"clients": "Expected a non-empty list of clients"})
+        if len(rows) > self.max_rows:
+            raise ValidationError({"clients": f"At most {self.max_rows} clients per request"})
+
+        lead = LeadModel.objects.for_partition(request.user.partition_key).filter(user=request.user).first()
+        if lead is None:
+            raise ValidationError({"detail": "Only users with a lead profile can manage clients"})
+
+        results = BulkOperations.bulk_upsert_clients(lead, rows, batch_size=self.batch_size)
+        summary = {
+            outcome: sum(1 for result in results if result['status'] == outcome)
+            for outcome in ('created', 'updated')
+        }
+        summary['failed'] = sum(1 for result in results if result['status'] in ('invalid', 'conflict'))
+        return Response({**summary, "results": results}, status=status.HTTP_200_OK)
+
+class ClientStatusTransitionAPIView(BaseModelAPIView):
+    """
+    Queue a status change for every client matching a filter expression, e.g.
+    {"filters": {"client_tier": "premium", "country_code": ["US", "CA"]}, "new_status": "active"}.
+    Runs in the background; GET with the job id reports progress.
+    """
+    model = ClientModel
+
+    def get_lead(self, request):
+        lead = LeadModel.objects.for_partition(request.user.partition_key).filter(user=request.user).first()
+        if lead is None:
+            raise ValidationError({"detail": "Only users with a lead profile can manage clients"})
+        return lead
+
+    def post(self, request, *args, **kwargs):
+        filters = request.data.get('filters') or {}
+        new_status = request.data.get('new_status')
+        if not isinstance(filters, dict):
+            raise ValidationError({"filters": "Expected an object"})
+
+        errors = ClientStatusTransition.validate(filters, new_status)
+        if errors:
+            raise ValidationError(errors)
+
+        # Leads may only transition their own clients
+        filters['manager'] = str(self.get_lead(request).id)
+        job_id = BulkOperations.transition_client_status(filters, new_status)
+        return Response({"job_id": job_id}, status=status.HTTP_202_ACCEPTED)
+
+    def get(self, request, *args, **kwargs):
+        job = ClientStatusTransition.load(kwargs.get('job_id'))
+        if job is None or job.filters.get('manager') != str(self.get_lead(request).id):
+            raise NotFound("Transition job not found")
+        return Response(job.as_dict(), status=status.HTTP_200_OK)
 
 class ClientDetailAPIView(RetrieveUpdateDestroyAPIView):
     """Client detail view with ownership validation"""
     model = ClientModel
     serializer_class = ClientSerializer
     cache_prefix = "client"
+    owner_field = 'manage_by__user'
 
     def get_queryset(self):
         return ClientModel.objects.select_related('manage_by')
 
-    def get_object(self, pk):
-        instance = super().get_object(pk)
-        if instance.manage_by != self.request.user:
+    def check_object(self, instance):
+        # manage_by is the owner's lead profile, not the user itself
+        if instance.manage_by is None or instance.manage_by.user_id != self.request.user.id:
             raise PermissionDenied("You don't have permission to access this client")
-        return instance
 
     def invalidate_caches(self, request, instance, deleted=False):
-        user_id = request.user.id
-        cache.delete(self.get_cache_key(instance.id))
-        cache.delete(self.get_cache_key("clients", user_id))
+        # Handled by the model signals after commit, which also cover admin and ORM writes
+        pass
+
+# ASGI-native variants: same querysets, ownership checks and cache tags, async handlers
+
+class AsyncLeadListCreateAPIView(AsyncListCreateAPIView, LeadListCreateAPIView):
+    """Lead list and create view for ASGI deployments"""
+
+class AsyncLeadDetailAPIView(AsyncRetrieveUpdateDestroyAPIView, LeadDetailAPIView):
+    """Lead detail view for ASGI deployments"""
+
+class AsyncClientListCreateAPIView(AsyncListCreateAPIView, ClientListCreateAPIView):
+    """Client list and create view for ASGI deployments"""
+
+class AsyncClientDetailAPIView(AsyncRetrieveUpdateDestroyAPIView, ClientDetailAPIView):
+    """Client detail view for ASGI deployments"""
+
+class MetricsView(View):
+    """Prometheus scrape endpoint for the per-view query metrics (this process only)"""
 
+    def get(self, request):
+        if not can_view_metrics(request):
+            raise Http404
+        return HttpResponse(query_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,156 @@
+# async_cache.py
+import asyncio
+import weakref
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis-py < 4.2 or not installed
+    aioredis = None
+
+INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return false
+"""
+
+# Deletes KEYS[1] only while it still holds ARGV[1], e.g. a lock's owner token
+DELETE_IF_EQUAL_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class AsyncCache:
+    """
+    Async cache client for async views.
+
+    On django-redis aliases it talks to Redis through redis.asyncio, reusing
+    django-redis' key function and serializer so entries are shared with the
+    sync `cache` (tag generations, read-through envelopes). Other backends
+    fall back to Django's own a*() methods, which run the sync call in a thread.
+    """
+    incr_script = INCR_SCRIPT
+    delete_if_equal_script = DELETE_IF_EQUAL_SCRIPT
+
+    def __init__(self, alias=DEFAULT_CACHE_ALIAS):
+        self.alias = alias
+        self._clients = weakref.WeakKeyDictionary()
+        self._native = None
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @property
+    def native(self):
+        """True when the alias is django-redis and redis.asyncio is importable"""
+        if self._native is None:
+            self._native = aioredis is not None and hasattr(self.backend, 'client') and hasattr(
+                self.backend.client, 'encode'
+            )
+        return self._native
+
+    @property
+    def client(self):
+        # redis.asyncio connections belong to the loop that opened them; under
+        # WSGI async views each run in a fresh loop, so keep one client per loop
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            server = self.backend._server
+            servers = server.split(',') if isinstance(server, str) else server
+            options = self.backend._params.get('OPTIONS', {})
+            # Reads and writes go to the first (primary) server, like DefaultClient
+            client = aioredis.from_url(
+                servers[0],
+                max_connections=options.get('MAX_CONNECTIONS', 100),
+                socket_timeout=options.get('SOCKET_TIMEOUT'),
+                socket_connect_timeout=options.get('SOCKET_CONNECT_TIMEOUT'),
+            )
+            self._clients[loop] = client
+        return client
+
+    def make_key(self, key):
+        return self.backend.client.make_key(key)
+
+    def get_timeout_ms(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.backend.default_timeout
+        return None if timeout is None else int(timeout * 1000)
+
+    async def aget(self, key, default=None):
+        if not self.native:
+            return await self.backend.aget(key, default)
+        value = await self.client.get(self.make_key(key))
+        return default if value is None else self.backend.client.decode(value)
+
+    async def aget_many(self, keys):
+        if not self.native:
+            return await self.backend.aget_many(keys)
+        if not keys:
+            return {}
+        keys = list(keys)
+        values = await self.client.mget([self.make_key(key) for key in keys])
+        return {
+            key: self.backend.client.decode(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, nx=False):
+        if not self.native:
+            if nx:
+                return await self.backend.aadd(key, value, timeout)
+            await self.backend.aset(key, value, timeout)
+            return True
+
+        timeout_ms = self.get_timeout_ms(timeout)
+        if timeout_ms is not None and timeout_ms <= 0:
+            if nx:
+                return False
+            await self.adelete(key)
+            return True
+        return bool(await self.client.set(
+            self.make_key(key), self.backend.client.encode(value), px=timeout_ms, nx=nx
+        ))
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return await self.aset(key, value, timeout, nx=True)
+
+    async def adelete(self, key):
+        if not self.native:
+            return await self.backend.adelete(key)
+        return bool(await self.client.delete(self.make_key(key)))
+
+    async def adelete_if_equal(self, key, value):
+        """Delete `key` only if it still holds `value`; atomic on Redis, get-then-delete elsewhere"""
+        if not self.native:
+            if await self.backend.aget(key) != value:
+                return False
+            return await self.backend.adelete(key)
+        return bool(await self.client.eval(
+            self.delete_if_equal_script, 1, self.make_key(key), self.backend.client.encode(value)
+        ))
+
+    async def adelete_many(self, keys):
+        if not self.native:
+            return await self.backend.adelete_many(keys)
+        if keys:
+            await self.client.delete(*[self.make_key(key) for key in keys])
+
+    async def aincr(self, key, delta=1):
+        if not self.native:
+            return await self.backend.aincr(key, delta)
+        value = await self.client.eval(self.incr_script, 1, self.make_key(key), delta)
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+
+async_cache = AsyncCache()
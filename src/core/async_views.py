@@ -0,0 +1,203 @@
+# async_views.py
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.response import Response
+
+from .base_views import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAPIViewMixin:
+    """
+    Runs the DRF request cycle on the event loop under ASGI.
+
+    Authentication, permission and throttle checks run once in a worker
+    thread (DRF authenticators and the user lookup are synchronous); the
+    handlers themselves are coroutines using the async ORM and AsyncCache.
+    Writes still take one thread hop, because the async ORM has no
+    transaction support and the write path relies on transaction.atomic().
+    """
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                # options() and http_method_not_allowed() are still synchronous
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def server_error(self, action, error, message):
+        logger.error(f"Error in {self.__class__.__name__}.{action}: {str(error)}")
+        return Response({"error": message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncListCreateAPIView(AsyncAPIViewMixin, ListCreateAPIView):
+    """Async ListCreateAPIView: same caching, pagination and validators as the sync view"""
+
+    async def aget_list_data(self, request):
+        compiled = self.get_fast_serializer()
+        if compiled is not None:
+            return await self.aget_fast_list_data(request, compiled)
+
+        queryset = self.get_serializer_queryset()
+        if self.paginator is not None:
+            page, next_cursor = await self.paginator.apaginate_queryset(queryset, request)
+            serializer = self.serializer_class(page, many=True)
+            return self.paginator.get_paginated_data(serializer.data, next_cursor)
+        return self.serializer_class([instance async for instance in queryset], many=True).data
+
+    async def aget_fast_list_data(self, request, compiled):
+        queryset = self.get_values_queryset(compiled)
+        if self.paginator is not None:
+            rows, next_cursor = await self.paginator.apaginate_queryset(queryset, request)
+            data = await compiled.aserialize(rows, queryset.db)
+            return self.paginator.get_paginated_data(data, next_cursor)
+        return await compiled.aserialize([row async for row in queryset], queryset.db)
+
+    async def aget_list_validators(self, request, versioned_key):
+        if self.get_cache_tags(request):
+            return self.make_tagged_etag(versioned_key), None
+        if not self.has_updated_at():
+            return None, None
+
+        state = await self.get_queryset().order_by().aaggregate(
+            last_modified=Max('updated_at'),
+            count=Count('pk')
+        )
+        etag = self.make_etag(versioned_key, state['count'], state['last_modified'])
+        return etag, state['last_modified']
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            export_format = request.query_params.get('export')
+            if export_format and self.export_fields:
+                # Streams from a sync iterator; Django runs it in a thread under ASGI
+                return self.export(request, export_format)
+
+            cache_key = self.get_cache_key(request.user.id)
+            if self.paginator is not None:
+                cache_key = self.make_cache_key(cache_key, self.paginator.get_cache_suffix(request))
+
+            versioned_key = await self.tagged_cache.amake_key(cache_key, self.get_cache_tags(request))
+            etag, last_modified = await self.aget_list_validators(request, versioned_key)
+            not_modified = self.get_not_modified(request, etag, last_modified)
+            if not_modified is not None:
+                return self.set_validators(not_modified, etag, last_modified)
+
+            async def compute():
+                return self.prerender(await self.aget_list_data(request))
+
+            data = await self.read_through_cache.aget_or_compute(
+                versioned_key,
+                compute,
+                self.cache_timeout,
+                stale_timeout=self.cache_stale_timeout
+            )
+
+            return self.set_validators(Response(data, status=status.HTTP_200_OK), etag, last_modified)
+
+        except APIException:
+            raise
+        except Exception as e:
+            return self.server_error('get', e, "Failed to fetch data")
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            instance = await sync_to_async(self.create_instance)(request)
+            return Response(self.serializer_class(instance).data, status=status.HTTP_201_CREATED)
+        except APIException:
+            raise
+        except Exception as e:
+            return self.server_error('post', e, "Failed to create object")
+
+
+class AsyncRetrieveUpdateDestroyAPIView(AsyncAPIViewMixin, RetrieveUpdateDestroyAPIView):
+    """Async RetrieveUpdateDestroyAPIView: reads use the async ORM, writes reuse the sync transaction"""
+
+    async def aget_object(self, pk):
+        try:
+            instance = await self.get_queryset().aget(pk=pk)
+        except self.model.DoesNotExist:
+            raise NotFound(f"{self.model.__name__} not found")
+        self.check_object(instance)
+        return instance
+
+    async def aget_object_validators(self, pk):
+        if not self.has_updated_at():
+            return None, None
+
+        last_modified = await self.get_owned_queryset().filter(pk=pk).values_list('updated_at', flat=True).afirst()
+        if last_modified is None:
+            if self.owner_field:
+                await self.aget_object(pk)
+            return None, None
+        return self.make_etag(self.get_cache_key(pk), last_modified), last_modified
+
+    async def get(self, request, *args, **kwargs):
+        pk = kwargs.get('pk')
+
+        async def compute():
+            return self.make_detail_entry(await self.aget_object(pk))
+
+        try:
+            etag, last_modified = await self.aget_object_validators(pk)
+            not_modified = self.get_not_modified(request, etag, last_modified)
+            if not_modified is not None:
+                return self.set_validators(not_modified, etag, last_modified)
+
+            entry = await self.read_through_cache.aget_or_compute(
+                self.get_cache_key(pk),
+                compute,
+                self.cache_timeout,
+                stale_timeout=self.cache_stale_timeout
+            )
+            data, etag, last_modified = self.unpack_detail_entry(pk, entry, etag, last_modified)
+            return self.set_validators(Response(data, status=status.HTTP_200_OK), etag, last_modified)
+
+        except APIException:
+            raise
+        except Exception as e:
+            return self.server_error('get', e, "Failed to fetch object")
+
+    async def put(self, request, *args, **kwargs):
+        try:
+            data = await sync_to_async(self.update_instance)(request, kwargs.get('pk'))
+            return Response(data, status=status.HTTP_200_OK)
+        except APIException:
+            raise
+        except Exception as e:
+            return self.server_error('put', e, "Failed to update object")
+
+    async def delete(self, request, *args, **kwargs):
+        try:
+            await sync_to_async(self.destroy_instance)(request, kwargs.get('pk'))
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        except APIException:
+            raise
+        except Exception as e:
+            return self.server_error('delete', e, "Failed to delete object")
@@ -1,31 +1,43 @@
 # base_views.py
-from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import ValidationError, NotFound
+from rest_framework.exceptions import APIException, ValidationError, NotFound
+from .cache_tags import tagged_cache
+from .exports import StreamingExporter
+from .fast_serializers import compile_serializer
+from .query_planner import query_planner
+from .read_through import read_through_cache
+from .renderers import FastJSONRenderer, RenderedJSON
+import hashlib
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 class CacheMixin:
     """Mixin for cache operations"""
+    tagged_cache = tagged_cache
+    read_through_cache = read_through_cache
 
-    def get_cache_key(self, prefix, identifier):
+    def make_cache_key(self, prefix, identifier):
         return f"{prefix}_{identifier}"
 
-    def invalidate_pattern(self, pattern):
-        """Invalidate cache keys matching pattern (requires Redis)"""
+    def get_cache_tags(self, request):
+        """Tags whose invalidation must drop this view's cached entries"""
+        return []
+
+    def invalidate_tags(self, *tags):
+        """O(1) invalidation: bump each tag's generation instead of scanning keys"""
         try:
-            if hasattr(cache, 'delete_pattern'):  # Redis specific
-                cache.delete_pattern(pattern)
-            else:
-                # Fallback for other cache backends
-                cache.delete(pattern)
+            self.tagged_cache.invalidate(*tags)
         except Exception as e:
-            logger.warning(f"Cache invalidation failed for pattern {pattern}: {str(e)}")
+            logger.warning(f"Cache invalidation failed for tags {tags}: {str(e)}")
 
 class BaseModelAPIView(APIView, CacheMixin):
     """Base class for model-based API views"""
@@ -33,41 +45,186 @@ class BaseModelAPIView(APIView, CacheMixin):
     model = None
     serializer_class = None
     cache_timeout = 300
+    cache_stale_timeout = 60  # Serve the old value this long past cache_timeout while refreshing
     cache_prefix = None
+    pagination_class = None
+    export_fields = None
+    # Max queries per request (an int, or {method: int}); see QueryInstrumentationMiddleware
+    query_budget = None
+    # Lookup from the model to its owning user (e.g. 'manage_by__user'); scopes conditional GETs
+    owner_field = None
+    use_query_planner = True
+    use_fast_serializer = True  # Compiled values()-based rendering for list reads, when the serializer allows
 
     def get_queryset(self):
         return self.model.objects.all()
 
+    def get_serializer_queryset(self, queryset=None):
+        """
+        get_queryset() with joins, prefetches and columns derived from
+        serializer_class, so reads load exactly what the serializer renders.
+        Filtering and ordering stay with get_queryset().
+        """
+        queryset = self.get_queryset() if queryset is None else queryset
+        if not self.use_query_planner or self.serializer_class is None:
+            return queryset
+        required = getattr(self.pagination_class, 'required_fields', ())
+        return query_planner.apply(queryset, self.serializer_class, extra_fields=required)
+
+    def prerender(self, data):
+        """
+        What the read-through cache stores: encoded JSON when the view renders
+        with FastJSONRenderer, so hits hand bytes straight to the response.
+        """
+        renderer_class = self.renderer_classes[0]
+        if issubclass(renderer_class, FastJSONRenderer):
+            return RenderedJSON(renderer_class().render(data))
+        return data
+
+    def get_fast_serializer(self):
+        """The compiled read path for serializer_class, or None to use the DRF serializer"""
+        if not self.use_fast_serializer or self.serializer_class is None:
+            return None
+        return compile_serializer(self.serializer_class)
+
+    def get_values_queryset(self, compiled):
+        required = getattr(self.pagination_class, 'required_fields', ())
+        return compiled.get_queryset(self.get_queryset(), extra_fields=required)
+
+    def get_owned_queryset(self):
+        """get_queryset() narrowed to rows request.user owns, when the view sets owner_field"""
+        queryset = self.get_queryset()
+        if self.owner_field:
+            queryset = queryset.filter(**{self.owner_field: self.request.user})
+        return queryset
+
     def get_object(self, pk):
         try:
-            return self.get_queryset().get(pk=pk)
+            instance = self.get_queryset().get(pk=pk)
         except self.model.DoesNotExist:
             raise NotFound(f"{self.model.__name__} not found")
+        self.check_object(instance)
+        return instance
+
+    def check_object(self, instance):
+        """Override to enforce object-level access (ownership) after the lookup"""
+        pass
+
+    def has_updated_at(self):
+        return any(field.name == 'updated_at' for field in self.model._meta.concrete_fields)
+
+    def make_etag(self, *parts):
+        digest = hashlib.md5(':'.join(str(part) for part in parts).encode(), usedforsecurity=False)
+        return quote_etag(digest.hexdigest())
+
+    def get_not_modified(self, request, etag, last_modified):
+        """Return a 304 when the client's If-None-Match/If-Modified-Since still hold"""
+        if etag is None and last_modified is None:
+            return None
+        return get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None
+        )
+
+    def set_validators(self, response, etag, last_modified):
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
 
 class ListCreateAPIView(BaseModelAPIView):
     """Base class for list and create operations"""
 
     def get_cache_key(self, user_id=None):
         if user_id:
-            return self.get_cache_key(f"user_{self.cache_prefix}", user_id)
-        return self.get_cache_key(self.cache_prefix, "list")
+            return self.make_cache_key(f"user_{self.cache_prefix}", user_id)
+        return self.make_cache_key(self.cache_prefix, "list")
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+    def get_list_data(self, request):
+        compiled = self.get_fast_serializer()
+        if compiled is not None:
+            return self.get_fast_list_data(request, compiled)
+
+        queryset = self.get_serializer_queryset()
+        if self.paginator is not None:
+            page, next_cursor = self.paginator.paginate_queryset(queryset, request)
+            serializer = self.serializer_class(page, many=True)
+            return self.paginator.get_paginated_data(serializer.data, next_cursor)
+        return self.serializer_class(queryset, many=True).data
+
+    def get_fast_list_data(self, request, compiled):
+        queryset = self.get_values_queryset(compiled)
+        if self.paginator is not None:
+            rows, next_cursor = self.paginator.paginate_queryset(queryset, request)
+            return self.paginator.get_paginated_data(compiled.serialize(rows, queryset.db), next_cursor)
+        return compiled.serialize(list(queryset), queryset.db)
+
+    def make_tagged_etag(self, versioned_key):
+        return self.make_etag(versioned_key, int(time.time() // self.cache_timeout))
+
+    def get_list_validators(self, request, versioned_key):
+        """
+        ETag/Last-Modified for the list without serializing it. Tagged views
+        derive the ETag from the tag generations already in the cache key (no
+        query) plus the current cache_timeout bucket: writes that bump no tag
+        (QuerySet.update, bulk_update) then go unnoticed for no longer than
+        the cached page itself would. The rest use MAX(updated_at) and
+        COUNT(*), which catches deletes.
+        """
+        if self.get_cache_tags(request):
+            return self.make_tagged_etag(versioned_key), None
+        if not self.has_updated_at():
+            return None, None
+
+        state = self.get_queryset().order_by().aggregate(
+            last_modified=Max('updated_at'),
+            count=Count('pk')
+        )
+        etag = self.make_etag(versioned_key, state['count'], state['last_modified'])
+        return etag, state['last_modified']
+
+    def export(self, request, export_format):
+        """Stream the full queryset as NDJSON or CSV, bypassing serializers and cache"""
+        exporter = StreamingExporter(self.export_fields)
+        return exporter.get_response(self.get_queryset(), export_format, self.cache_prefix)
 
     def get(self, request, *args, **kwargs):
         try:
-            cache_key = self.get_cache_key(request.user.id)
-            cached_data = cache.get(cache_key)
-
-            if cached_data is not None:
-                return Response(cached_data, status=status.HTTP_200_OK)
+            export_format = request.query_params.get('export')
+            if export_format and self.export_fields:
+                return self.export(request, export_format)
 
-            queryset = self.get_queryset()
-            serializer = self.serializer_class(queryset, many=True)
-
-            # Cache the serialized data
-            cache.set(cache_key, serializer.data, self.cache_timeout)
+            cache_key = self.get_cache_key(request.user.id)
+            if self.paginator is not None:
+                # One cache entry per page rather than per whole list
+                cache_key = self.make_cache_key(cache_key, self.paginator.get_cache_suffix(request))
+
+            versioned_key = self.tagged_cache.make_key(cache_key, self.get_cache_tags(request))
+            etag, last_modified = self.get_list_validators(request, versioned_key)
+            not_modified = self.get_not_modified(request, etag, last_modified)
+            if not_modified is not None:
+                return self.set_validators(not_modified, etag, last_modified)
+
+            # Single-flight, early-refreshed read of the rendered data
+            data = self.read_through_cache.get_or_compute(
+                versioned_key,
+                lambda: self.prerender(self.get_list_data(request)),
+                self.cache_timeout,
+                stale_timeout=self.cache_stale_timeout
+            )
 
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self.set_validators(Response(data, status=status.HTTP_200_OK), etag, last_modified)
 
+        except ValidationError as e:
+            raise e
         except Exception as e:
             logger.error(f"Error in {self.__class__.__name__}.get: {str(e)}")
             return Response(
@@ -75,20 +232,23 @@ class ListCreateAPIView(BaseModelAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def post(self, request, *args, **kwargs):
-        try:
-            with transaction.atomic():
-                serializer = self.serializer_class(data=request.data)
-                serializer.is_valid(raise_exception=True)
-                instance = self.perform_create(serializer)
+    def create_instance(self, request):
+        with transaction.atomic():
+            serializer = self.serializer_class(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            instance = self.perform_create(serializer)
 
-                # Invalidate relevant caches
-                self.invalidate_caches(request, instance)
+            # Invalidate relevant caches
+            self.invalidate_caches(request, instance)
+            return instance
 
-                return Response(
-                    self.serializer_class(instance).data,
-                    status=status.HTTP_201_CREATED
-                )
+    def post(self, request, *args, **kwargs):
+        try:
+            instance = self.create_instance(request)
+            return Response(
+                self.serializer_class(instance).data,
+                status=status.HTTP_201_CREATED
+            )
 
         except ValidationError as e:
             raise e
@@ -104,32 +264,66 @@ class ListCreateAPIView(BaseModelAPIView):
 
     def invalidate_caches(self, request, instance):
         """Override in subclasses to define cache invalidation logic"""
-        pass
+        self.invalidate_tags(*self.get_cache_tags(request))
 
 class RetrieveUpdateDestroyAPIView(BaseModelAPIView):
     """Base class for retrieve, update, and destroy operations"""
 
     def get_cache_key(self, pk):
-        return self.get_cache_key(self.cache_prefix, pk)
+        return self.make_cache_key(self.cache_prefix, pk)
+
+    def get_object_validators(self, pk):
+        """
+        ETag/Last-Modified from the row's updated_at, read with a single
+        indexed lookup scoped to the owner. Anyone else gets get_object()'s
+        403/404 instead of validators, a 304 or a cached body.
+        """
+        if not self.has_updated_at():
+            return None, None
+
+        last_modified = self.get_owned_queryset().filter(pk=pk).values_list('updated_at', flat=True).first()
+        if last_modified is None:
+            if self.owner_field:
+                self.get_object(pk)
+            return None, None
+        return self.make_etag(self.get_cache_key(pk), last_modified), last_modified
+
+    def make_detail_entry(self, instance):
+        """What the detail cache stores: the rendered body and the updated_at it was rendered from"""
+        updated_at = instance.updated_at if self.has_updated_at() else None
+        return self.prerender(self.serializer_class(instance).data), updated_at
+
+    def unpack_detail_entry(self, pk, entry, etag, last_modified):
+        """
+        The body with validators for that body. The row may have moved on
+        since it was cached (a stale read-through hit, an update() that sent
+        no signal), and its ETag must not be paired with the older body.
+        """
+        data, updated_at = entry
+        if updated_at is None:
+            return data, etag, last_modified
+        return data, self.make_etag(self.get_cache_key(pk), updated_at), updated_at
 
     def get(self, request, *args, **kwargs):
         try:
             pk = kwargs.get('pk')
-            cache_key = self.get_cache_key(pk)
-            cached_data = cache.get(cache_key)
-
-            if cached_data is not None:
-                return Response(cached_data, status=status.HTTP_200_OK)
-
-            instance = self.get_object(pk)
-            serializer = self.serializer_class(instance)
-
-            cache.set(cache_key, serializer.data, self.cache_timeout)
+            etag, last_modified = self.get_object_validators(pk)
+            not_modified = self.get_not_modified(request, etag, last_modified)
+            if not_modified is not None:
+                return self.set_validators(not_modified, etag, last_modified)
+
+            entry = self.read_through_cache.get_or_compute(
+                self.get_cache_key(pk),
+                lambda: self.make_detail_entry(self.get_object(pk)),
+                self.cache_timeout,
+                stale_timeout=self.cache_stale_timeout
+            )
+            data, etag, last_modified = self.unpack_detail_entry(pk, entry, etag, last_modified)
 
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self.set_validators(Response(data, status=status.HTTP_200_OK), etag, last_modified)
 
-        except NotFound as e:
-            raise e
+        except APIException:
+            raise
         except Exception as e:
             logger.error(f"Error in {self.__class__.__name__}.get: {str(e)}")
             return Response(
@@ -137,21 +331,25 @@ class RetrieveUpdateDestroyAPIView(BaseModelAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def put(self, request, *args, **kwargs):
-        try:
-            with transaction.atomic():
-                instance = self.get_object(kwargs.get('pk'))
-                serializer = self.serializer_class(
-                    instance,
-                    data=request.data,
-                    partial=True
-                )
-                serializer.is_valid(raise_exception=True)
-                updated_instance = serializer.save()
+    def update_instance(self, request, pk):
+        """Partial update inside a transaction; returns the serialized instance"""
+        with transaction.atomic():
+            instance = self.get_object(pk)
+            serializer = self.serializer_class(
+                instance,
+                data=request.data,
+                partial=True
+            )
+            serializer.is_valid(raise_exception=True)
+            updated_instance = serializer.save()
 
-                self.invalidate_caches(request, updated_instance)
+            self.invalidate_caches(request, updated_instance)
+            return serializer.data
 
-                return Response(serializer.data, status=status.HTTP_200_OK)
+    def put(self, request, *args, **kwargs):
+        try:
+            data = self.update_instance(request, kwargs.get('pk'))
+            return Response(data, status=status.HTTP_200_OK)
 
         except (NotFound, ValidationError) as e:
             raise e
@@ -162,17 +360,18 @@ class RetrieveUpdateDestroyAPIView(BaseModelAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def destroy_instance(self, request, pk):
+        with transaction.atomic():
+            instance = self.get_object(pk)
+            instance.delete()
+            # delete() clears the pk, which invalidate_caches needs for the detail key
+            instance.pk = pk
+            self.invalidate_caches(request, instance, deleted=True)
+
     def delete(self, request, *args, **kwargs):
         try:
-            with transaction.atomic():
-                instance = self.get_object(kwargs.get('pk'))
-                instance_id = instance.id
-                user_id = request.user.id
-
-                instance.delete()
-                self.invalidate_caches(request, instance, deleted=True)
-
-                return Response(status=status.HTTP_204_NO_CONTENT)
+            self.destroy_instance(request, kwargs.get('pk'))
+            return Response(status=status.HTTP_204_NO_CONTENT)
 
         except NotFound as e:
             raise e
@@ -0,0 +1,304 @@
+# bulk_import.py
+import csv
+import io
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connections, transaction
+
+from .models import ClientModel, CustomUser
+from .sharding import get_shard_map, partition_for
+
+logger = logging.getLogger(__name__)
+
+COPY_NULL = '\\N'
+
+
+def init_hashing_worker(settings_module):
+    """Process pool initializer: workers need configured settings for PASSWORD_HASHERS"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+class ImportStats:
+    """Progress and throughput counters for one import run"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.rows_rejected = 0
+        self.batches = 0
+        self.rows_per_shard = defaultdict(int)
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows_read': self.rows_read,
+            'rows_imported': self.rows_imported,
+            'rows_rejected': self.rows_rejected,
+            'batches': self.batches,
+            'rows_per_shard': dict(self.rows_per_shard),
+            'elapsed_seconds': round(self.elapsed, 2),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+class BulkImportPipeline:
+    """
+    Streaming CSV/NDJSON import for partitioned models.
+
+    read -> batch -> validate + assign partition_key -> hash passwords in a
+    process pool -> group by shard -> COPY FROM STDIN (PostgreSQL) or
+    bulk_create (other backends). Rows are never all held in memory.
+    """
+    model = CustomUser
+    required_fields = ['email', 'first_name', 'last_name']
+    optional_fields = ['phone', 'bio', 'profile_pic', 'signup_source', 'is_active']
+
+    def __init__(self, batch_size=5000, workers=None, progress_every=100000, on_progress=None):
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count()
+        self.progress_every = progress_every
+        self.on_progress = on_progress
+        self.rejects = []
+        self._executor = None
+
+    # Reading
+
+    def read(self, path, file_format=None):
+        file_format = file_format or ('csv' if str(path).endswith('.csv') else 'ndjson')
+        with open(path, newline='', encoding='utf-8') as handle:
+            if file_format == 'csv':
+                yield from csv.DictReader(handle)
+            elif file_format == 'ndjson':
+                for line in handle:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                raise ValueError(f"Unsupported import format '{file_format}'")
+
+    def batches(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # Validation and partitioning
+
+    def clean(self, row):
+        missing = [field for field in self.required_fields if not row.get(field)]
+        if missing:
+            raise ValidationError(f"Missing {', '.join(missing)}")
+
+        email = self.model.objects.normalize_email(row['email'].strip())
+        validate_email(email)
+        if row['first_name'] == row['last_name']:
+            raise ValidationError('First name and last name should not be the same')
+
+        cleaned = {field: row[field] for field in self.optional_fields if row.get(field) not in (None, '')}
+        if isinstance(cleaned.get('is_active'), str):
+            cleaned['is_active'] = cleaned['is_active'].lower() in ('1', 'true', 'yes')
+        cleaned.update(
+            email=email,
+            first_name=row['first_name'],
+            last_name=row['last_name'],
+            partition_key=partition_for(email),
+        )
+        return self.check_lengths(cleaned)
+
+    def check_lengths(self, cleaned):
+        """
+        Reject the row, not the batch: on PostgreSQL one over-long value fails
+        the whole COPY, and SQLite would store it untruncated.
+        """
+        for name, value in cleaned.items():
+            max_length = self.model._meta.get_field(name).max_length
+            if max_length and isinstance(value, str) and len(value) > max_length:
+                raise ValidationError(f"{name} is longer than {max_length} characters")
+        return cleaned
+
+    def prepare(self, batch, stats):
+        valid, sources = [], []
+        for row in batch:
+            try:
+                valid.append(self.clean(row))
+                sources.append(row)
+            except ValidationError as e:
+                stats.rows_rejected += 1
+                self.rejects.append((row.get('email'), ' '.join(e.messages)))
+        return valid, sources
+
+    def hash_passwords(self, valid, sources):
+        """Hash raw passwords in the process pool; PBKDF2 is far too slow for one core"""
+        to_hash = []
+        for index, row in enumerate(sources):
+            if row.get('password_hash'):
+                # Already-encoded hashes (e.g. migrated from another system) pass through
+                valid[index]['password'] = row['password_hash']
+            elif row.get('password'):
+                to_hash.append(index)
+            else:
+                valid[index]['password'] = make_password(None)  # Unusable password
+
+        if to_hash:
+            chunksize = max(1, len(to_hash) // (self.workers * 4))
+            hashed = self.executor.map(make_password, [sources[index]['password'] for index in to_hash], chunksize=chunksize)
+            for index, encoded in zip(to_hash, hashed):
+                valid[index]['password'] = encoded
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_hashing_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'src.settings'),)
+            )
+        return self._executor
+
+    # Writing
+
+    def group_by_shard(self, rows):
+        shard_map = get_shard_map()
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[shard_map.shard_for(row['partition_key'])].append(row)
+        return grouped
+
+    def build_instances(self, rows):
+        instances = []
+        for row in rows:
+            instance = self.model(**row)
+            for field in self.model._meta.concrete_fields:
+                # Fill auto_now/auto_now_add, since save() is never called
+                setattr(instance, field.attname, field.pre_save(instance, add=True))
+            instances.append(instance)
+        return instances
+
+    def write(self, alias, rows):
+        instances = self.build_instances(rows)
+        connection = connections[alias]
+        with transaction.atomic(using=alias):
+            if connection.vendor == 'postgresql':
+                return self.copy_rows(connection, instances)
+            # ignore_conflicts cannot tell skipped duplicates apart, so this counts rows sent
+            created = self.model.objects.using(alias).bulk_create(instances, ignore_conflicts=True)
+            return len(created)
+
+    def copy_rows(self, connection, instances):
+        """COPY into a temp table, then INSERT ... ON CONFLICT DO NOTHING to skip duplicates"""
+        table = self.model._meta.db_table
+        fields = self.model._meta.concrete_fields
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for instance in instances:
+            row = []
+            for field in fields:
+                value = field.get_db_prep_save(getattr(instance, field.attname), connection)
+                row.append(COPY_NULL if value is None else value)
+            writer.writerow(row)
+        buffer.seek(0)
+
+        copy_sql = f"COPY import_staging ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE import_staging (LIKE {connection.ops.quote_name(table)} INCLUDING DEFAULTS) "
+                f"ON COMMIT DROP"
+            )
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):  # psycopg2
+                raw.copy_expert(copy_sql, buffer)
+            else:  # psycopg 3
+                with raw.copy(copy_sql) as copy:
+                    copy.write(buffer.getvalue())
+            cursor.execute(
+                f"INSERT INTO {connection.ops.quote_name(table)} ({columns}) "
+                f"SELECT {columns} FROM import_staging ON CONFLICT DO NOTHING"
+            )
+            return cursor.rowcount
+
+    # Driving
+
+    def run_rows(self, rows):
+        stats = ImportStats()
+        next_report = self.progress_every
+        try:
+            for batch in self.batches(rows):
+                stats.rows_read += len(batch)
+                stats.batches += 1
+
+                valid, sources = self.prepare(batch, stats)
+                self.hash_passwords(valid, sources)
+
+                for alias, shard_rows in self.group_by_shard(valid).items():
+                    imported = self.write(alias, shard_rows)
+                    stats.rows_imported += imported
+                    stats.rows_per_shard[alias] += imported
+
+                if stats.rows_read >= next_report:
+                    next_report += self.progress_every
+                    logger.info(
+                        f"Imported {stats.rows_imported}/{stats.rows_read} rows "
+                        f"({stats.rows_per_second:.0f} rows/s, {stats.rows_rejected} rejected)"
+                    )
+                    if self.on_progress:
+                        self.on_progress(stats)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+        logger.info(f"Import finished: {stats.as_dict()}")
+        return stats
+
+    def run(self, path, file_format=None):
+        return self.run_rows(self.read(path, file_format))
+
+
+class ClientImportPipeline(BulkImportPipeline):
+    """Client rows carry no password; partition follows the email like ClientModel.save()"""
+    model = ClientModel
+    required_fields = ['full_name', 'email']
+    optional_fields = ['phone', 'client_tier', 'status', 'lifetime_value', 'country_code', 'timezone']
+
+    def clean(self, row):
+        missing = [field for field in self.required_fields if not row.get(field)]
+        if missing:
+            raise ValidationError(f"Missing {', '.join(missing)}")
+
+        email = row['email'].strip().lower()
+        validate_email(email)
+        cleaned = {field: row[field] for field in self.optional_fields if row.get(field) not in (None, '')}
+        cleaned.update(full_name=row['full_name'], email=email, partition_key=partition_for(email))
+        if 'lifetime_value' in cleaned:
+            try:
+                cleaned['lifetime_value'] = Decimal(str(cleaned['lifetime_value']))
+            except InvalidOperation:
+                raise ValidationError('lifetime_value must be a number')
+        return self.check_lengths(cleaned)
+
+    def hash_passwords(self, valid, sources):
+        pass
@@ -1,6 +1,13 @@
-from src.core.models import CustomUser, ClientModel
+from .models import ClientModel
+from .bulk_import import BulkImportPipeline
+from .bulk_transitions import ClientStatusTransition
+from .cache_tags import tagged_cache
+from .response_cache import response_cache
+from .serializers import ClientUpsertSerializer
 
-from django.db import transaction, connection
+from collections import defaultdict
+from django.core.cache import cache
+from django.db import transaction, connection, connections, router
 from django.db.models import Q
 import logging
 
@@ -11,27 +18,12 @@ class BulkOperations:
 
     @staticmethod
     def bulk_create_users(user_data, batch_size=1000):
-        """Bulk create users with optimized batch size"""
-        users = []
-        created_count = 0
-
-        for data in user_data:
-            user = CustomUser(**data)
-            users.append(user)
-
-            if len(users) >= batch_size:
-                with transaction.atomic():
-                    CustomUser.objects.bulk_create(users, ignore_conflicts=True)
-                    created_count += len(users)
-                    users = []
-                    logger.info(f"Created {created_count} users...")
-
-        if users:
-            with transaction.atomic():
-                CustomUser.objects.bulk_create(users, ignore_conflicts=True)
-                created_count += len(users)
-
-        return created_count
+        """
+        Bulk create users from an iterable of dicts. Runs the import pipeline, so
+        passwords are hashed and partition_key is set even though save() is skipped.
+        """
+        stats = BulkImportPipeline(batch_size=batch_size).run_rows(user_data)
+        return stats.rows_imported
 
     @staticmethod
     def bulk_update_client_status(client_ids, new_status, batch_size=500):
@@ -49,4 +41,146 @@ class BulkOperations:
 
             logger.info(f"Updated {updated_count} clients...")
 
-        return updated_count
\ No newline at end of file
+        return updated_count
+
+    @staticmethod
+    def transition_client_status(filters, new_status, chunk_size=1000):
+        """
+        Queue a set-based status change for all clients matching `filters`
+        (client_tier, country_code, status, manager). Returns the job id;
+        progress is available from ClientStatusTransition.load(job_id).
+        """
+        return ClientStatusTransition.start(filters, new_status, chunk_size=chunk_size)
+
+    @staticmethod
+    def bulk_upsert_clients(lead, rows, batch_size=500):
+        """
+        Insert or update a lead's clients keyed on (email, partition_key) with one
+        INSERT ... ON CONFLICT DO UPDATE per batch (per set of supplied fields, so
+        omitted fields keep their stored values). Rows another lead manages are
+        never updated, even if that lead took them after they were read: they
+        come back as conflicts. Returns one outcome per input row, in order.
+        Caches are invalidated once per batch, not once per row.
+        """
+        outcomes = [None] * len(rows)
+        # Clients live with their lead's partition (see ClientModel.save)
+        alias = router.db_for_write(ClientModel, partition_key=lead.partition_key)
+
+        for start in range(0, len(rows), batch_size):
+            candidates = {}
+            for index, row in enumerate(rows[start:start + batch_size], start=start):
+                serializer = ClientUpsertSerializer(data=row)
+                if not serializer.is_valid():
+                    outcomes[index] = {'index': index, 'status': 'invalid', 'errors': serializer.errors}
+                    continue
+                email = serializer.validated_data['email']
+                if email in candidates:
+                    # Last row wins, as the database would have applied it last
+                    previous = candidates[email][0]
+                    outcomes[previous] = {'index': previous, 'email': email, 'status': 'superseded'}
+                candidates[email] = (index, serializer.validated_data)
+
+            if not candidates:
+                continue
+
+            written = set()
+            with transaction.atomic(using=alias):
+                # Read on the primary, in the transaction that writes
+                existing = {
+                    email: (pk, manage_by_id)
+                    for email, pk, manage_by_id in ClientModel.objects.using(alias).filter(
+                        partition_key=lead.partition_key,
+                        email__in=candidates.keys()
+                    ).values_list('email', 'id', 'manage_by_id')
+                }
+
+                objs = defaultdict(list)
+                for email, (index, data) in candidates.items():
+                    if email in existing and existing[email][1] != lead.id:
+                        outcomes[index] = BulkOperations.upsert_conflict(index, email)
+                        continue
+                    provided = tuple(sorted(field for field in data if field != 'email'))
+                    objs[provided].append(ClientModel(
+                        **data,
+                        manage_by=lead,
+                        partition_key=lead.partition_key
+                    ))
+                    outcomes[index] = {
+                        'index': index,
+                        'email': email,
+                        'status': 'updated' if email in existing else 'created',
+                    }
+
+                for provided, group in objs.items():
+                    written |= BulkOperations.upsert_managed_clients(alias, group, [*provided, 'updated_at'])
+
+            for email, (index, _) in candidates.items():
+                if outcomes[index]['status'] in ('created', 'updated') and email not in written:
+                    # Taken by another lead between our read and the upsert
+                    outcomes[index] = BulkOperations.upsert_conflict(index, email)
+
+            if not written:
+                continue
+            tagged_cache.invalidate(f"clients:user:{lead.user_id}")
+            detail_keys = [f"client_{existing[email][0]}" for email in written if email in existing]
+            cache.delete_many(detail_keys)
+            response_cache.delete(*detail_keys)
+            logger.info(f"Upserted {len(written)} clients for lead {lead.id}")
+
+        return outcomes
+
+    @staticmethod
+    def upsert_conflict(index, email):
+        return {
+            'index': index, 'email': email, 'status': 'conflict',
+            'errors': ['Client is managed by another lead'],
+        }
+
+    @staticmethod
+    def upsert_managed_clients(alias, objs, update_fields):
+        """
+        INSERT ... ON CONFLICT (email, partition_key) DO UPDATE ... WHERE the
+        stored row has the same manage_by, RETURNING the emails written.
+        bulk_create() cannot add that WHERE, so on PostgreSQL and SQLite the
+        statement is built here. Other backends fall back to bulk_create()
+        and rely on the caller's in-transaction read.
+        """
+        db_connection = connections[alias]
+        if db_connection.vendor not in ('postgresql', 'sqlite'):
+            ClientModel.objects.using(alias).bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=['email', 'partition_key'],
+                update_fields=update_fields,
+            )
+            return {obj.email for obj in objs}
+
+        meta = ClientModel._meta
+        fields = meta.concrete_fields
+        qn = db_connection.ops.quote_name
+        table = qn(meta.db_table)
+        assignments = ', '.join(
+            f"{qn(column)} = EXCLUDED.{qn(column)}"
+            for column in (meta.get_field(name).column for name in update_fields)
+        )
+        manage_by = qn(meta.get_field('manage_by').column)
+
+        written = set()
+        batch_size = db_connection.ops.bulk_batch_size(fields, objs) or len(objs)
+        with db_connection.cursor() as cursor:
+            for start in range(0, len(objs), batch_size):
+                batch = objs[start:start + batch_size]
+                placeholders = ', '.join([f"({', '.join(['%s'] * len(fields))})"] * len(batch))
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) "
+                    f"VALUES {placeholders} "
+                    f"ON CONFLICT ({qn('email')}, {qn('partition_key')}) DO UPDATE SET {assignments} "
+                    f"WHERE {table}.{manage_by} = EXCLUDED.{manage_by} "
+                    f"RETURNING {qn('email')}",
+                    [
+                        field.get_db_prep_save(field.pre_save(obj, True), db_connection)
+                        for obj in batch for field in fields
+                    ]
+                )
+                written.update(email for email, in cursor.fetchall())
+        return written
@@ -0,0 +1,183 @@
+# bulk_transitions.py
+import logging
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .cache_tags import tagged_cache
+from .models import BulkTransitionCheckpoint, ClientModel
+from .replicas import use_primary
+from .response_cache import response_cache
+from .sharding import get_shard_map
+
+logger = logging.getLogger(__name__)
+
+
+class ClientStatusTransition:
+    """
+    Set-based status change for every client matching a filter expression.
+
+    The job walks each shard in primary-key order, one keyset range of
+    `chunk_size` rows at a time, and updates the range with a single UPDATE
+    (no IN list). Progress is checkpointed in a BulkTransitionCheckpoint row
+    after every chunk so a retried or re-queued Celery task resumes where the
+    last one stopped, even after a cache flush.
+    List caches are invalidated once per affected owner when the job ends.
+    """
+    # Filter expression key -> ORM lookup; list values become __in lookups
+    filter_fields = {
+        'client_tier': 'client_tier',
+        'country_code': 'country_code',
+        'status': 'status',
+        'manager': 'manage_by_id',
+    }
+    def __init__(self, job_id, filters, new_status, chunk_size=1000, state=None):
+        self.job_id = job_id
+        self.filters = filters
+        self.new_status = new_status
+        self.chunk_size = chunk_size
+        self.state = state or {
+            'status': 'pending',
+            'cursors': {},  # shard alias -> last id processed
+            'done_shards': [],
+            'updated': 0,
+            'owners': [],  # user ids whose client lists changed
+            'started_at': timezone.now().isoformat(),
+            'finished_at': None,
+        }
+
+    @classmethod
+    def validate(cls, filters, new_status):
+        errors = {}
+        unknown = set(filters) - set(cls.filter_fields)
+        if unknown:
+            errors['filters'] = f"Unsupported filters: {', '.join(sorted(unknown))}"
+        if not filters:
+            errors['filters'] = "At least one filter is required"
+        statuses = {choice for choice, _ in ClientModel._meta.get_field('status').choices}
+        if new_status not in statuses:
+            errors['new_status'] = f"Must be one of: {', '.join(sorted(statuses))}"
+        return errors
+
+    @classmethod
+    def start(cls, filters, new_status, chunk_size=1000):
+        """Checkpoint a new job and queue it; returns the job id"""
+        from .tasks import transition_client_status_task
+
+        job = cls(uuid.uuid4().hex, filters, new_status, chunk_size)
+        job.save()
+        transition_client_status_task.delay(job.job_id)
+        logger.info(f"Queued status transition {job.job_id} to '{new_status}' for {filters}")
+        return job.job_id
+
+    @classmethod
+    def load(cls, job_id):
+        # A replica could hand a resuming task an older cursor
+        with use_primary():
+            checkpoint = BulkTransitionCheckpoint.objects.filter(job_id=job_id).first()
+        if checkpoint is None:
+            return None
+        return cls(job_id, checkpoint.filters, checkpoint.new_status, checkpoint.chunk_size, checkpoint.state)
+
+    def save(self):
+        BulkTransitionCheckpoint.objects.update_or_create(
+            job_id=self.job_id,
+            defaults={
+                'filters': self.filters,
+                'new_status': self.new_status,
+                'chunk_size': self.chunk_size,
+                'state': self.state,
+            }
+        )
+
+    def as_dict(self):
+        return {
+            'job_id': self.job_id,
+            'filters': self.filters,
+            'new_status': self.new_status,
+            'chunk_size': self.chunk_size,
+            'state': self.state,
+        }
+
+    @property
+    def finished(self):
+        return self.state['status'] in ('completed', 'failed')
+
+    def get_queryset(self, alias):
+        lookups = {}
+        for key, value in self.filters.items():
+            field = self.filter_fields[key]
+            if isinstance(value, (list, tuple)):
+                lookups[f"{field}__in"] = value
+            else:
+                lookups[field] = value
+        # Rows already in the target status are skipped, so re-running a chunk is a no-op
+        return ClientModel.objects.using(alias).filter(**lookups).exclude(status=self.new_status)
+
+    def pending_shards(self):
+        return [alias for alias in get_shard_map().shards if alias not in self.state['done_shards']]
+
+    def run_chunk(self, alias):
+        """Update the next keyset range on one shard; returns False once the shard is exhausted"""
+        queryset = self.get_queryset(alias)
+        last_id = self.state['cursors'].get(alias)
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:self.chunk_size])
+        if not ids:
+            self.state['done_shards'].append(alias)
+            return False
+
+        in_range = queryset.filter(id__lte=ids[-1])
+        with transaction.atomic(using=alias):
+            # Leads are co-located with their clients, so this join stays on the shard
+            owners = set(in_range.exclude(manage_by=None).values_list('manage_by__user_id', flat=True).distinct())
+            updated = in_range.update(status=self.new_status, updated_at=timezone.now())
+
+        # Detail entries are keyed by row, so they go per chunk; list tags go once per owner at the end
+        detail_keys = [f"client_{pk}" for pk in ids]
+        cache.delete_many(detail_keys)
+        response_cache.delete(*detail_keys)
+        self.state['owners'] = sorted(set(self.state['owners']) | {str(owner) for owner in owners})
+        self.state['cursors'][alias] = str(ids[-1])
+        self.state['updated'] += updated
+        return True
+
+    def run(self, max_chunks=None):
+        """Process up to max_chunks chunks (all when None); returns True when the job is complete"""
+        self.state['status'] = 'running'
+        processed = 0
+        with use_primary():
+            for alias in self.pending_shards():
+                while max_chunks is None or processed < max_chunks:
+                    if not self.run_chunk(alias):
+                        break
+                    processed += 1
+                    self.save()
+                else:
+                    self.save()
+                    return False
+            self.finish()
+        return True
+
+    def finish(self):
+        owners = self.state['owners']
+        if owners:
+            tagged_cache.invalidate(*(f"clients:user:{user_id}" for user_id in owners))
+
+        self.state['status'] = 'completed'
+        self.state['finished_at'] = timezone.now().isoformat()
+        self.save()
+        logger.info(
+            f"Status transition {self.job_id} updated {self.state['updated']} clients "
+            f"for {len(owners)} owners"
+        )
+
+    def fail(self, error):
+        self.state['status'] = 'failed'
+        self.state['error'] = str(error)
+        self.state['finished_at'] = timezone.now().isoformat()
+        self.save()
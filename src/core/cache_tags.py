@@ -0,0 +1,106 @@
+# cache_tags.py
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .async_cache import async_cache
+
+
+class TaggedCache:
+    """
+    Tag-based invalidation through versioned namespaces.
+
+    Every tag (e.g. ``leads:user:<id>``) owns a generation counter. Entries are
+    stored under a key that embeds the current generation of each of their
+    tags, so bumping a counter orphans every entry carrying that tag in O(1).
+    Orphaned entries are never read again and simply age out through their TTL.
+    Only get/set/add/incr are used, so it behaves the same on Redis and LocMem.
+    """
+    version_prefix = 'tagver'
+
+    def __init__(self, backend=None, async_backend=None):
+        self._backend = backend
+        self._async_backend = async_backend
+
+    @property
+    def cache(self):
+        return self._backend or cache
+
+    @property
+    def acache(self):
+        return self._async_backend or async_cache
+
+    def version_key(self, tag):
+        return f"{self.version_prefix}:{tag}"
+
+    def new_generation(self):
+        # Seeding from the clock means a counter lost to eviction never
+        # restarts at a value that old entries were stored under
+        return int(time.time() * 1000)
+
+    def get_versions(self, tags):
+        keys = [self.version_key(tag) for tag in tags]
+        versions = self.cache.get_many(keys)
+
+        for key in keys:
+            if key not in versions:
+                self.cache.add(key, self.new_generation(), None)
+                versions[key] = self.cache.get(key)
+
+        return [versions[key] for key in keys]
+
+    async def aget_versions(self, tags):
+        keys = [self.version_key(tag) for tag in tags]
+        versions = await self.acache.aget_many(keys)
+
+        for key in keys:
+            if key not in versions:
+                await self.acache.aadd(key, self.new_generation(), None)
+                versions[key] = await self.acache.aget(key)
+
+        return [versions[key] for key in keys]
+
+    def make_key(self, key, tags):
+        tags = sorted(tags)
+        if not tags:
+            return key
+        generations = '.'.join(str(version) for version in self.get_versions(tags))
+        return f"{key}@{generations}"
+
+    async def amake_key(self, key, tags):
+        tags = sorted(tags)
+        if not tags:
+            return key
+        generations = '.'.join(str(version) for version in await self.aget_versions(tags))
+        return f"{key}@{generations}"
+
+    def get(self, key, tags, default=None):
+        return self.cache.get(self.make_key(key, tags), default)
+
+    def set(self, key, value, tags, timeout=None):
+        self.cache.set(self.make_key(key, tags), value, timeout)
+
+    def invalidate(self, *tags):
+        """Bump the generation of every tag; entries stored under the old one become unreachable"""
+        for tag in tags:
+            key = self.version_key(tag)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                # Counter missing or evicted: a fresh generation is just as good
+                self.cache.add(key, self.new_generation(), None)
+
+    async def ainvalidate(self, *tags):
+        if self._backend is not None:
+            # Custom backends (e.g. TieredCache) broadcast invalidations from their sync path
+            return await sync_to_async(self.invalidate)(*tags)
+        for tag in tags:
+            key = self.version_key(tag)
+            try:
+                await self.acache.aincr(key)
+            except ValueError:
+                await self.acache.aadd(key, self.new_generation(), None)
+
+
+tagged_cache = TaggedCache()
@@ -0,0 +1,182 @@
+# compression.py
+import gzip
+import hashlib
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'text/',
+)
+
+DEFAULT_LEVELS = {'zstd': 3, 'br': 5, 'gzip': 6}
+
+
+def get_compression_settings():
+    return getattr(settings, 'RESPONSE_COMPRESSION', {})
+
+
+def compress_gzip(body, level):
+    # mtime=0 keeps the output deterministic, so equal bodies give equal bytes
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def compress_brotli(body, level):
+    return brotli.compress(body, quality=level)
+
+
+def compress_zstd(body, level):
+    # Compressor objects are not thread-safe; one per call is cheap next to the work itself
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+def available_codecs():
+    """Content-coding -> compress(body, level), for the libraries that are installed"""
+    codecs = {'gzip': compress_gzip}
+    if brotli is not None:
+        codecs['br'] = compress_brotli
+    if zstandard is not None:
+        codecs['zstd'] = compress_zstd
+    return codecs
+
+
+CODECS = available_codecs()
+
+
+def parse_accept_encoding(header):
+    """Accept-Encoding as {coding: q}, e.g. 'gzip, br;q=0.8' -> {'gzip': 1.0, 'br': 0.8}"""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(header, preference):
+    """
+    The content-coding to use for an Accept-Encoding header: the highest q
+    among the codings we support, ties broken by our `preference` order.
+    None means send the body as it is.
+    """
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+
+    best, best_q = None, 0.0
+    for coding in preference:
+        if coding not in CODECS:
+            continue
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressedVariants:
+    """
+    Compressed bodies cached next to the responses they came from, keyed by
+    content-coding and a digest of the body itself, so a repeated hit on a
+    cached response is one hash and one cache read instead of a
+    recompression, and two bodies can never share a variant. Only bodies
+    with an ETag (cached responses, which repeat) are stored. b'' is cached
+    for bodies that did not get smaller.
+    """
+    key_prefix = 'compressed'
+
+    def __init__(self, alias=None):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias or get_compression_settings().get('CACHE_ALIAS', 'default')]
+
+    def make_key(self, coding, body):
+        # An ETag can outlive the body it was made for; the body's digest cannot
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        return f"{self.key_prefix}:{coding}:{digest}"
+
+    def get_timeout(self):
+        return get_compression_settings().get('CACHE_TIMEOUT', 300)
+
+    def compress(self, coding, body):
+        levels = {**DEFAULT_LEVELS, **get_compression_settings().get('LEVELS', {})}
+        compressed = CODECS[coding](body, levels[coding])
+        return compressed if len(compressed) < len(body) else b''
+
+    async def acompress(self, coding, body):
+        # Large bodies are compressed on a worker thread (zlib, brotli and zstd
+        # release the GIL) so the event loop keeps serving other requests
+        if len(body) < get_compression_settings().get('OFFLOAD_SIZE', 64 * 1024):
+            return self.compress(coding, body)
+        return await sync_to_async(self.compress, thread_sensitive=False)(coding, body)
+
+    def get_or_compress(self, coding, body, etag=None):
+        if etag is None:
+            return self.compress(coding, body)
+
+        key = self.make_key(coding, body)
+        try:
+            compressed = self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"Compressed variant lookup failed: {str(e)}")
+            return self.compress(coding, body)
+
+        if compressed is None:
+            compressed = self.compress(coding, body)
+            try:
+                self.cache.set(key, compressed, self.get_timeout())
+            except Exception as e:
+                logger.warning(f"Compressed variant store failed: {str(e)}")
+        return compressed
+
+    async def aget_or_compress(self, coding, body, etag=None):
+        if etag is None:
+            return await self.acompress(coding, body)
+
+        key = self.make_key(coding, body)
+        try:
+            compressed = await self.cache.aget(key)
+        except Exception as e:
+            logger.warning(f"Compressed variant lookup failed: {str(e)}")
+            return await self.acompress(coding, body)
+
+        if compressed is None:
+            compressed = await self.acompress(coding, body)
+            try:
+                await self.cache.aset(key, compressed, self.get_timeout())
+            except Exception as e:
+                logger.warning(f"Compressed variant store failed: {str(e)}")
+        return compressed
+
+
+compressed_variants = CompressedVariants()
@@ -1,61 +1,74 @@
 # database_router.py
+from django.db import connections
+
+from .replicas import get_routing_state, mark_write, replica_pool
+from .sharding import get_shard_map
+
+
 class PartitionRouter:
     """
-    Database router for partitioning across multiple databases
+    Database router for partitioning across multiple databases.
+
+    Partitioned models are routed through the consistent-hash ShardMap using
+    either the `instance` hint (saves, related managers) or the
+    `partition_key` hint that PartitionedQuerySet.filter(partition_key=...)
+    attaches. Unpartitioned models fall through to 'default'; partitioned
+    querysets without a key fan out over every shard themselves (see
+    PartitionedQuerySet).
+
+    Reads are then spread over that primary's healthy replicas, except inside
+    a transaction or while ReadYourWritesMiddleware has the request pinned to
+    the primary after a write.
+
+    Shard layout lives in settings.SHARDING and replicas in
+    settings.DATABASE_REPLICAS; see src/settings.py.
     """
-    def db_for_read(self, model, **hints):
-        if hasattr(model, 'partition_key'):
-            # Route based on partition key for reads
-            instance = hints.get('instance')
-            if instance and hasattr(instance, 'partition_key'):
-                return f'partition_{instance.partition_key % 3}'  # 3 read replicas
+
+    def is_partitioned(self, model):
+        return any(field.name == 'partition_key' for field in model._meta.concrete_fields)
+
+    def get_partition_key(self, hints):
+        instance = hints.get('instance')
+        # Never read a deferred partition_key: loading it would route again
+        if instance is not None and 'partition_key' in instance.__dict__:
+            return instance.partition_key
+        return hints.get('partition_key')
+
+    def db_for_partitioned(self, model, hints):
+        if not self.is_partitioned(model):
+            return 'default'
+        partition_key = self.get_partition_key(hints)
+        if partition_key is not None:
+            return get_shard_map().shard_for(partition_key)
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related lookups from an unpartitioned row (a token's user) stay on its database
+            return replica_pool.primary_of(instance._state.db)
         return 'default'
 
+    def db_for_read(self, model, **hints):
+        primary = self.db_for_partitioned(model, hints)
+        if connections[primary].in_atomic_block:
+            return primary
+
+        state = get_routing_state()
+        if state is not None and state.must_use_primary():
+            return primary
+        return replica_pool.choose(primary)
+
     def db_for_write(self, model, **hints):
-        if hasattr(model, 'partition_key'):
-            instance = hints.get('instance')
-            if instance and hasattr(instance, 'partition_key'):
-                return f'partition_{instance.partition_key % 2}'  # 2 write shards
-        return 'default'
+        mark_write()
+        return self.db_for_partitioned(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Rows read from a replica belong to that replica's primary
+        if replica_pool.primary_of(obj1._state.db) == replica_pool.primary_of(obj2._state.db):
+            return True
+        # Unpartitioned reference data (designations) is replicated to every shard
+        if not self.is_partitioned(obj1._meta.model) or not self.is_partitioned(obj2._meta.model):
+            return True
+        return None
 
-# settings.py - Database Configuration
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'crm_primary',
-        'USER': 'crm_user',
-        'PASSWORD': 'secure_password',
-        'HOST': 'primary.db.cluster.local',
-        'PORT': '5432',
-        'CONN_MAX_AGE': 300,
-        'OPTIONS': {
-            'connect_timeout': 10,
-        }
-    },
-    'partition_0': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'crm_shard_0',
-        'USER': 'crm_user',
-        'PASSWORD': 'secure_password',
-        'HOST': 'shard0.db.cluster.local',
-        'PORT': '5432',
-    },
-    'partition_1': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'crm_shard_1',
-        'USER': 'crm_user',
-        'PASSWORD': 'secure_password',
-        'HOST': 'shard1.db.cluster.local',
-        'PORT': '5432',
-    },
-    'read_replica_1': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'crm_replica_1',
-        'USER': 'crm_user',
-        'PASSWORD': 'secure_password',
-        'HOST': 'replica1.db.cluster.local',
-        'PORT': '5432',
-    }
-}
-
-DATABASE_ROUTERS = ['myapp.database_router.PartitionRouter']
\ No newline at end of file
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard carries the full schema so co-located rows keep their FKs
+        return None
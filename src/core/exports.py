@@ -0,0 +1,77 @@
+# exports.py
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+
+class EchoBuffer:
+    """File-like object whose write() hands the line straight back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+class StreamingExporter:
+    """
+    Stream a queryset as NDJSON or CSV without materialising it.
+
+    Rows are read as plain tuples through iterator(), which uses a server-side
+    cursor on PostgreSQL, so memory stays flat regardless of the row count.
+    """
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+    }
+    chunk_size = 2000
+    rows_per_write = 500
+
+    def __init__(self, fields, chunk_size=None):
+        self.fields = list(fields)
+        if chunk_size:
+            self.chunk_size = chunk_size
+
+    def rows(self, queryset):
+        return queryset.values_list(*self.fields).iterator(chunk_size=self.chunk_size)
+
+    def stream(self, queryset, export_format):
+        if export_format == 'ndjson':
+            return self.stream_ndjson(queryset)
+        if export_format == 'csv':
+            return self.stream_csv(queryset)
+        raise ValidationError({'export': f"Unsupported export format '{export_format}'"})
+
+    def stream_ndjson(self, queryset):
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+        buffer = []
+        for row in self.rows(queryset):
+            buffer.append(encoder.encode(dict(zip(self.fields, row))))
+            if len(buffer) >= self.rows_per_write:
+                yield '\n'.join(buffer) + '\n'
+                buffer = []
+        if buffer:
+            yield '\n'.join(buffer) + '\n'
+
+    def stream_csv(self, queryset):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(self.fields)
+        buffer = []
+        for row in self.rows(queryset):
+            buffer.append(writer.writerow(row))
+            if len(buffer) >= self.rows_per_write:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
+
+    def get_response(self, queryset, export_format, filename):
+        if export_format not in self.content_types:
+            raise ValidationError({'export': f"Unsupported export format '{export_format}'"})
+
+        response = StreamingHttpResponse(
+            self.stream(queryset, export_format),
+            content_type=self.content_types[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+        return response
@@ -0,0 +1,192 @@
+# fast_serializers.py
+import logging
+from collections import defaultdict
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# DRF fields whose to_representation() returns the database value unchanged
+# when the model column already holds that Python type
+PASSTHROUGH_FIELDS = (
+    (serializers.CharField, (models.CharField, models.TextField)),
+    (serializers.IntegerField, (models.IntegerField,)),
+    (serializers.BooleanField, (models.BooleanField,)),
+)
+
+
+class NotCompilable(Exception):
+    """The serializer renders something that cannot be read from values() rows"""
+
+
+class Columns:
+    """Ordered, de-duplicated values_list() column names; a column's position is its row index"""
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+
+    def add(self, name):
+        if name not in self.index:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+        return self.index[name]
+
+
+class ManyRelation:
+    """A nested many=True serializer over a reverse foreign key: one query per page of parents"""
+
+    def __init__(self, relation, compiled, parent_index):
+        self.model = relation.related_model
+        self.fk_name = relation.field.name
+        self.compiled = compiled
+        self.parent_index = parent_index
+        self.fk_index = compiled.columns.add(self.fk_name)
+
+    def get_queryset(self, rows, using):
+        keys = {row[self.parent_index] for row in rows}
+        queryset = self.model._default_manager.filter(**{f"{self.fk_name}__in": keys})
+        if using:
+            queryset = queryset.using(using)
+        return self.compiled.get_queryset(queryset)
+
+    def group(self, child_rows, rendered):
+        grouped = defaultdict(list)
+        for row, data in zip(child_rows, rendered):
+            grouped[row[self.fk_index]].append(data)
+        return grouped
+
+    def fetch(self, rows, using):
+        if not rows:
+            return {}
+        child_rows = list(self.get_queryset(rows, using))
+        return self.group(child_rows, self.compiled.serialize(child_rows, using))
+
+    async def afetch(self, rows, using):
+        if not rows:
+            return {}
+        child_rows = [row async for row in self.get_queryset(rows, using)]
+        return self.group(child_rows, await self.compiled.aserialize(child_rows, using))
+
+
+class CompiledSerializer:
+    """
+    Read-only fast path for a ModelSerializer: its fields are compiled once
+    into a single function that builds each output dict straight from a
+    values_list() row, calling the bound DRF field's to_representation()
+    only where it would change the value. The output is the same data the
+    serializer produces; reverse-FK nested lists cost one query per page,
+    as with prefetch_related.
+    """
+
+    def __init__(self, serializer):
+        self.check_serializer(serializer)
+        self.name = type(serializer).__name__
+        self.model = serializer.Meta.model
+        self.columns = Columns()
+        self.relations = []
+        self.namespace = {}
+
+        expression = self.compile_fields(self.model, serializer, prefix='')
+        self.source = f"def render(row, related):\n    return {expression}\n"
+        exec(compile(self.source, f"<compiled {self.name}>", 'exec'), self.namespace)
+        self.render = self.namespace['render']
+
+    def check_serializer(self, serializer):
+        if type(serializer).to_representation is not serializers.Serializer.to_representation:
+            raise NotCompilable(f"{type(serializer).__name__} overrides to_representation()")
+
+    def get_queryset(self, queryset, extra_fields=()):
+        """The values_list() query behind this serializer; extra_fields are appended after its columns"""
+        columns = self.columns.names + [name for name in extra_fields if name not in self.columns.index]
+        return queryset.select_related(None).prefetch_related(None).values_list(*columns, named=True)
+
+    def serialize(self, rows, using=None):
+        related = [relation.fetch(rows, using) for relation in self.relations]
+        render = self.render
+        return [render(row, related) for row in rows]
+
+    async def aserialize(self, rows, using=None):
+        related = [await relation.afetch(rows, using) for relation in self.relations]
+        render = self.render
+        return [render(row, related) for row in rows]
+
+    def compile_fields(self, model, serializer, prefix):
+        items = [
+            f"{field.field_name!r}: {self.compile_field(model, field, prefix)}"
+            for field in serializer.fields.values()
+            if not field.write_only
+        ]
+        return '{' + ', '.join(items) + '}'
+
+    def compile_field(self, model, field, prefix):
+        if not field.source_attrs:
+            raise NotCompilable(f"{field.field_name} reads the whole object")
+
+        attrs = field.source_attrs
+        for position, name in enumerate(attrs):
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                raise NotCompilable(f"{field.field_name}: {name} is not a model field")
+
+            path = f"{prefix}{name}"
+            last = position == len(attrs) - 1
+            if not model_field.is_relation:
+                if not last:
+                    raise NotCompilable(f"{field.field_name}: {name} is not a relation")
+                return self.compile_value(field, model_field, path)
+
+            if model_field.one_to_many and last and not prefix and isinstance(field, serializers.ListSerializer):
+                return self.compile_many(model_field, field)
+            if model_field.many_to_many or model_field.one_to_many or not model_field.concrete:
+                raise NotCompilable(f"{field.field_name}: {name} is not a forward foreign key")
+
+            if last:
+                return self.compile_related(model_field, field, path)
+            if model_field.null:
+                # DRF's handling of a missing intermediate object depends on field options
+                raise NotCompilable(f"{field.field_name}: {name} is nullable")
+            model, prefix = model_field.related_model, f"{path}__"
+
+    def compile_value(self, field, model_field, path):
+        value = f"row[{self.columns.add(path)}]"
+        if any(isinstance(field, drf_type) and isinstance(model_field, model_types)
+               for drf_type, model_types in PASSTHROUGH_FIELDS):
+            return value
+        return self.call(field.to_representation, value)
+
+    def compile_related(self, model_field, field, path):
+        value = f"row[{self.columns.add(path)}]"
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            # values() already returns the foreign key, which is what the field renders
+            return value if field.pk_field is None else self.call(field.pk_field.to_representation, value)
+        if isinstance(field, serializers.Serializer) and not isinstance(field, serializers.ListSerializer):
+            self.check_serializer(field)
+            nested = self.compile_fields(model_field.related_model, field, prefix=f"{path}__")
+            return f"(None if {value} is None else {nested})"
+        raise NotCompilable(f"{field.field_name}: {type(field).__name__} is not supported")
+
+    def compile_many(self, relation, field):
+        self.check_serializer(field.child)
+        parent_index = self.columns.add(relation.field.target_field.attname)
+        self.relations.append(ManyRelation(relation, CompiledSerializer(field.child), parent_index))
+        return f"(related[{len(self.relations) - 1}].get(row[{parent_index}]) or [])"
+
+    def call(self, function, value):
+        name = f"to_representation_{len(self.namespace)}"
+        self.namespace[name] = function
+        return f"(None if {value} is None else {name}({value}))"
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    """The compiled fast path for serializer_class, or None when it has to use DRF"""
+    try:
+        return CompiledSerializer(serializer_class())
+    except NotCompilable as e:
+        logger.info(f"{serializer_class.__name__} stays on the DRF serializer: {str(e)}")
+        return None
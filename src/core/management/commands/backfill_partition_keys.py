@@ -0,0 +1,146 @@
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Subquery
+
+from core.models import ClientModel, CustomUser, LeadModel
+from core.sharding import get_shard_map, partition_for
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute partition_key for users, leads and clients with partition_for(). Rows written while '
+        'the key came from the salted hash() cannot be found by email; run this once, then set '
+        "SHARDING['LEGACY_PARTITION_KEYS'] = False"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--move', action='store_true',
+            help="Copy rows whose new partition lives on another shard there (their refresh tokens are dropped)"
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Count stale rows without changing any')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        self.batch_size = options['batch_size']
+        self.move = options['move']
+        self.dry_run = options['dry_run']
+        self.shard_map = get_shard_map()
+        self.stats = Counter()
+
+        for using in dict.fromkeys([*self.shard_map.shards, 'default']):
+            self.backfill(using, CustomUser.objects.using(using), 'users', self.move_user)
+            if not self.dry_run:
+                self.colocate(using)
+            # Clients without a lead are keyed by their own email
+            clients = ClientModel.objects.using(using).filter(manage_by__isnull=True)
+            self.backfill(using, clients, 'clients', self.move_client)
+
+        for name, count in sorted(self.stats.items()):
+            self.stdout.write(f"{name}: {count}")
+        if self.stats['users needing --move'] or self.stats['clients needing --move']:
+            self.stdout.write('Rows needing --move still carry their old key; keep LEGACY_PARTITION_KEYS on')
+
+    def backfill(self, using, queryset, label, move):
+        """Walk `queryset` in primary-key batches and rekey rows whose partition changed"""
+        last_pk = None
+        while True:
+            batch = queryset.order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            rows = list(batch.values_list('pk', 'email', 'partition_key')[:self.batch_size])
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+
+            in_place, moves = defaultdict(list), []
+            for pk, email, partition_key in rows:
+                new_key = partition_for(email)
+                if new_key == partition_key:
+                    continue
+                if self.shard_map.shard_for(new_key) == using:
+                    in_place[new_key].append(pk)
+                else:
+                    moves.append((pk, new_key))
+            self.stats[f"{label} rekeyed"] += sum(len(pks) for pks in in_place.values())
+
+            if self.dry_run:
+                self.stats[f"{label} to move"] += len(moves)
+                continue
+            for new_key, pks in in_place.items():
+                try:
+                    with transaction.atomic(using=using):
+                        queryset.filter(pk__in=pks).update(partition_key=new_key)
+                except IntegrityError:
+                    # (email, partition_key) is unique for clients: a duplicate already holds the key
+                    self.stats[f"{label} conflicting"] += len(pks)
+                    self.stats[f"{label} rekeyed"] -= len(pks)
+            for pk, new_key in moves:
+                if not self.move:
+                    self.stats[f"{label} needing --move"] += 1
+                    continue
+                try:
+                    move(using, pk, new_key)
+                    self.stats[f"{label} moved"] += 1
+                except IntegrityError as e:
+                    # E.g. the lead's designation is missing on the target shard
+                    self.stderr.write(f"Could not move {label} {pk} off {using}: {e}")
+                    self.stats[f"{label} failed to move"] += 1
+
+    def colocate(self, using):
+        """Give leads their user's key and managed clients their lead's key"""
+        leads = LeadModel.objects.using(using)
+        user_key = CustomUser.objects.using(using).filter(pk=OuterRef('user_id')).values('partition_key')[:1]
+        self.stats['leads rekeyed'] += leads.exclude(partition_key=Subquery(user_key)).update(
+            partition_key=Subquery(user_key)
+        )
+
+        clients = ClientModel.objects.using(using).filter(manage_by__isnull=False)
+        lead_key = leads.filter(pk=OuterRef('manage_by_id')).values('partition_key')[:1]
+        try:
+            with transaction.atomic(using=using):
+                self.stats['clients rekeyed'] += clients.exclude(partition_key=Subquery(lead_key)).update(
+                    partition_key=Subquery(lead_key)
+                )
+        except IntegrityError as e:
+            raise CommandError(f"Duplicate clients on {using} share an email under one lead; merge them first: {e}")
+
+    def copy(self, instance, target, partition_key):
+        # raw=True: written as loaded, so created_at/updated_at and save() overrides are left alone
+        instance.partition_key = partition_key
+        instance.save_base(using=target, raw=True, force_insert=True)
+
+    def move_user(self, source, pk, partition_key):
+        """Copy a user with their lead, clients and group links to the new shard, then delete the original"""
+        target = self.shard_map.shard_for(partition_key)
+        user = CustomUser.objects.using(source).get(pk=pk)
+        leads = list(LeadModel.objects.using(source).filter(user_id=pk))
+        clients = list(ClientModel.objects.using(source).filter(manage_by__user_id=pk))
+        links = [
+            (through, list(through.objects.using(source).filter(**{field: pk})))
+            for through, field in (
+                (CustomUser.groups.through, 'customuser_id'),
+                (CustomUser.user_permissions.through, 'customuser_id'),
+            )
+        ]
+
+        # The copy commits first: a failed copy leaves the original in place
+        with transaction.atomic(using=source), transaction.atomic(using=target):
+            for instance in [user, *leads, *clients]:
+                self.copy(instance, target, partition_key)
+            for through, rows in links:
+                through.objects.using(target).bulk_create(rows)
+            ClientModel.objects.using(source).filter(pk__in=[client.pk for client in clients]).delete()
+            # Cascades to the lead, group links and outstanding tokens
+            CustomUser.objects.using(source).filter(pk=pk).delete()
+
+    def move_client(self, source, pk, partition_key):
+        target = self.shard_map.shard_for(partition_key)
+        client = ClientModel.objects.using(source).get(pk=pk)
+        with transaction.atomic(using=source), transaction.atomic(using=target):
+            self.copy(client, target, partition_key)
+            ClientModel.objects.using(source).filter(pk=pk).delete()
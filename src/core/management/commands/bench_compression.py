@@ -0,0 +1,92 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.compression import CODECS, CompressedVariants
+from core.models import ClientModel
+from core.renderers import FastJSONRenderer
+from core.serializers import ClientUpsertSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark compression CPU cost against bytes saved for /clients/-style JSON payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+        parser.add_argument(
+            '--levels',
+            nargs='+',
+            default=['gzip:1', 'gzip:6', 'br:1', 'br:5', 'br:11', 'zstd:1', 'zstd:3', 'zstd:9'],
+            help='coding:level pairs; codings whose library is missing are skipped'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Compressions per case; the mean is reported')
+        parser.add_argument('--cache', default='default', help='Cache alias for the cached-variant read')
+
+    def handle(self, *args, **options):
+        cases = []
+        for pair in options['levels']:
+            coding, _, level = pair.partition(':')
+            if coding not in CODECS:
+                self.stdout.write(f"Skipping {pair}: {coding} is not available")
+                continue
+            try:
+                cases.append((coding, int(level)))
+            except ValueError:
+                raise CommandError(f"Invalid level in {pair}")
+
+        variants = CompressedVariants(alias=options['cache'])
+        self.stdout.write(
+            f"{'rows':>7} {'coding':>8} {'KB in':>9} {'KB out':>8} {'ratio':>6} {'saved KB':>9} "
+            f"{'CPU ms':>8} {'MB/s':>7} {'hit ms':>7}"
+        )
+        for rows in options['rows']:
+            body = self.build_payload(rows)
+            for coding, level in cases:
+                compressed, cpu_seconds = self.measure(CODECS[coding], body, level, options['repeat'])
+                hit_seconds = self.measure_hit(variants, coding, body, compressed, options['repeat'])
+                self.stdout.write(
+                    f"{rows:>7} {f'{coding}:{level}':>8} {len(body) / 1024:>9.1f} {len(compressed) / 1024:>8.1f} "
+                    f"{len(body) / len(compressed):>6.1f} {(len(body) - len(compressed)) / 1024:>9.1f} "
+                    f"{cpu_seconds * 1000:>8.2f} {len(body) / cpu_seconds / 2 ** 20:>7.1f} {hit_seconds * 1000:>7.3f}"
+                )
+
+    def build_payload(self, rows):
+        """The JSON the clients list sends, rendered from unsaved rows so no database is needed"""
+        now = timezone.now()
+        clients = [
+            ClientModel(
+                full_name=f'Client {i}',
+                email=f'client-{i}@example.com',
+                phone=f'555{i:07d}',
+                client_tier=('premium', 'standard', 'basic')[i % 3],
+                status=('pending', 'active', 'completed', 'cancelled')[i % 4],
+                lifetime_value=Decimal(i % 100000) / 100,
+                last_purchase_date=now,
+                country_code=('US', 'GB', 'DE', 'IN')[i % 4],
+                timezone='UTC',
+            )
+            for i in range(rows)
+        ]
+        data = {'results': ClientUpsertSerializer(clients, many=True).data, 'next': None}
+        return FastJSONRenderer().render(data)
+
+    def measure(self, compress, body, level, repeat):
+        compressed = compress(body, level)
+        start = time.process_time()
+        for _ in range(repeat):
+            compress(body, level)
+        return compressed, (time.process_time() - start) / repeat
+
+    def measure_hit(self, variants, coding, body, compressed, repeat):
+        """Cost of serving the cached variant instead of compressing again"""
+        key = variants.make_key(coding, body)
+        variants.cache.set(key, compressed, 60)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            # Hashing the body is part of every hit
+            variants.cache.get(variants.make_key(coding, body))
+        elapsed = (time.perf_counter() - start) / repeat
+        variants.cache.delete(key)
+        return elapsed
@@ -0,0 +1,105 @@
+import multiprocessing
+import resource
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.exports import StreamingExporter
+from core.models import ClientModel, CustomUser, DesignationModel, LeadModel
+
+BENCH_EMAIL = 'bench-export@example.com'
+
+
+def current_rss_kb():
+    """Resident set size of this process in KB (Linux), falls back to the peak"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_export(lead_id, rows, export_format, fields, results):
+    """Child process body: stream `rows` clients and report RSS before and at peak"""
+    baseline = current_rss_kb()
+    queryset = ClientModel.objects.filter(manage_by_id=lead_id).order_by('-created_at')[:rows]
+
+    start = time.perf_counter()
+    exported_bytes = 0
+    for chunk in StreamingExporter(fields).stream(queryset, export_format):
+        exported_bytes += len(chunk)
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((rows, elapsed, exported_bytes, baseline, peak))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark peak RSS of the streaming client export against row count'
+
+    fields = [
+        'id', 'full_name', 'email', 'phone', 'client_tier', 'status',
+        'lifetime_value', 'last_purchase_date', 'country_code', 'created_at',
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        lead = self.get_bench_lead()
+        self.seed_clients(lead, max(options['rows']), options['batch_size'])
+
+        # Each size runs in a fresh process so ru_maxrss is not polluted by earlier runs
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+
+        self.stdout.write(f"{'rows':>10} {'seconds':>9} {'rows/s':>10} {'MB out':>8} {'base RSS MB':>12} {'peak RSS MB':>12}")
+        for rows in sorted(options['rows']):
+            process = context.Process(
+                target=run_export,
+                args=(lead.id, rows, options['format'], self.fields, results)
+            )
+            process.start()
+            rows, elapsed, exported_bytes, baseline, peak = results.get()
+            process.join()
+
+            self.stdout.write(
+                f"{rows:>10} {elapsed:>9.2f} {rows / elapsed:>10.0f} "
+                f"{exported_bytes / 2 ** 20:>8.1f} {baseline / 1024:>12.1f} {peak / 1024:>12.1f}"
+            )
+
+    def get_bench_lead(self):
+        user = CustomUser.objects.filter(email=BENCH_EMAIL).first()
+        if user is None:
+            user = CustomUser.objects.create_user(
+                BENCH_EMAIL, 'bench-password', first_name='Bench', last_name='Export'
+            )
+        designation, _ = DesignationModel.objects.get_or_create(name='Benchmark')
+        lead, _ = LeadModel.objects.get_or_create(
+            user=user,
+            defaults={'designation': designation, 'salary': Decimal('50000.00')}
+        )
+        return lead
+
+    def seed_clients(self, lead, target, batch_size):
+        existing = ClientModel.objects.filter(manage_by=lead).count()
+        for start in range(existing, target, batch_size):
+            end = min(start + batch_size, target)
+            ClientModel.objects.bulk_create([
+                ClientModel(
+                    manage_by=lead,
+                    partition_key=lead.partition_key,
+                    full_name=f'Bench Client {i}',
+                    email=f'bench-client-{i}@example.com',
+                    phone='5550000000',
+                    lifetime_value=Decimal(i % 10000),
+                )
+                for i in range(start, end)
+            ])
+            self.stdout.write(f"Seeded {end}/{target} clients")
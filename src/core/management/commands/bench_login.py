@@ -0,0 +1,82 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from account.hashing import hashing_executor
+
+BENCH_PASSWORD = 'bench-login-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark password verification (the CPU cost of a login) per hasher: inline on one core, '
+        'then through the hashing pool, reporting logins/sec and logins/sec per core'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hashers', nargs='+', default=['pbkdf2_sha256', 'scrypt'])
+        parser.add_argument('--logins', type=int, default=10, help='Verifications per worker process')
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}),
+            help='Pool sizes to measure'
+        )
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1:
+            raise CommandError('--logins must be at least 1')
+
+        self.stdout.write(
+            f"{'hasher':<14} {'mode':<10} {'logins':>7} {'logins/s':>9} {'per core':>9} {'web CPU ms':>11}"
+        )
+        for algorithm in options['hashers']:
+            try:
+                encoded = hashers.make_password(BENCH_PASSWORD, hasher=algorithm)
+            except ValueError as e:
+                self.stdout.write(f"Skipping {algorithm}: {str(e)}")
+                continue
+
+            logins = options['logins']
+            start = time.process_time()
+            for _ in range(logins):
+                hashers.verify_password(BENCH_PASSWORD, encoded)
+            cpu = time.process_time() - start
+            # Inline, the web process burns every millisecond of the hash itself
+            self.write_row(algorithm, 'inline', logins, logins / cpu, logins / cpu, cpu / logins)
+
+            for workers in options['workers']:
+                self.bench_pool(algorithm, encoded, workers, logins * workers)
+
+    def bench_pool(self, algorithm, encoded, workers, logins):
+        pool_settings = {
+            **getattr(settings, 'PASSWORD_HASHING_POOL', {}),
+            'ENABLED': True,
+            'WORKERS': workers,
+            'QUEUE_SIZE': logins,  # Measure throughput, not load shedding
+            'QUEUE_TIMEOUT': 60,
+        }
+        with override_settings(PASSWORD_HASHING_POOL=pool_settings):
+            hashing_executor.reset()
+            # Warm up: start every worker process before timing
+            with ThreadPoolExecutor(workers) as threads:
+                list(threads.map(lambda _: hashing_executor.verify(BENCH_PASSWORD, encoded), range(workers)))
+
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            with ThreadPoolExecutor(2 * workers) as threads:
+                results = list(threads.map(lambda _: hashing_executor.verify(BENCH_PASSWORD, encoded), range(logins)))
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            hashing_executor.reset()
+
+        if not all(valid for valid, _ in results):
+            raise CommandError(f"{algorithm}: the pool rejected a correct password")
+        self.write_row(algorithm, f'pool x{workers}', logins, logins / wall, logins / wall / workers, cpu / logins)
+
+    def write_row(self, algorithm, mode, logins, rate, per_core, web_cpu):
+        self.stdout.write(
+            f"{algorithm:<14} {mode:<10} {logins:>7} {rate:>9.1f} {per_core:>9.1f} {web_cpu * 1000:>11.2f}"
+        )
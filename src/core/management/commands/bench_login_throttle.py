@@ -0,0 +1,102 @@
+import random
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.throttling import SlidingWindowLimiter
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the login sliding-window throttle: decisions against an exact sliding log on '
+        'simulated traffic, then checks/sec against the configured cache'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10, help='Attempts allowed per window')
+        parser.add_argument('--window', type=int, default=60, help='Window seconds')
+        parser.add_argument(
+            '--loads', type=float, nargs='+', default=[0.5, 1, 2, 10],
+            help='Offered attempts as multiples of the limit'
+        )
+        parser.add_argument('--windows', type=int, default=200, help='Simulated windows per load')
+        parser.add_argument('--checks', type=int, default=20000, help='Throughput: attempts per run')
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 8])
+        parser.add_argument('--cache', default=None, help='Cache alias (defaults to LOGIN_THROTTLE)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['limit'] < 1 or options['window'] < 1:
+            raise CommandError('--limit and --window must be at least 1')
+        limiter = SlidingWindowLimiter(alias=options['cache'])
+        backend = 'redis lua' if limiter.get_redis_connection() is not None else 'cache add/incr'
+        self.stdout.write(f"Backend: {backend} ({limiter.cache_alias})")
+
+        self.stdout.write(
+            f"\n{'load':>5} {'attempts':>9} {'exact ok':>9} {'counter ok':>11} {'disagree':>9} "
+            f"{'false 429':>10} {'max/window':>11}"
+        )
+        rng = random.Random(options['seed'])
+        for load in options['loads']:
+            self.bench_accuracy(limiter, rng, load, options['limit'], options['window'], options['windows'])
+
+        self.stdout.write(f"\n{'threads':>7} {'keys':>8} {'checks/s':>10} {'us/check':>9}")
+        for threads in options['threads']:
+            for keys in ('one', 'distinct'):
+                self.bench_throughput(limiter, options['checks'], threads, keys)
+
+    def bench_accuracy(self, limiter, rng, load, limit, window, windows):
+        """Poisson arrivals on one key, replayed through the limiter with a simulated clock"""
+        key = f"bench:{uuid.uuid4().hex}"
+        rate = load * limit / window
+        now = 1_000_000.0 * window  # Window-aligned start, far from real time
+        end = now + windows * window
+
+        exact_log = deque()  # Admitted attempts the exact sliding log remembers
+        admitted = deque()   # Attempts the counter admitted, for the worst trailing window
+        attempts = exact_ok = counter_ok = disagree = false_reject = worst = 0
+        while True:
+            now += rng.expovariate(rate)
+            if now >= end:
+                break
+            attempts += 1
+
+            while exact_log and exact_log[0] <= now - window:
+                exact_log.popleft()
+            exact = len(exact_log) < limit
+            if exact:
+                exact_log.append(now)
+                exact_ok += 1
+
+            allowed, _ = limiter.hit([(key, limit, window)], now=now)
+            if allowed:
+                counter_ok += 1
+                admitted.append(now)
+                while admitted[0] <= now - window:
+                    admitted.popleft()
+                worst = max(worst, len(admitted))
+            if allowed != exact:
+                disagree += 1
+                false_reject += exact and not allowed
+
+        self.stdout.write(
+            f"{load:>5g} {attempts:>9} {exact_ok:>9} {counter_ok:>11} {disagree / max(attempts, 1):>8.2%} "
+            f"{false_reject / max(attempts, 1):>9.2%} {worst / limit:>10.2f}x"
+        )
+
+    def bench_throughput(self, limiter, checks, threads, keys):
+        prefix = f"bench:{uuid.uuid4().hex}"
+        # A huge limit keeps every check on the same path (allowed, counters incremented)
+        if keys == 'one':
+            limits = lambda i: [(f"{prefix}:ip", 10 ** 9, 60)]
+        else:
+            limits = lambda i: [(f"{prefix}:ip:{i}", 10 ** 9, 60), (f"{prefix}:email:{i}", 10 ** 9, 300)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(lambda i: limiter.hit(limits(i)), range(checks)))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{threads:>7} {keys:>8} {checks / elapsed:>10.0f} {elapsed / checks * 1e6:>9.1f}")
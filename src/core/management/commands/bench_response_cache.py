@@ -0,0 +1,67 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core.models import ClientModel
+from core.response_cache import ResponseCache
+from core.serializers import ClientSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare per-hit latency of pickled-instance caching against rendered-bytes caching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default', help='Cache alias to benchmark against')
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--list-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        backend = caches[options['alias']]
+        clients = [self.make_client(i) for i in range(options['list_size'])]
+
+        self.stdout.write(f"{'payload':<12} {'strategy':<18} {'us/hit':>10}")
+        for label, payload, many in [('detail', clients[0], False), (f"list[{len(clients)}]", clients, True)]:
+            old = self.bench_instances(backend, payload, many, options['iterations'])
+            new = self.bench_bytes(backend, payload, many, options['iterations'])
+            self.stdout.write(f"{label:<12} {'pickled instance':<18} {old:>10.1f}")
+            self.stdout.write(f"{label:<12} {'rendered bytes':<18} {new:>10.1f}  ({old / new:.1f}x faster)")
+
+    def make_client(self, i):
+        now = timezone.now()
+        return ClientModel(
+            id=uuid.uuid4(),
+            full_name=f'Benchmark Client {i}',
+            email=f'client-{i}@example.com',
+            phone='5550000000',
+            lifetime_value=Decimal('1234.56'),
+            created_at=now,
+            updated_at=now,
+        )
+
+    def bench_instances(self, backend, payload, many, iterations):
+        """The old path: unpickle model instances, then serialize and render on every hit"""
+        key = 'bench_response_cache_instance'
+        backend.set(key, payload, 300)
+        renderer = JSONRenderer()
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            instance = backend.get(key)
+            renderer.render(ClientSerializer(instance, many=many).data)
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    def bench_bytes(self, backend, payload, many, iterations):
+        """The new path: one cache read of pre-rendered bytes straight into a response"""
+        key = 'bench_response_cache_bytes'
+        response_cache = ResponseCache(backend=backend)
+        response_cache.set(key, ClientSerializer(payload, many=many).data, 300)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            response_cache.to_response(response_cache.get(key))
+        return (time.perf_counter() - start) / iterations * 1e6
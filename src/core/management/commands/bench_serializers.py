@@ -0,0 +1,120 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.fast_serializers import compile_serializer
+from core.models import ClientModel, CustomUser, DesignationModel, LeadModel
+from core.query_planner import query_planner
+from core.serializers import ClientSerializer, DesignationSerializer, LeadClientSerializer
+
+BENCH_PREFIX = 'bench-serializers'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark rows/sec on one core for the DRF serializers against their compiled fast path '
+        '(seeded inside a transaction that is rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Designations and clients to serialize')
+        parser.add_argument('--leads', type=int, default=1000, help='Leads the clients are spread across')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the best is reported')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['leads'] < 1 or options['rows'] < options['leads']:
+            raise CommandError('--rows must be at least --leads, and --leads at least 1')
+
+        with transaction.atomic():
+            leads = self.seed(options['rows'], options['leads'], options['batch_size'])
+            cases = [
+                ('designations', DesignationSerializer,
+                 DesignationModel.objects.filter(name__startswith=BENCH_PREFIX).order_by('name')),
+                ('clients', ClientSerializer,
+                 ClientModel.objects.filter(manage_by__in=leads).order_by('-created_at', '-id')),
+                ('leads+clients', LeadClientSerializer,
+                 LeadModel.objects.filter(pk__in=leads).order_by('-created_at')),
+            ]
+
+            self.stdout.write(
+                f"{'serializer':<14} {'rows':>8} {'DRF rows/s':>11} {'fast rows/s':>12} {'speedup':>8} {'identical':>10}"
+            )
+            for name, serializer_class, queryset in cases:
+                compiled = compile_serializer(serializer_class)
+                if compiled is None:
+                    raise CommandError(f"{serializer_class.__name__} does not compile")
+
+                # Nested rows are rendered objects too, so leads+clients counts both
+                rows = queryset.count() + (options['rows'] if serializer_class is LeadClientSerializer else 0)
+                drf_seconds, drf_data = self.best_of(
+                    options['repeat'],
+                    lambda: serializer_class(query_planner.apply(queryset, serializer_class), many=True).data
+                )
+                fast_seconds, fast_data = self.best_of(
+                    options['repeat'],
+                    lambda: compiled.serialize(list(compiled.get_queryset(queryset)), queryset.db)
+                )
+                identical = JSONRenderer().render(drf_data) == JSONRenderer().render(fast_data)
+
+                self.stdout.write(
+                    f"{name:<14} {rows:>8} {rows / drf_seconds:>11.0f} {rows / fast_seconds:>12.0f} "
+                    f"{drf_seconds / fast_seconds:>7.1f}x {str(identical):>10}"
+                )
+            transaction.set_rollback(True)
+
+    def best_of(self, repeat, run):
+        """CPU time of the fastest run (query plus serialization), so the figure is per core"""
+        best, data = None, None
+        for _ in range(repeat):
+            start = time.process_time()
+            data = run()
+            elapsed = time.process_time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, data
+
+    def seed(self, rows, lead_count, batch_size):
+        designation = DesignationModel.objects.create(name=f'{BENCH_PREFIX}-lead')
+        for start in range(0, rows, batch_size):
+            DesignationModel.objects.bulk_create([
+                DesignationModel(name=f'{BENCH_PREFIX}-{i}')
+                for i in range(start, min(start + batch_size, rows))
+            ])
+
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                email=f'{BENCH_PREFIX}-{i}@example.com',
+                first_name='Bench',
+                last_name=f'Lead {i}',
+                password='!',  # Unusable; nobody logs in as these users
+            )
+            for i in range(lead_count)
+        ])
+        leads = LeadModel.objects.bulk_create([
+            LeadModel(
+                user=user,
+                designation=designation,
+                salary=Decimal('50000.00') + i,
+                experience=2 + i % 10,
+                partition_key=user.partition_key,
+            )
+            for i, user in enumerate(users)
+        ])
+
+        for start in range(0, rows, batch_size):
+            end = min(start + batch_size, rows)
+            ClientModel.objects.bulk_create([
+                ClientModel(
+                    manage_by=leads[i % lead_count],
+                    partition_key=leads[i % lead_count].partition_key,
+                    full_name=f'Bench Client {i}',
+                    email=f'{BENCH_PREFIX}-client-{i}@example.com',
+                    phone='5550000000' if i % 3 else None,
+                )
+                for i in range(start, end)
+            ])
+            self.stdout.write(f"Seeded {end}/{rows} clients")
+        return [lead.pk for lead in leads]
@@ -0,0 +1,222 @@
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams; no third-party client in the measurement"""
+
+    def __init__(self, host, port, headers):
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            await self.open()
+
+        head = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        head += [f"{name}: {value}" for name, value in self.headers.items()]
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode())
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Server closed the connection')
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.readexactly(int(headers.get('content-length', 0)))
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status
+
+
+class Command(BaseCommand):
+    help = 'Load-test the sync (WSGI) and async (ASGI) endpoints and compare requests/sec and p99 latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', help='Base URL of a running WSGI server, e.g. http://127.0.0.1:8001')
+        parser.add_argument('--asgi-url', help='Base URL of a running ASGI server, e.g. http://127.0.0.1:8002')
+        parser.add_argument(
+            '--spawn',
+            action='store_true',
+            help='Start gunicorn (WSGI) and uvicorn (ASGI) locally instead of using --wsgi-url/--asgi-url'
+        )
+        parser.add_argument('--workers', type=int, default=4, help='Server processes when spawning')
+        parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker when spawning')
+        parser.add_argument('--wsgi-path', default='/clients/')
+        parser.add_argument('--asgi-path', default='/async/clients/')
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--warmup', type=int, default=500)
+        parser.add_argument('--email', help='Authenticate as this user (a JWT is minted locally)')
+        parser.add_argument('--token', help='Use this JWT access token instead of minting one')
+
+    def handle(self, *args, **options):
+        headers = {'Accept': 'application/json'}
+        token = options['token'] or self.mint_token(options['email'])
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+
+        servers = []
+        try:
+            if options['spawn']:
+                wsgi_url = self.spawn(servers, 'wsgi', options)
+                asgi_url = self.spawn(servers, 'asgi', options)
+            else:
+                wsgi_url, asgi_url = options['wsgi_url'], options['asgi_url']
+            if not wsgi_url and not asgi_url:
+                raise CommandError('Pass --wsgi-url and/or --asgi-url, or --spawn')
+
+            results = []
+            for mode, base_url, path in [
+                ('WSGI', wsgi_url, options['wsgi_path']),
+                ('ASGI', asgi_url, options['asgi_path']),
+            ]:
+                if base_url:
+                    self.stdout.write(f"{mode}: {base_url}{path} ...")
+                    results.append((mode, asyncio.run(self.run_load(base_url, path, headers, options))))
+        finally:
+            for process in servers:
+                process.terminate()
+                process.wait(timeout=10)
+
+        self.stdout.write(
+            f"{'mode':<6} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for mode, stats in results:
+            self.stdout.write(
+                f"{mode:<6} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>9.0f} "
+                f"{stats['p50']:>8.1f} {stats['p99']:>8.1f} {stats['max']:>8.1f}"
+            )
+
+    def mint_token(self, email):
+        if not email:
+            return None
+        user = get_user_model().objects.filter(email=email).first()
+        if user is None:
+            raise CommandError(f"No user with email {email}")
+        return str(AccessToken.for_user(user))
+
+    def free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def spawn(self, servers, mode, options):
+        port = self.free_port()
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'src.settings')
+        if mode == 'wsgi':
+            if not shutil.which('gunicorn'):
+                raise CommandError('gunicorn is required for --spawn')
+            command = [
+                'gunicorn', 'src.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(options['workers']), '--threads', str(options['threads']),
+                '--log-level', 'warning',
+            ]
+        else:
+            if not shutil.which('uvicorn'):
+                raise CommandError('uvicorn is required for --spawn')
+            command = [
+                'uvicorn', 'src.asgi:application', '--host', '127.0.0.1', '--port', str(port),
+                '--workers', str(options['workers']), '--log-level', 'warning', '--no-access-log',
+            ]
+
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+        servers.append(subprocess.Popen(command, env=env, stdout=sys.stderr, stderr=sys.stderr))
+        self.wait_for_port(port)
+        return f"http://127.0.0.1:{port}"
+
+    def wait_for_port(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"Server on port {port} did not start within {timeout}s")
+
+    async def run_load(self, base_url, path, headers, options):
+        url = urlsplit(base_url)
+        host, port = url.hostname, url.port or 80
+        concurrency = options['concurrency']
+
+        # Warm caches and connection pools outside the measured window
+        warmup = Connection(host, port, headers)
+        for _ in range(options['warmup']):
+            await warmup.get(path)
+        warmup.close()
+
+        remaining = options['requests']
+        latencies = []
+        errors = 0
+
+        async def worker():
+            nonlocal remaining, errors
+            connection = Connection(host, port, headers)
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                try:
+                    status = await connection.get(path)
+                    if status >= 400:
+                        errors += 1
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    errors += 1
+                    connection.close()
+                latencies.append(time.perf_counter() - start)
+            connection.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': len(latencies) / elapsed,
+            'p50': percentile(0.50),
+            'p99': percentile(0.99),
+            'max': latencies[-1] * 1000,
+        }
@@ -0,0 +1,253 @@
+# middleware.py
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+from .compression import COMPRESSIBLE_TYPES, compressed_variants, get_compression_settings, negotiate
+from .performance_monitoring import (
+    QueryBudgetExceeded,
+    can_view_server_timing,
+    explain,
+    fingerprint,
+    get_instrumentation_settings,
+    query_metrics,
+    recording,
+)
+from .replicas import get_replica_settings, pin_cache_key, routing_state
+
+logger = logging.getLogger(__name__)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin reads to the primary for a few seconds after a client writes.
+
+    Writes are detected by the router (any db_for_write in the request). The
+    pin is carried by a short-lived cookie for the same client and by a cache
+    flag for the user, so other devices and tabs also see their own writes.
+    Async-capable, so async views under ASGI are not forced through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        config = get_replica_settings()
+        with routing_state(request, pinned=config.get('PIN_COOKIE', 'db_pin') in request.COOKIES) as state:
+            response = self.get_response(request)
+
+        if state.wrote:
+            self.set_pin_cookie(response, config)
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                cache.set(pin_cache_key(user.pk), 1, config.get('PIN_SECONDS', 5))
+        return response
+
+    async def __acall__(self, request):
+        config = get_replica_settings()
+        with routing_state(request, pinned=config.get('PIN_COOKIE', 'db_pin') in request.COOKIES) as state:
+            response = await self.get_response(request)
+
+        if state.wrote:
+            self.set_pin_cookie(response, config)
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                await cache.aset(pin_cache_key(user.pk), 1, config.get('PIN_SECONDS', 5))
+        return response
+
+    def set_pin_cookie(self, response, config):
+        response.set_cookie(
+            config.get('PIN_COOKIE', 'db_pin'),
+            '1',
+            max_age=config.get('PIN_SECONDS', 5),
+            httponly=True,
+            samesite='Lax'
+        )
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Per-view query count, DB time and request duration for every request,
+    with DEBUG=False. Queries are captured by the execute wrapper that
+    core.apps installs on each connection. Requests that repeat one query
+    N_PLUS_ONE_THRESHOLD times are logged as N+1 suspects; requests slower
+    than SLOW_REQUEST_SECONDS are logged with their slowest query, and a
+    sample of those (EXPLAIN_SAMPLE_RATE) also with its plan. Views may pin a
+    `query_budget`; with STRICT on (CI, tests) an N+1 or an over-budget
+    request raises QueryBudgetExceeded instead of only being logged. The db
+    Server-Timing header goes to the clients that may read /metrics/, or
+    to everyone with DEBUG or SERVER_TIMING on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        with recording() as recorder:
+            response = self.get_response(request)
+        plan_query = self.finish(request, response, recorder, time.perf_counter() - start)
+        if recorder.count and can_view_server_timing(request):
+            self.set_server_timing(response, recorder)
+        if plan_query:
+            self.log_plan(*plan_query)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with recording() as recorder:
+            response = await self.get_response(request)
+        plan_query = self.finish(request, response, recorder, time.perf_counter() - start)
+        # The session user is loaded lazily, with a sync query
+        if recorder.count and await sync_to_async(can_view_server_timing)(request):
+            self.set_server_timing(response, recorder)
+        if plan_query:
+            await sync_to_async(self.log_plan)(*plan_query)
+        return response
+
+    def get_view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        return match.view_name or match.route
+
+    def get_query_budget(self, request):
+        match = getattr(request, 'resolver_match', None)
+        view_class = getattr(match.func, 'view_class', None) if match else None
+        budget = getattr(view_class, 'query_budget', None)
+        if isinstance(budget, dict):
+            return budget.get(request.method.lower())
+        return budget
+
+    def finish(self, request, response, recorder, duration):
+        """Record metrics and log; returns (sql, params, alias) when a plan should be sampled"""
+        config = get_instrumentation_settings()
+        view = self.get_view_name(request)
+
+        repeated = recorder.repeated(config.get('N_PLUS_ONE_THRESHOLD', 5))
+        budget = self.get_query_budget(request)
+        over_budget = budget is not None and recorder.count > budget
+        slow = duration >= config.get('SLOW_REQUEST_SECONDS', 1.0)
+        query_metrics.observe(view, recorder, duration, bool(repeated), slow, over_budget)
+
+        if repeated:
+            statement, count = repeated[0]
+            logger.warning(f"Possible N+1 in {view}: {count} executions of {statement}")
+        if over_budget:
+            logger.warning(f"{view} ran {recorder.count} queries, over its budget of {budget}")
+        if config.get('STRICT') and (repeated or over_budget):
+            raise QueryBudgetExceeded(
+                f"{request.method} {request.path} ({view}) ran {recorder.count} queries"
+                f"{f' (budget {budget})' if budget is not None else ''}:\n{recorder.describe()}"
+            )
+
+        if not slow:
+            return None
+
+        logger.warning(
+            f"Slow request {request.method} {request.path} ({view}) took {duration * 1000:.0f}ms: "
+            f"{recorder.count} queries, {recorder.duration * 1000:.0f}ms in the database, "
+            f"slowest {recorder.slowest[0] * 1000 if recorder.slowest else 0:.0f}ms: {recorder.slowest_fingerprint}"
+        )
+        if recorder.slowest is None or random.random() >= config.get('EXPLAIN_SAMPLE_RATE', 0.1):
+            return None
+        _, sql, params, alias = recorder.slowest
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return None  # Never EXPLAIN a write: on some backends that would run it
+        return sql, params, alias
+
+    def set_server_timing(self, response, recorder):
+        response['Server-Timing'] = f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+
+    def log_plan(self, sql, params, alias):
+        try:
+            logger.warning(f"Query plan for {fingerprint(sql)}:\n{explain(sql, params, alias)}")
+        except Exception as e:
+            logger.info(f"Could not EXPLAIN slow query: {str(e)}")
+
+
+class CompressionMiddleware:
+    """
+    zstd/br/gzip for responses of at least MIN_SIZE bytes, negotiated from
+    Accept-Encoding. Responses with an ETag (the cached list and detail
+    views) also get their compressed variants cached under a digest of the
+    body, so repeated hits cost a cache read instead of a recompression. The ETag is
+    weakened on compressed responses, as Django's GZipMiddleware does.
+    Under ASGI, bodies over OFFLOAD_SIZE are compressed on a worker thread.
+    Streaming responses (exports) pass through untouched.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        coding = self.get_coding(request, response)
+        if coding is None:
+            return response
+        compressed = compressed_variants.get_or_compress(coding, response.content, self.get_cache_etag(response))
+        return self.apply(response, coding, compressed)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        coding = self.get_coding(request, response)
+        if coding is None:
+            return response
+        compressed = await compressed_variants.aget_or_compress(
+            coding, response.content, self.get_cache_etag(response)
+        )
+        return self.apply(response, coding, compressed)
+
+    def get_coding(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return None
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return None
+
+        config = get_compression_settings()
+        if len(response.content) < config.get('MIN_SIZE', 1024):
+            return None
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), config.get('ENCODINGS', ['zstd', 'br', 'gzip']))
+
+    def get_cache_etag(self, response):
+        """Only complete 200 bodies are identified by their ETag"""
+        return response.get('ETag') if response.status_code == 200 else None
+
+    def apply(self, response, coding, compressed):
+        if not compressed:
+            return response  # Did not get smaller
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = coding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f"W/{etag}"
+        return response
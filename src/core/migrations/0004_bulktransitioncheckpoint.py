@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_customuser_tokens_valid_after'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkTransitionCheckpoint',
+            fields=[
+                ('job_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('filters', models.JSONField()),
+                ('new_status', models.CharField(max_length=20)),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('state', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'bulk_transition_checkpoints',
+            },
+        ),
+    ]
@@ -1,14 +1,103 @@
 # models.py - Optimized for Scale
+from collections import Counter
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractBaseUser, UserManager, PermissionsMixin
 from django.core.validators import MinValueValidator
+from .scatter_gather import ScatterGather
+from .sharding import get_sharding_settings, get_shard_map, partition_for
 import uuid
 
+class PartitionedQuerySet(models.QuerySet):
+    """
+    QuerySet that hands partition_key filters to the router as a hint.
+
+    Without a hint, a database or a related instance to route by, the rows
+    could be on any shard, so reads fan out through ScatterGather and
+    update()/delete() run on every shard. Single-database setups are not
+    affected.
+    """
+
+    def filter(self, *args, **kwargs):
+        clone = super().filter(*args, **kwargs)
+        if kwargs.get('partition_key') is not None:
+            clone._hints = {**clone._hints, 'partition_key': kwargs['partition_key']}
+        return clone
+
+    def for_partition(self, partition_key):
+        return self.filter(partition_key=partition_key)
+
+    def spans_shards(self):
+        if self._db is not None or self._hints.get('partition_key') is not None:
+            return False
+        # Related managers route by a row's partition_key, when it has one loaded
+        instance = self._hints.get('instance')
+        if instance is not None and 'partition_key' in instance.__dict__:
+            return False
+        return set(get_shard_map().shards) != {'default'}
+
+    def _fetch_all(self):
+        if self._result_cache is None and self.spans_shards():
+            self._result_cache = ScatterGather().fetch(self)
+            self._prefetch_done = True  # Each shard's rows were prefetched from that shard
+        super()._fetch_all()
+
+    def iterator(self, chunk_size=None):
+        if self.spans_shards():
+            return iter(ScatterGather().fetch(self))
+        return super().iterator(chunk_size=chunk_size)
+
+    def count(self):
+        if self._result_cache is None and self.spans_shards():
+            return ScatterGather().count(self)
+        return super().count()
+
+    def exists(self):
+        if self._result_cache is None and self.spans_shards():
+            return any(ScatterGather().scatter(lambda alias: self.using(alias).exists()).values())
+        return super().exists()
+
+    def aggregate(self, *args, **kwargs):
+        if self.spans_shards():
+            kwargs.update({arg.default_alias: arg for arg in args})
+            return ScatterGather().aggregate(self, **kwargs)
+        return super().aggregate(*args, **kwargs)
+
+    def create(self, **kwargs):
+        if not self.spans_shards():
+            return super().create(**kwargs)
+        # QuerySet.create saves to self.db ('default'); let the router place the row instead
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+    def update(self, **kwargs):
+        if self.spans_shards():
+            return sum(self.using(alias).update(**kwargs) for alias in get_shard_map().shards)
+        return super().update(**kwargs)
+
+    def delete(self):
+        if not self.spans_shards():
+            return super().delete()
+        total, per_model = 0, Counter()
+        for alias in get_shard_map().shards:
+            deleted, counts = self.using(alias).delete()
+            total += deleted
+            per_model.update(counts)
+        return total, dict(per_model)
+
+class PartitionedManager(models.Manager.from_queryset(PartitionedQuerySet)):
+    pass
+
 class PartitionedModel(models.Model):
     """Base model for partitioned tables"""
     partition_key = models.PositiveIntegerField(default=0)  # For manual sharding
 
+    objects = PartitionedManager()
+
+    # Columns the database router reads from instance hints; only() keeps them
+    routing_fields = ('partition_key',)
+
     class Meta:
         abstract = True
 
@@ -23,14 +112,38 @@ class BaseModel(models.Model):
             models.Index(fields=['created_at']),
         ]
 
-class CustomManager(UserManager):
-    def create_user(self, email, password=None, **kwargs):
+class CustomManager(UserManager.from_queryset(PartitionedQuerySet)):
+    def get_by_natural_key(self, username):
+        # The email alone tells us which partition (and so which shard) holds the user
+        lookup = {self.model.USERNAME_FIELD: username}
+        try:
+            return self.for_partition(partition_for(username)).get(**lookup)
+        except self.model.DoesNotExist:
+            if not get_sharding_settings().get('LEGACY_PARTITION_KEYS', True):
+                raise
+            # Keyed by the old salted hash(); found on any partition until backfill_partition_keys runs
+            return self.get(**lookup)
+
+    async def aget_by_natural_key(self, username):
+        lookup = {self.model.USERNAME_FIELD: username}
+        try:
+            return await self.for_partition(partition_for(username)).aget(**lookup)
+        except self.model.DoesNotExist:
+            if not get_sharding_settings().get('LEGACY_PARTITION_KEYS', True):
+                raise
+            return await self.aget(**lookup)
+
+    def create_user(self, email, password=None, password_hash=None, **kwargs):
         if not email:
             raise ValueError('The Email field must be set')
 
         email = self.normalize_email(email)
         user = self.model(email=email, **kwargs)
-        user.set_password(password)
+        if password_hash is not None:
+            # Already hashed off the request thread (account.hashing)
+            user.password = password_hash
+        else:
+            user.set_password(password)
         user.save(using=self._db)
         return user
 
@@ -63,6 +176,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin, PartitionedModel,BaseModel)
     signup_source = models.CharField(max_length=50, default='web')
     last_login_ip = models.GenericIPAddressField(null=True, blank=True)
 
+    # "Log out everywhere": JWTs issued at or before this instant are rejected
+    tokens_valid_after = models.DateTimeField(null=True, blank=True)
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
 
@@ -74,9 +190,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin, PartitionedModel,BaseModel)
             raise ValidationError('First name and last name should not be the same')
 
     def save(self, *args, **kwargs):
-        # Auto-calculate partition key based on email hash
+        # Auto-calculate partition key based on a stable (unsalted) email hash
         if not self.partition_key:
-            self.partition_key = hash(self.email) % 10  # 10 partitions
+            self.partition_key = partition_for(self.email)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -238,7 +354,7 @@ class ClientModel(BaseModel, PartitionedModel):
             if self.manage_by:
                 self.partition_key = self.manage_by.partition_key
             else:
-                self.partition_key = hash(self.email) % 10
+                self.partition_key = partition_for(self.email)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -255,4 +371,24 @@ class ClientModel(BaseModel, PartitionedModel):
         ]
         unique_together = ['email', 'partition_key']  # Unique within partition
 
-        
\ No newline at end of file
+        
+
+class BulkTransitionCheckpoint(models.Model):
+    """
+    Progress of a ClientStatusTransition job, saved after every chunk so a
+    retried task resumes where the last one stopped. Unpartitioned: a job
+    walks every shard, and its checkpoint lives on 'default'.
+    """
+    job_id = models.CharField(max_length=32, primary_key=True)
+    filters = models.JSONField()
+    new_status = models.CharField(max_length=20)
+    chunk_size = models.PositiveIntegerField()
+    state = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'bulk_transition_checkpoints'
+
+    def __str__(self):
+        return f"{self.job_id} ({self.state.get('status')})"
@@ -0,0 +1,91 @@
+# pagination.py
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+
+class KeysetPagination:
+    """
+    Cursor pagination over the (created_at, id) ordering.
+
+    Every page is a single range seek on the created_at index, so page 10,000
+    costs the same as page 1. Cursors are opaque urlsafe-base64 tokens.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    display_page_controls = False  # Read by BrowsableAPIRenderer
+    required_fields = ('created_at', 'id')  # Read by encode_cursor; the query planner must keep them
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            raise ValidationError({self.page_size_query_param: 'Must be an integer'})
+        if page_size < 1:
+            raise ValidationError({self.page_size_query_param: 'Must be at least 1'})
+        return min(page_size, self.max_page_size)
+
+    def get_cursor(self, request):
+        return request.query_params.get(self.cursor_query_param) or None
+
+    def get_cache_suffix(self, request):
+        """Identifies one page so every page gets its own cache entry"""
+        token = self.get_cursor(request)
+        if token:
+            self.decode_cursor(token)  # A malformed cursor is a 400, not a cache entry and lock
+        return f"{token or 'first'}_{self.get_page_size(request)}"
+
+    def encode_cursor(self, instance):
+        position = [instance.created_at.isoformat(), str(instance.id)]
+        raw = json.dumps(position, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(created_at), uuid.UUID(pk)
+        except (binascii.Error, TypeError, ValueError):
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor'})
+
+    def get_page_queryset(self, queryset, request):
+        """The seek query for the requested page, one extra row to know whether another page exists"""
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-created_at', '-id')
+
+        token = self.get_cursor(request)
+        if token:
+            created_at, pk = self.decode_cursor(token)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        return queryset[:page_size + 1], page_size
+
+    def split_page(self, rows, page_size):
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = self.encode_cursor(rows[-1])
+        return rows, next_cursor
+
+    def paginate_queryset(self, queryset, request):
+        """Return (page, next_cursor) for the requested cursor position"""
+        page_queryset, page_size = self.get_page_queryset(queryset, request)
+        return self.split_page(list(page_queryset), page_size)
+
+    async def apaginate_queryset(self, queryset, request):
+        page_queryset, page_size = self.get_page_queryset(queryset, request)
+        return self.split_page([row async for row in page_queryset], page_size)
+
+    def get_paginated_data(self, data, next_cursor):
+        return {
+            'results': data,
+            'next': next_cursor,
+        }
@@ -1,42 +1,316 @@
-
-from django.db import connection
-import time
+# performance_monitoring.py
+import contextvars
 import logging
-from functools import wraps
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# The recorder for the current request/task; None means "not measuring"
+_current_recorder = contextvars.ContextVar('query_recorder', default=None)
+
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in STRICT mode when a request runs an N+1 or goes over its view's query_budget"""
+
+
+def get_instrumentation_settings():
+    return getattr(settings, 'QUERY_INSTRUMENTATION', {})
+
+
+def can_view_metrics(request):
+    """Scrapers on METRICS_ALLOWED_IPS and staff users may see query metrics"""
+    allowed = get_instrumentation_settings().get('METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if request.META.get('REMOTE_ADDR') in allowed:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+def can_view_server_timing(request):
+    """The db Server-Timing header tells clients about query counts and times, so it is gated too"""
+    return get_instrumentation_settings().get('SERVER_TIMING') or settings.DEBUG or can_view_metrics(request)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    Normalize SQL so repeats of the same statement group together: ORM SQL
+    already uses %s placeholders, so only IN lists, inline literals and
+    whitespace need collapsing.
+    """
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """Query count, DB time and per-fingerprint repeats for one unit of work"""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = defaultdict(lambda: [0, 0.0])  # fingerprint -> [count, seconds]
+        self.slowest = None  # (seconds, sql, params, alias)
+
+    def record(self, sql, params, duration, alias):
+        self.count += 1
+        self.duration += duration
+        stats = self.fingerprints[fingerprint(sql)]
+        stats[0] += 1
+        stats[1] += duration
+        if self.slowest is None or duration > self.slowest[0]:
+            self.slowest = (duration, sql, params, alias)
+        if self.parent is not None:
+            self.parent.record(sql, params, duration, alias)
+
+    def repeated(self, threshold):
+        """Fingerprints executed at least `threshold` times: the N+1 signature"""
+        return sorted(
+            ((fp, count) for fp, (count, _) in self.fingerprints.items() if count >= threshold),
+            key=lambda item: -item[1]
+        )
+
+    def describe(self, limit=5):
+        """The most repeated statements, for budget and N+1 failure messages"""
+        top = sorted(self.fingerprints.items(), key=lambda item: -item[1][0])[:limit]
+        return '\n'.join(f"  {count}x {fp}" for fp, (count, _) in top)
+
+    @property
+    def slowest_fingerprint(self):
+        return fingerprint(self.slowest[1]) if self.slowest else None
+
+
+def instrument(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection. Costs one contextvar
+    lookup when nothing is recording, so it stays on with DEBUG=False.
+    """
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.record(sql, params, time.perf_counter() - start, context['connection'].alias)
+
+
+def install_instrumentation(sender, connection, **kwargs):
+    """connection_created receiver; reconnects reuse the wrapper object, so install once"""
+    if instrument not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, instrument)
+
+
+@contextmanager
+def recording():
+    """Record every query run in this context (including sync_to_async threads it spawns)"""
+    recorder = QueryRecorder(parent=_current_recorder.get())
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+def explain(sql, params, alias):
+    """Plan for a recorded SELECT, run outside any recording"""
+    from django.db import connections
+
+    db = connections[alias]
+    with db.cursor() as cursor:
+        cursor.execute(f"{db.ops.explain_query_prefix()} {sql}", params)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
 
 def query_performance_monitor(func):
     """Decorator to monitor query performance"""
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        start_queries = len(connection.queries)
-
-        result = func(*args, **kwargs)
-
-        end_time = time.time()
-        end_queries = len(connection.queries)
+        start_time = time.perf_counter()
+        with recording() as recorder:
+            result = func(*args, **kwargs)
 
         logger.info(
-            f"Function {func.__name__} took {end_time - start_time:.2f}s "
-            f"and executed {end_queries - start_queries} queries"
+            f"Function {func.__name__} took {time.perf_counter() - start_time:.2f}s "
+            f"and executed {recorder.count} queries ({recorder.duration * 1000:.1f}ms in the database)"
         )
 
         return result
     return wrapper
 
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values"""
+
+    def __init__(self, name, documentation, buckets, labels=('view',)):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts, total = self._series.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[label_values] = (counts, total + value)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}'
+            yield f"{self.name}_sum{{{labels}}} {total}"
+            yield f"{self.name}_count{{{labels}}} {cumulative}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=('view',)):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            yield f"{self.name}{{{labels}}} {value}"
+
+
+class QueryMetrics:
+    """
+    Per-view request metrics in the Prometheus text format. Values are per
+    process; scrape every worker (or aggregate in the collector).
+    """
+
+    def __init__(self):
+        self.queries = Histogram(
+            'django_view_db_queries', 'Database queries per request',
+            [1, 2, 5, 10, 20, 50, 100, 200, 500]
+        )
+        self.db_time = Histogram(
+            'django_view_db_seconds', 'Database time per request',
+            [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+        )
+        self.duration = Histogram(
+            'django_view_request_seconds', 'Request duration',
+            [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+        )
+        self.n_plus_one = Counter('django_view_n_plus_one_total', 'Requests that repeated one query N+ times')
+        self.over_budget = Counter('django_view_over_query_budget_total', "Requests over their view's query_budget")
+        self.slow_requests = Counter('django_view_slow_requests_total', 'Requests over the slow-request threshold')
+
+    def observe(self, view, recorder, duration, n_plus_one, slow, over_budget=False):
+        self.queries.observe(recorder.count, view)
+        self.db_time.observe(recorder.duration, view)
+        self.duration.observe(duration, view)
+        if n_plus_one:
+            self.n_plus_one.inc(view)
+        if slow:
+            self.slow_requests.inc(view)
+        if over_budget:
+            self.over_budget.inc(view)
+
+    def render(self):
+        metrics = [self.queries, self.db_time, self.duration, self.n_plus_one, self.slow_requests, self.over_budget]
+        return '\n'.join(line for metric in metrics for line in metric.collect()) + '\n'
+
+
+query_metrics = QueryMetrics()
+
+
+def format_bytes(size):
+    """pg_size_pretty-style rendering: bytes below 10 kB, then kB/MB/GB/TB"""
+    if size < 10 * 1024:
+        return f"{size} bytes"
+    for unit in ('kB', 'MB', 'GB'):
+        size /= 1024
+        if size < 10 * 1024:
+            return f"{round(size)} {unit}"
+    return f"{round(size / 1024)} TB"
+
+
 class PerformanceMetrics:
     """Track database performance metrics"""
 
-    @staticmethod
-    def get_table_sizes():
-        """Get table sizes for monitoring"""
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                           SELECT
-                               table_name,
-                               pg_size_pretty(pg_total_relation_size(quote_ident(table_name))) as size
-                           FROM information_schema.tables
-                           WHERE table_schema = 'public'
-                           ORDER BY pg_total_relation_size(quote_ident(table_name)) DESC;
-                           """)
-            return dict(cursor.fetchall())
\ No newline at end of file
+    # Total on-disk size (data plus indexes) per table, by connection vendor
+    TABLE_SIZE_SQL = {
+        'postgresql': """
+                      SELECT table_name, pg_total_relation_size(quote_ident(table_name))
+                      FROM information_schema.tables
+                      WHERE table_schema = 'public'
+                      """,
+        'mysql': """
+                 SELECT table_name, data_length + index_length
+                 FROM information_schema.tables
+                 WHERE table_schema = DATABASE()
+                 """,
+        # dbstat lists each index under its own name; fold indexes into their table
+        'sqlite': """
+                  SELECT m.tbl_name, SUM(s.pgsize)
+                  FROM dbstat s JOIN sqlite_master m ON m.name = s.name
+                  GROUP BY m.tbl_name
+                  """,
+    }
+
+    @classmethod
+    def get_table_sizes(cls, tables=None, using='default', pretty=True):
+        """
+        Get table sizes for monitoring, largest first: pg_size_pretty-style
+        strings, or bytes with pretty=False. `tables` limits the result to
+        those table names. Empty for backends without a size query (or an
+        SQLite built without dbstat).
+        """
+        db = connections[using]
+        sql = cls.TABLE_SIZE_SQL.get(db.vendor)
+        if sql is None:
+            logger.warning(f"Table sizes are not available for {db.vendor}")
+            return {}
+
+        try:
+            with db.cursor() as cursor:
+                cursor.execute(sql)
+                sizes = {name: int(size or 0) for name, size in cursor.fetchall()}
+        except DatabaseError as e:
+            logger.warning(f"Table size query failed on {using}: {str(e)}")
+            return {}
+
+        if tables is not None:
+            sizes = {name: size for name, size in sizes.items() if name in tables}
+        ordered = sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+        return {name: format_bytes(size) if pretty else size for name, size in ordered}
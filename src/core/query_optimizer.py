@@ -1,4 +1,5 @@
 from .models import LeadModel, ClientModel
+from .scatter_gather import ScatterGather
 
 
 class QueryOptimizer:
@@ -26,9 +27,21 @@ class QueryOptimizer:
     @staticmethod
     def get_clients_by_lead_performance(min_score=80, limit=500):
         """Get high-performing lead clients"""
+        return QueryOptimizer.clients_by_lead_performance(min_score)[:limit]
+
+    @staticmethod
+    def get_clients_by_lead_performance_across_shards(min_score=80, limit=500):
+        """Same top N by lifetime_value, gathered from every shard with LIMIT pushed down"""
+        return ScatterGather().fetch(
+            QueryOptimizer.clients_by_lead_performance(min_score),
+            limit=limit
+        )
+
+    @staticmethod
+    def clients_by_lead_performance(min_score=80):
+        # manage_by__user is not in only(), so it must not be select_related either
         return ClientModel.objects.select_related(
-            'manage_by',
-            'manage_by__user'
+            'manage_by'
         ).filter(
             manage_by__performance_score__gte=min_score,
             status='active'
@@ -38,4 +51,4 @@ class QueryOptimizer:
             'client_tier',
             'manage_by__performance_score',
             'lifetime_value'
-        ).order_by('-lifetime_value')[:limit]
\ No newline at end of file
+        ).order_by('-lifetime_value', 'id')
\ No newline at end of file
@@ -0,0 +1,145 @@
+# query_planner.py
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+class QueryPlan:
+    """
+    What one serializer level needs from its model: columns for only(),
+    forward relations to join and reverse/many relations to prefetch (each
+    with its own plan). `restricted` is False when a field's data cannot be
+    traced to columns (SerializerMethodField, properties, source='*'), in
+    which case every column of that model is loaded.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.only = {model._meta.pk.name, *getattr(model, 'routing_fields', ())}
+        self.select_related = set()
+        self.prefetches = {}  # lookup -> (QueryPlan, columns the join needs)
+        self.restricted = True
+
+    def all_columns(self, prefix=''):
+        return {f"{prefix}{field.name}" for field in self.model._meta.concrete_fields}
+
+    def get_only(self, extra_fields=()):
+        columns = self.only
+        if not self.restricted:
+            # Every local column, plus whatever the joined relations need
+            columns = self.all_columns() | {column for column in self.only if '__' in column}
+        return sorted(columns | set(extra_fields))
+
+    def apply(self, queryset, extra_fields=()):
+        """Replace the queryset's joins, prefetches and column list with this plan's"""
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetches:
+            queryset = queryset.prefetch_related(*[
+                Prefetch(lookup, queryset=plan.apply(plan.model._default_manager.all(), join_fields))
+                for lookup, (plan, join_fields) in sorted(self.prefetches.items())
+            ])
+        return queryset.only(*self.get_only(extra_fields))
+
+
+class QueryPlanner:
+    """
+    Derives select_related/prefetch_related/only() from a serializer's field
+    graph, so list endpoints load exactly the columns they render:
+
+    * plain fields            -> the column
+    * pk-only related fields  -> the foreign key column, no join
+    * nested serializers      -> select_related (forward FK/one-to-one) or a
+                                 planned Prefetch (reverse FK/many-to-many)
+    * dotted sources          -> joins along the path, then the final column
+    """
+
+    def plan(self, serializer_class):
+        return self._plan(serializer_class)
+
+    @lru_cache(maxsize=None)
+    def _plan(self, serializer_class):
+        serializer = serializer_class()
+        plan = QueryPlan(serializer.Meta.model)
+        self.plan_fields(plan, plan.model, serializer.fields.values(), prefix='')
+        return plan
+
+    def apply(self, queryset, serializer_class, extra_fields=()):
+        return self.plan(serializer_class).apply(queryset, extra_fields)
+
+    def plan_fields(self, plan, model, fields, prefix):
+        for field in fields:
+            if field.write_only:
+                continue
+            if not field.source_attrs:  # source='*': the field reads the whole object
+                self.unrestrict(plan, model, prefix)
+                continue
+            self.plan_path(plan, model, field, list(field.source_attrs), prefix)
+
+    def plan_path(self, plan, model, field, attrs, prefix):
+        name, rest = attrs[0], attrs[1:]
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # A property or method: its inputs are unknown, so load the whole row
+            self.unrestrict(plan, model, prefix)
+            return
+
+        path = f"{prefix}{name}"
+        if not model_field.is_relation:
+            # Any remaining attrs (e.g. a JSONField key) are read from this column
+            plan.only.add(path)
+            return
+
+        related_model = model_field.related_model
+        many = model_field.many_to_many or model_field.one_to_many
+
+        if many:
+            if isinstance(field, serializers.ListSerializer) and not rest:
+                child_plan = QueryPlan(related_model)
+                self.plan_fields(child_plan, related_model, field.child.fields.values(), prefix='')
+                plan.prefetches[path] = (child_plan, self.join_fields(model_field))
+            elif isinstance(field, ManyRelatedField) and field.child_relation.use_pk_only_optimization() and not rest:
+                plan.prefetches[path] = (QueryPlan(related_model), self.join_fields(model_field))
+            else:
+                plan.prefetches[path] = (self.unrestricted_plan(related_model), self.join_fields(model_field))
+            return
+
+        # Forward FK/one-to-one (columns live here) or reverse one-to-one
+        if model_field.concrete:
+            plan.only.add(path)
+            if not rest and isinstance(field, RelatedField) and field.use_pk_only_optimization():
+                return  # Only the foreign key column is rendered
+
+        plan.select_related.add(path)
+        if rest:
+            self.plan_path(plan, related_model, field, rest, prefix=f"{path}__")
+        elif isinstance(field, serializers.Serializer):
+            self.plan_fields(plan, related_model, field.fields.values(), prefix=f"{path}__")
+        else:
+            # SlugRelatedField, StringRelatedField and friends read the related row
+            plan.only.update(QueryPlan(related_model).all_columns(prefix=f"{path}__"))
+
+    def join_fields(self, relation):
+        """Columns the prefetched rows need so Django can attach them to their parents"""
+        if relation.one_to_many:
+            return [relation.field.name]
+        return []
+
+    def unrestricted_plan(self, model):
+        plan = QueryPlan(model)
+        plan.restricted = False
+        return plan
+
+    def unrestrict(self, plan, model, prefix):
+        if prefix:
+            plan.only.update(QueryPlan(model).all_columns(prefix=prefix))
+        else:
+            plan.restricted = False
+
+
+query_planner = QueryPlanner()
@@ -0,0 +1,168 @@
+# read_through.py
+import asyncio
+import logging
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+
+from .async_cache import DELETE_IF_EQUAL_SCRIPT, async_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ReadThroughCache:
+    """
+    Read-through cache with stampede protection.
+
+    Entries are stored as (value, compute_seconds, soft_expiry) envelopes and
+    kept for `stale_timeout` seconds past their soft expiry:
+
+    * XFetch early refresh: each reader recomputes early with a probability
+      that rises as the soft expiry approaches, scaled by how long the value
+      took to compute, so hot keys are refreshed before they expire.
+    * Single flight: only the reader that wins the `<key>:lock` add() runs the
+      query; everyone else keeps serving the current value. The lock holds a
+      token unique to its holder, and release only deletes a lock that still
+      holds it, so a holder that outlived `lock_timeout` cannot release the
+      next holder's lock (atomically on Redis, get-then-delete elsewhere).
+    * Stale-while-revalidate: past the soft expiry the old value is still
+      served while the lock holder recomputes it.
+    """
+    lock_suffix = ':lock'
+
+    def __init__(self, backend=None, beta=1.0, stale_timeout=60, lock_timeout=10,
+                 wait_timeout=2.0, poll_interval=0.05, async_backend=None):
+        self._backend = backend
+        self._async_backend = async_backend
+        self.beta = beta
+        self.stale_timeout = stale_timeout
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+    @property
+    def cache(self):
+        return self._backend or cache
+
+    @property
+    def acache(self):
+        return self._async_backend or async_cache
+
+    def should_refresh(self, compute_seconds, soft_expiry, beta, now=None):
+        now = time.time() if now is None else now
+        # -log(U) for U in (0, 1] is an exponential draw, so the chance of an
+        # early refresh grows smoothly as the expiry approaches
+        jitter = -compute_seconds * beta * math.log(1.0 - random.random())
+        return now + jitter >= soft_expiry
+
+    @property
+    def lock_cache(self):
+        """
+        Locks only ever live in the shared tier: a TieredCache backend would
+        otherwise broadcast an L1 invalidation for every lock it releases.
+        """
+        return getattr(self.cache, 'l2', self.cache)
+
+    def acquire(self, key):
+        """The lock's token if this caller now holds it, else None"""
+        token = uuid.uuid4().hex
+        if self.lock_cache.add(f"{key}{self.lock_suffix}", token, self.lock_timeout):
+            return token
+        return None
+
+    def release(self, key, token):
+        lock_key = f"{key}{self.lock_suffix}"
+        lock_cache = self.lock_cache
+        if hasattr(lock_cache, 'client') and hasattr(lock_cache.client, 'encode'):
+            # django-redis: compare and delete in one round trip
+            lock_cache.client.get_client(write=True).eval(
+                DELETE_IF_EQUAL_SCRIPT, 1, lock_cache.make_key(lock_key), lock_cache.client.encode(token)
+            )
+        elif lock_cache.get(lock_key) == token:
+            lock_cache.delete(lock_key)
+
+    def compute_and_store(self, key, compute, timeout, stale_timeout):
+        start = time.time()
+        value = compute()
+        compute_seconds = time.time() - start
+
+        envelope = (value, compute_seconds, time.time() + timeout)
+        self.cache.set(key, envelope, timeout + stale_timeout)
+        return value
+
+    def wait_for_value(self, key):
+        """Poll for the lock holder's result on a cold miss"""
+        deadline = time.time() + self.wait_timeout
+        while time.time() < deadline:
+            time.sleep(self.poll_interval)
+            envelope = self.cache.get(key)
+            if envelope is not None:
+                return envelope
+        return None
+
+    def get_or_compute(self, key, compute, timeout, stale_timeout=None, beta=None):
+        stale_timeout = self.stale_timeout if stale_timeout is None else stale_timeout
+        beta = self.beta if beta is None else beta
+
+        envelope = self.cache.get(key)
+        if envelope is not None:
+            value, compute_seconds, soft_expiry = envelope
+            if not self.should_refresh(compute_seconds, soft_expiry, beta):
+                return value
+
+            token = self.acquire(key)
+            if token is None:
+                # Someone else is refreshing: serve the current (possibly stale) value
+                return value
+        else:
+            token = self.acquire(key)
+            if token is None:
+                envelope = self.wait_for_value(key)
+                if envelope is not None:
+                    return envelope[0]
+                logger.warning(f"Timed out waiting for cache fill of {key}, computing directly")
+                return compute()
+
+        try:
+            return self.compute_and_store(key, compute, timeout, stale_timeout)
+        finally:
+            self.release(key, token)
+
+    async def aget_or_compute(self, key, compute, timeout, stale_timeout=None, beta=None):
+        """get_or_compute for async views; `compute` is a coroutine function"""
+        stale_timeout = self.stale_timeout if stale_timeout is None else stale_timeout
+        beta = self.beta if beta is None else beta
+        lock_key = f"{key}{self.lock_suffix}"
+        token = uuid.uuid4().hex
+
+        envelope = await self.acache.aget(key)
+        if envelope is not None:
+            value, compute_seconds, soft_expiry = envelope
+            if not self.should_refresh(compute_seconds, soft_expiry, beta):
+                return value
+            if not await self.acache.aadd(lock_key, token, self.lock_timeout):
+                return value
+        elif not await self.acache.aadd(lock_key, token, self.lock_timeout):
+            deadline = time.time() + self.wait_timeout
+            while time.time() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                envelope = await self.acache.aget(key)
+                if envelope is not None:
+                    return envelope[0]
+            logger.warning(f"Timed out waiting for cache fill of {key}, computing directly")
+            return await compute()
+
+        try:
+            start = time.time()
+            value = await compute()
+            envelope = (value, time.time() - start, time.time() + timeout)
+            await self.acache.aset(key, envelope, timeout + stale_timeout)
+            return value
+        finally:
+            await self.acache.adelete_if_equal(lock_key, token)
+
+
+read_through_cache = ReadThroughCache()
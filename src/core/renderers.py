@@ -0,0 +1,63 @@
+# renderers.py
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# U+2028/U+2029 are valid JSON but not valid JavaScript; DRF escapes them too
+_LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class RenderedJSON:
+    """
+    A body that is already encoded JSON, e.g. a cached response.
+    FastJSONRenderer returns its bytes as they are, so a cache hit reaches
+    the HttpResponse without being decoded, re-encoded or copied.
+    """
+    __slots__ = ('body',)
+
+    def __init__(self, body):
+        self.body = body
+
+    def __getstate__(self):
+        return self.body
+
+    def __setstate__(self, state):
+        self.body = state
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson. Decimal, datetime, timedelta and lazy strings
+    go through DRF's encoder (orjson handles UUID natively), so the bytes
+    match DRF's compact UTF-8 output. Falls back to DRF's renderer without
+    orjson, for ensure_ascii/non-compact settings, indents other than 2, and
+    data orjson rejects (e.g. integers over 64 bits).
+    """
+    if orjson is not None:
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, RenderedJSON):
+            return data.body
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None and indent != 2:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        option = (self.options | orjson.OPT_INDENT_2) if indent else self.options
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=option)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        for raw, escaped in _LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
@@ -0,0 +1,149 @@
+# replicas.py
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Per-request (or per-task) routing state, set up by ReadYourWritesMiddleware
+_routing_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+def get_replica_settings():
+    return getattr(settings, 'REPLICA_ROUTING', {})
+
+
+def pin_cache_key(user_id):
+    return f"db_pin:user:{user_id}"
+
+
+class RoutingState:
+    """Whether the current unit of work must read from the primary"""
+
+    def __init__(self, request=None, pinned=False):
+        self.request = request
+        self.pinned = pinned
+        self.wrote = False
+        self._checked_user = False
+
+    def must_use_primary(self):
+        if self.pinned or self.wrote:
+            return True
+        # The API authenticates inside the view (JWT), so the user-level pin
+        # can only be looked up lazily, on the first routed read after that
+        if not self._checked_user and self.request is not None:
+            user = getattr(self.request, 'user', None)
+            if user is not None and user.is_authenticated:
+                self._checked_user = True
+                self.pinned = bool(cache.get(pin_cache_key(user.pk)))
+        return self.pinned
+
+
+def get_routing_state():
+    return _routing_state.get()
+
+
+def mark_write():
+    state = _routing_state.get()
+    if state is not None:
+        state.wrote = True
+
+
+@contextmanager
+def routing_state(request=None, pinned=False):
+    token = _routing_state.set(RoutingState(request, pinned))
+    try:
+        yield _routing_state.get()
+    finally:
+        _routing_state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Force every read inside the block to the primary (e.g. in Celery tasks after a write)"""
+    with routing_state(pinned=True) as state:
+        yield state
+
+
+class ReplicaPool:
+    """
+    Weighted replica selection with health and lag-aware failover.
+
+    settings.DATABASE_REPLICAS maps a primary alias to {replica_alias: weight}.
+    Each replica is probed at most every HEALTH_CHECK_INTERVAL seconds; a
+    replica that errors or lags more than MAX_LAG_SECONDS is skipped until a
+    later probe finds it healthy again. With no healthy replica, reads go to
+    the primary.
+    """
+
+    def __init__(self):
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def replicas_for(self, primary):
+        configured = getattr(settings, 'DATABASE_REPLICAS', {}).get(primary, {})
+        return {alias: weight for alias, weight in configured.items() if alias in connections.databases}
+
+    def primary_of(self, alias):
+        """Map a replica alias back to its primary; primaries map to themselves"""
+        for primary, replicas in getattr(settings, 'DATABASE_REPLICAS', {}).items():
+            if alias in replicas:
+                return primary
+        return alias
+
+    def measure_lag(self, alias):
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+                )
+                return float(cursor.fetchone()[0])
+            cursor.execute("SELECT 1")
+            return 0.0
+
+    def is_healthy(self, alias):
+        config = get_replica_settings()
+        now = time.monotonic()
+        healthy, checked_at = self._health.get(alias, (True, None))
+        if checked_at is not None and now - checked_at < config.get('HEALTH_CHECK_INTERVAL', 10):
+            return healthy
+
+        with self._lock:
+            healthy, checked_at = self._health.get(alias, (True, None))
+            if checked_at is not None and now - checked_at < config.get('HEALTH_CHECK_INTERVAL', 10):
+                return healthy
+            try:
+                lag = self.measure_lag(alias)
+                healthy = lag <= config.get('MAX_LAG_SECONDS', 5)
+                if not healthy:
+                    logger.warning(f"Replica {alias} is {lag:.1f}s behind, routing reads elsewhere")
+            except Exception as e:
+                logger.warning(f"Replica {alias} failed its health check: {str(e)}")
+                healthy = False
+            self._health[alias] = (healthy, now)
+        return healthy
+
+    def mark_unhealthy(self, alias):
+        self._health[alias] = (False, time.monotonic())
+
+    def choose(self, primary):
+        candidates = [
+            (alias, weight)
+            for alias, weight in self.replicas_for(primary).items()
+            if weight > 0 and self.is_healthy(alias)
+        ]
+        if not candidates:
+            return primary
+        aliases, weights = zip(*candidates)
+        return random.choices(aliases, weights=weights)[0]
+
+
+replica_pool = ReplicaPool()
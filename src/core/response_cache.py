@@ -0,0 +1,76 @@
+# response_cache.py
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags
+from django.utils.http import quote_etag
+
+from .renderers import FastJSONRenderer
+
+
+class ResponseCache:
+    """
+    Response-level cache of final JSON bytes.
+
+    Entries are (body, etag) tuples, so a hit is one cache read and an
+    HttpResponse: no model instances are unpickled and no serializer runs.
+    Keys live under their own namespace, so `lead_<pk>` here never collides
+    with the read-through envelope the generic views store under the same name.
+    """
+    content_type = 'application/json'
+    key_prefix = 'resp'
+
+    def __init__(self, backend=None, renderer_class=FastJSONRenderer):
+        self._backend = backend
+        self.renderer = renderer_class()
+
+    @property
+    def cache(self):
+        return self._backend or cache
+
+    def build_entry(self, data):
+        body = self.renderer.render(data)
+        etag = quote_etag(hashlib.md5(body, usedforsecurity=False).hexdigest())
+        return body, etag
+
+    def make_key(self, key):
+        return f"{self.key_prefix}:{key}"
+
+    def set(self, key, data, timeout):
+        entry = self.build_entry(data)
+        self.cache.set(self.make_key(key), entry, timeout)
+        return entry
+
+    def get(self, key):
+        return self.cache.get(self.make_key(key))
+
+    def delete(self, *keys):
+        self.cache.delete_many([self.make_key(key) for key in keys])
+
+    def to_response(self, entry, request=None):
+        body, etag = entry
+        if request is not None:
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            # Weak comparison: compressed responses carry W/ versions of these ETags
+            if if_none_match and (
+                etag in {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+                or if_none_match.strip() == '*'
+            ):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+        response = HttpResponse(body, content_type=self.content_type)
+        response['ETag'] = etag
+        return response
+
+    def get_or_set(self, key, build_data, timeout, request=None):
+        """Serve the cached bytes, or build, render and store them on a miss"""
+        entry = self.get(key)
+        if entry is None:
+            entry = self.set(key, build_data(), timeout)
+        return self.to_response(entry, request)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,284 @@
+# scatter_gather.py
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import cmp_to_key
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Avg, Count, F, Max, Min, OrderBy, Sum
+from django.db.models.query import (
+    FlatValuesListIterable,
+    NamedValuesListIterable,
+    ValuesIterable,
+    ValuesListIterable,
+    create_namedtuple_class,
+)
+
+from .sharding import get_shard_map
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    The process-wide pool for shard reads, created on first use. Its
+    threads live as long as the process, so each keeps its own connection
+    to every shard it has read from and reuses it per CONN_MAX_AGE.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                shards = len(get_shard_map().shards)
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SHARDING.get('SCATTER_WORKERS') or 4 * shards,
+                    thread_name_prefix='scatter-gather'
+                )
+    return _executor
+
+
+class ScatterGather:
+    """
+    Run one queryset on every shard concurrently and merge the results.
+
+    Ordered reads push LIMIT offset+limit down to each shard and k-way merge
+    the already-sorted shard results on the queryset's order_by, so a
+    cross-shard "top N" reads at most N rows per shard. NULLs are placed
+    the way the shards' database vendor places them. Aggregates are
+    computed per shard and combined (Avg as Sum/Count).
+    """
+    combinable = (Count, Sum, Min, Max, Avg)
+
+    def __init__(self, shard_map=None):
+        self.shard_map = shard_map or get_shard_map()
+
+    @property
+    def aliases(self):
+        return list(self.shard_map.shards)
+
+    def run_on_shard(self, alias, fn):
+        connection = connections[alias]
+        # No request_started/finished in pool threads: apply CONN_MAX_AGE and
+        # drop broken connections here, as Django does around each request
+        connection.close_if_unusable_or_obsolete()
+        try:
+            return fn(alias)
+        except Exception:
+            connection.close()
+            raise
+
+    def scatter(self, fn):
+        """Call fn(alias) for every shard in parallel and return {alias: result}"""
+        aliases = self.aliases
+        if len(aliases) == 1 or any(connections[alias].in_atomic_block for alias in aliases):
+            # Worker threads would not see this transaction's uncommitted rows
+            return {alias: fn(alias) for alias in aliases}
+        executor = get_executor()
+        futures = {alias: executor.submit(self.run_on_shard, alias, fn) for alias in aliases}
+        # Let every shard finish before raising, as the per-call pool's exit used to
+        wait(futures.values())
+        return {alias: future.result() for alias, future in futures.items()}
+
+    def get_ordering(self, queryset):
+        """
+        The queryset's ordering as [(name, descending, nulls_first)], where
+        nulls_first None means the database's default. Raises ValueError for
+        orderings the merge cannot reproduce (random, or expressions other
+        than a plain field) instead of merging on an order the shards never used.
+        """
+        query = queryset.query
+        if query.order_by:
+            ordering = list(query.order_by)
+        elif query.default_ordering:
+            ordering = list(queryset.model._meta.ordering)
+        else:
+            return []
+
+        resolved = []
+        for item in ordering:
+            if isinstance(item, str):
+                if item == '?':
+                    raise ValueError("Cannot merge a random ordering across shards")
+                name, descending, nulls_first = item.lstrip('-'), item.startswith('-'), None
+            else:
+                if isinstance(item, F):
+                    item = item.asc()
+                if not isinstance(item, OrderBy) or not isinstance(item.expression, F):
+                    raise ValueError(f"Cannot merge ordering {item!r} across shards")
+                name, descending = item.expression.name, item.descending
+                nulls_first = True if item.nulls_first else False if item.nulls_last else None
+            resolved.append((self.resolve_name(queryset.model, name), descending, nulls_first))
+        return resolved
+
+    def resolve_name(self, model, name):
+        """'pk' as the primary key's name; a foreign key as its column, which is what the database sorts on"""
+        if name == 'pk':
+            return model._meta.pk.name
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return name  # An annotation or a related path
+        if field.is_relation and field.many_to_one:
+            if field.related_model._meta.ordering:
+                raise ValueError(f"Cannot merge on '{name}': it sorts by {field.related_model.__name__}'s ordering")
+            return field.attname
+        return name
+
+    def is_values(self, queryset):
+        return issubclass(queryset._iterable_class, (ValuesIterable, ValuesListIterable, FlatValuesListIterable))
+
+    def get_selected(self, queryset):
+        """Names of a values()/values_list() queryset's columns, in the order its rows hold them"""
+        query = queryset.query
+        if queryset._fields and not issubclass(queryset._iterable_class, ValuesIterable):
+            return [*queryset._fields, *(name for name in query.annotation_select if name not in queryset._fields)]
+        return [*query.extra_select, *query.values_select, *query.annotation_select]
+
+    def find_column(self, queryset, selected, name):
+        if name not in selected and name == queryset.model._meta.pk.name and 'pk' in selected:
+            return 'pk'
+        return name if name in selected else None
+
+    def select_ordering(self, queryset, ordering):
+        """
+        Values rows only carry what was selected. When the ordering uses
+        other columns, read those too and return a function that turns the
+        wider rows back into the shape the queryset promised; else (queryset, None).
+        """
+        if not ordering or not self.is_values(queryset):
+            return queryset, None
+        selected = self.get_selected(queryset)
+        missing = [name for name, *_ in ordering if self.find_column(queryset, selected, name) is None]
+        if not missing:
+            return queryset, None
+
+        width = len(selected)
+        iterable = queryset._iterable_class
+        if issubclass(iterable, ValuesIterable):
+            restore = lambda row: dict(zip(selected, row))
+        elif issubclass(iterable, FlatValuesListIterable):
+            restore = lambda row: row[0]
+        elif issubclass(iterable, NamedValuesListIterable):
+            Row = create_namedtuple_class(*selected)
+            restore = lambda row: Row(*row[:width])
+        else:
+            restore = lambda row: row[:width]
+        return queryset.values_list(*selected, *missing), restore
+
+    def make_getter(self, queryset, name):
+        """row -> its value for `name`, for model instances, values() dicts and values_list() rows"""
+        if not self.is_values(queryset):
+            path = name.split('__')
+
+            def get(row):
+                for attr in path:
+                    if row is None:
+                        return None
+                    row = getattr(row, attr)
+                return row
+            return get
+
+        name = self.find_column(queryset, self.get_selected(queryset), name)
+        if issubclass(queryset._iterable_class, ValuesIterable):
+            return lambda row: row[name]
+        if issubclass(queryset._iterable_class, FlatValuesListIterable):
+            return lambda row: row
+        index = self.get_selected(queryset).index(name)
+        return lambda row: row[index]
+
+    def make_sort_key(self, queryset, ordering, vendor):
+        # PostgreSQL and Oracle sort NULLs as the largest value, SQLite and MySQL as the smallest
+        nulls_largest = vendor in ('postgresql', 'oracle')
+        keys = []
+        for name, descending, nulls_first in ordering:
+            if nulls_first is None:
+                nulls_first = descending if nulls_largest else not descending
+            keys.append((self.make_getter(queryset, name), descending, nulls_first))
+
+        def compare(a, b):
+            for get, descending, nulls_first in keys:
+                left, right = get(a), get(b)
+                if left == right:
+                    continue
+                if left is None or right is None:
+                    # NULL placement does not flip with the direction
+                    return (-1 if left is None else 1) * (1 if nulls_first else -1)
+                result = -1 if left < right else 1
+                return -result if descending else result
+            return 0
+        return cmp_to_key(compare)
+
+    def fetch(self, queryset, limit=None, offset=0):
+        """Ordered, limited read across shards; also honours an already-sliced queryset"""
+        queryset = queryset._chain()
+        if queryset.query.low_mark or queryset.query.high_mark is not None:
+            offset = queryset.query.low_mark
+            if queryset.query.high_mark is not None:
+                limit = queryset.query.high_mark - offset
+            queryset.query.clear_limits()
+
+        # Checked first: an ordering the merge cannot follow should fail before any shard is read
+        ordering = self.get_ordering(queryset)
+        queryset, restore = self.select_ordering(queryset, ordering)
+        if ordering:
+            sort_key = self.make_sort_key(queryset, ordering, connections[self.aliases[0]].vendor)
+
+        # Each shard can only contribute rows from the first offset+limit of its own order
+        per_shard = queryset if limit is None else queryset[:offset + limit]
+        results = self.scatter(lambda alias: list(per_shard.using(alias)))
+
+        if ordering:
+            merged = heapq.merge(*results.values(), key=sort_key)
+        else:
+            merged = (row for rows in results.values() for row in rows)
+
+        stop = None if limit is None else offset + limit
+        rows = list(islice(merged, offset, stop))
+        return rows if restore is None else [restore(row) for row in rows]
+
+    def count(self, queryset):
+        return sum(self.scatter(lambda alias: queryset.using(alias).count()).values())
+
+    def aggregate(self, queryset, **aggregates):
+        """Cross-shard aggregate() supporting Count, Sum, Min, Max and Avg"""
+        per_shard = {}
+        for name, expression in aggregates.items():
+            if not isinstance(expression, self.combinable):
+                raise ValueError(f"Cannot combine {type(expression).__name__} across shards")
+            if getattr(expression, 'distinct', False):
+                raise ValueError(f"Cannot combine a DISTINCT {type(expression).__name__} across shards")
+            if isinstance(expression, Avg):
+                field = expression.source_expressions[0]
+                per_shard[f"{name}__sum"] = Sum(field)
+                per_shard[f"{name}__count"] = Count(field)
+            else:
+                per_shard[name] = expression
+
+        results = self.scatter(lambda alias: queryset.using(alias).aggregate(**per_shard)).values()
+
+        combined = {}
+        for name, expression in aggregates.items():
+            if isinstance(expression, Avg):
+                total = self.combine(Sum, [row[f"{name}__sum"] for row in results])
+                count = self.combine(Count, [row[f"{name}__count"] for row in results])
+                combined[name] = total / count if count else None
+            else:
+                combined[name] = self.combine(type(expression), [row[name] for row in results])
+        return combined
+
+    def combine(self, function, values):
+        if function is Count:
+            return sum(values)
+        values = [value for value in values if value is not None]
+        if not values:
+            return None
+        if function is Sum:
+            return sum(values)
+        if function is Min:
+            return min(values)
+        return max(values)
@@ -12,20 +12,32 @@ class DesignationSerializer(serializers.ModelSerializer):
 class ClientSerializer(serializers.ModelSerializer):
     class Meta:
         model=ClientModel
-        fields=['full_name','email','contact']
+        fields=['full_name','email','phone']
+
+    def validate_email(self, value):
+        # (email, partition_key) is the natural key: case variants are the same client
+        return value.strip().lower()
 
     def validate(self, attrs):
-        if len(attrs['full_name'])>5:
+        if 'full_name' in attrs and len(attrs['full_name'])<5:
             raise serializers.ValidationError('Fullname must be more 5 character ')
 
-        if attrs['contact'].isDigit:
+        if attrs.get('phone') and not attrs['phone'].replace('+','').isdigit():
             raise serializers.ValidationError('Contact number must be digits')
 
         return attrs
 
 
+class ClientUpsertSerializer(ClientSerializer):
+    """Row-level validation for bulk upserts; (email, partition_key) is the natural key"""
+    class Meta:
+        model=ClientModel
+        fields=['full_name','email','phone','client_tier','status','lifetime_value',
+                'last_purchase_date','country_code','timezone']
+
+
 class LeadClientSerializer(serializers.ModelSerializer):
-    clients=ClientSerializer(read_only=True)
+    clients=ClientSerializer(source='managed_clients',many=True,read_only=True)
     class Meta:
         model=LeadModel
         fields=['clients','user','designation','salary','experience']
@@ -0,0 +1,108 @@
+# sharding.py
+import bisect
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DEFAULT_PARTITION_COUNT = 10
+DEFAULT_VIRTUAL_NODES = 64
+
+
+def get_sharding_settings():
+    return getattr(settings, 'SHARDING', {})
+
+
+def stable_hash(value, algorithm=None):
+    """
+    Process-independent hash. Unlike hash(), which is salted per interpreter,
+    this maps the same value to the same integer on every worker.
+    """
+    algorithm = algorithm or get_sharding_settings().get('HASH', 'crc32')
+    data = str(value).encode('utf-8')
+
+    if algorithm == 'crc32':
+        return zlib.crc32(data)
+    if algorithm == 'xxhash':
+        if xxhash is None:
+            raise ImproperlyConfigured("SHARDING['HASH'] = 'xxhash' requires the xxhash package")
+        return xxhash.xxh64_intdigest(data)
+    raise ImproperlyConfigured(f"Unknown SHARDING['HASH'] algorithm '{algorithm}'")
+
+
+def partition_for(value):
+    """Logical partition (0..PARTITION_COUNT-1) for an email or other shard key"""
+    partition_count = get_sharding_settings().get('PARTITION_COUNT', DEFAULT_PARTITION_COUNT)
+    return stable_hash(str(value).strip().lower()) % partition_count
+
+
+class ShardMap:
+    """
+    Consistent-hash ring mapping logical partitions to database aliases.
+
+    Each shard owns `virtual_nodes * weight` points on the ring, so adding a
+    shard only moves roughly 1/N of the partitions and weights let bigger
+    hosts take a larger share.
+    """
+
+    def __init__(self, shards, virtual_nodes=DEFAULT_VIRTUAL_NODES, algorithm=None):
+        if not shards:
+            raise ImproperlyConfigured('ShardMap needs at least one shard')
+
+        self.shards = dict(shards)
+        self.algorithm = algorithm
+        ring = []
+        for alias, weight in self.shards.items():
+            for vnode in range(virtual_nodes * weight):
+                ring.append((stable_hash(f"{alias}#{vnode}", algorithm), alias))
+        ring.sort()
+        self._points = [point for point, _ in ring]
+        self._aliases = [alias for _, alias in ring]
+
+    def shard_for(self, partition_key):
+        point = stable_hash(f"partition:{partition_key}", self.algorithm)
+        index = bisect.bisect(self._points, point) % len(self._points)
+        return self._aliases[index]
+
+    def partitions_by_shard(self, partition_count=None):
+        """Which logical partitions each shard owns, e.g. for scatter-gather"""
+        partition_count = partition_count or get_sharding_settings().get('PARTITION_COUNT', DEFAULT_PARTITION_COUNT)
+        layout = {alias: [] for alias in self.shards}
+        for partition in range(partition_count):
+            layout[self.shard_for(partition)].append(partition)
+        return layout
+
+    @classmethod
+    def from_settings(cls):
+        config = get_sharding_settings()
+        # Only route to aliases this deployment actually defines
+        shards = {
+            alias: weight
+            for alias, weight in config.get('SHARDS', {}).items()
+            if alias in connections.databases
+        }
+        return cls(
+            shards or {'default': 1},
+            virtual_nodes=config.get('VIRTUAL_NODES', DEFAULT_VIRTUAL_NODES),
+            algorithm=config.get('HASH', 'crc32')
+        )
+
+
+@lru_cache(maxsize=1)
+def get_shard_map():
+    return ShardMap.from_settings()
+
+
+@receiver(setting_changed)
+def reset_shard_map(setting, **kwargs):
+    if setting in ('SHARDING', 'DATABASES'):
+        get_shard_map.cache_clear()
@@ -0,0 +1,76 @@
+# signals.py
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_tags import tagged_cache
+from .models import ClientModel, DesignationModel, LeadModel
+from .response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+@receiver([post_save, post_delete], sender=DesignationModel)
+def invalidate_designation_caches(sender, instance, **kwargs):
+    """Broadcast designation writes from any source (API, admin, shell) to every worker's L1"""
+    from .apiviewset import DesignationDetailAPIView, DesignationListAPIView
+
+    DesignationListAPIView.tagged_cache.invalidate("designations:all")
+    DesignationListAPIView.read_through_cache.cache.delete(
+        DesignationDetailAPIView().get_cache_key(instance.pk)
+    )
+
+
+def invalidate_after_commit(using, tags, detail_view, pk):
+    """Bump `tags` and drop the detail entry once the write is visible, so no reader re-caches the old rows"""
+    def invalidate():
+        try:
+            tagged_cache.invalidate(*tags)
+            cache_key = detail_view().get_cache_key(pk)
+            detail_view.read_through_cache.cache.delete(cache_key)
+            response_cache.delete(cache_key)
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed for tags {tags}: {str(e)}")
+    transaction.on_commit(invalidate, using=using)
+
+
+@receiver([post_save, post_delete], sender=LeadModel)
+def invalidate_lead_caches(sender, instance, using, **kwargs):
+    """Admin and ORM saves and cascaded deletes drop the owner's lead pages, not only API writes"""
+    from .apiviewset import LeadDetailAPIView
+
+    invalidate_after_commit(using, [f"leads:user:{instance.user_id}"], LeadDetailAPIView, instance.pk)
+
+
+# Lead pk -> user id. A lead's user never changes, so a worker can keep the
+# answer and ORM writes that did not load manage_by skip the lookup next time
+lead_owners = {}
+LEAD_OWNERS_MAX = 10000
+
+
+def get_lead_owner(using, lead_id):
+    user_id = lead_owners.get(lead_id)
+    if user_id is None:
+        user_id = LeadModel.objects.using(using).filter(pk=lead_id).values_list('user_id', flat=True).first()
+        if user_id is not None:
+            if len(lead_owners) >= LEAD_OWNERS_MAX:
+                lead_owners.clear()
+            lead_owners[lead_id] = user_id
+    return user_id
+
+
+@receiver([post_save, post_delete], sender=ClientModel)
+def invalidate_client_caches(sender, instance, using, **kwargs):
+    """Client pages are tagged by the managing lead's user; lead pages embed clients under the same tag"""
+    from .apiviewset import ClientDetailAPIView
+
+    tags = []
+    if ClientModel.manage_by.is_cached(instance) and instance.manage_by is not None:
+        tags.append(f"clients:user:{instance.manage_by.user_id}")
+    elif instance.manage_by_id is not None:
+        user_id = get_lead_owner(using, instance.manage_by_id)
+        if user_id is not None:
+            tags.append(f"clients:user:{user_id}")
+    invalidate_after_commit(using, tags, ClientDetailAPIView, instance.pk)
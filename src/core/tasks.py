@@ -41,3 +41,27 @@ def send_welcome_email(user_email, username):
 
     return send_email_task.delay(subject, message, [user_email])
 
+
+@shared_task(bind=True, acks_late=True, max_retries=5, default_retry_delay=30)
+def transition_client_status_task(self, job_id, chunks_per_run=50):
+    """
+    Run a ClientStatusTransition a slice at a time, re-queueing itself between
+    slices so one job never monopolises a worker. Retries resume from the checkpoint.
+    """
+    from .bulk_transitions import ClientStatusTransition
+
+    job = ClientStatusTransition.load(job_id)
+    if job is None or job.finished:
+        return job_id
+
+    try:
+        complete = job.run(max_chunks=chunks_per_run)
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            job.fail(e)
+            raise
+        raise self.retry(exc=e)
+
+    if not complete:
+        transition_client_status_task.delay(job_id, chunks_per_run)
+    return job_id
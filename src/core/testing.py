@@ -0,0 +1,73 @@
+# testing.py
+from contextlib import contextmanager
+
+from django.test import TestCase
+from django.urls import resolve
+
+from .performance_monitoring import get_instrumentation_settings, recording
+from .sharding import get_shard_map
+
+
+@contextmanager
+def assert_max_queries(limit, n_plus_one_threshold=None):
+    """
+    Fail if the block runs more than `limit` queries (on any database), or
+    repeats one statement `n_plus_one_threshold` times. Unlike
+    assertNumQueries it is an upper bound, so removing a query never breaks it.
+    """
+    with recording() as recorder:
+        yield recorder
+
+    problems = []
+    if recorder.count > limit:
+        problems.append(f"{recorder.count} queries, budget is {limit}")
+    if n_plus_one_threshold:
+        problems += [f"{count} executions of one statement (N+1?)" for _, count in recorder.repeated(n_plus_one_threshold)]
+    if problems:
+        raise AssertionError(f"{'; '.join(problems)}:\n{recorder.describe()}")
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting that an endpoint stays within its view's query_budget"""
+
+    def assertWithinQueryBudget(self, path, method='get', **kwargs):
+        view_class = resolve(path).func.view_class
+        budget = view_class.query_budget
+        if isinstance(budget, dict):
+            budget = budget.get(method)
+        self.assertIsNotNone(budget, f"{view_class.__name__} has no query_budget for {method.upper()}")
+
+        threshold = get_instrumentation_settings().get('N_PLUS_ONE_THRESHOLD', 5)
+        with assert_max_queries(budget, n_plus_one_threshold=threshold):
+            response = getattr(self.client, method)(path, **kwargs)
+        return response
+
+
+class ShardedTestCase(TestCase):
+    """
+    TestCase spanning every configured shard. Run with
+    --settings=src.settings_sharded so each shard is a separate SQLite database.
+    """
+    databases = '__all__'
+
+    def shard_aliases(self):
+        return list(get_shard_map().shards)
+
+    def rows_per_shard(self, model):
+        return {alias: model.objects.using(alias).count() for alias in self.shard_aliases()}
+
+    def assertStoredOn(self, instance, alias):
+        self.assertEqual(instance._state.db, alias)
+        self.assertTrue(
+            type(instance).objects.using(alias).filter(pk=instance.pk).exists(),
+            f"{instance!r} is not stored on {alias}"
+        )
+        for other in self.shard_aliases():
+            if other != alias:
+                self.assertFalse(
+                    type(instance).objects.using(other).filter(pk=instance.pk).exists(),
+                    f"{instance!r} leaked onto {other}"
+                )
+
+    def assertRoutedTo(self, queryset, alias):
+        self.assertEqual(queryset.db, alias)
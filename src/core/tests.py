@@ -1,3 +1,1452 @@
-from django.test import TestCase
+import csv
+import gzip
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import json
+import threading
+import time
+from unittest import mock, skipUnless
+import uuid
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+import brotli
+import fakeredis
+import fakeredis.aioredis
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connections
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Lower
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from account.tokens import ShardedRefreshToken
+
+from .apiviewset import ClientListCreateAPIView
+from .async_cache import AsyncCache
+from .bulk_import import ClientImportPipeline
+from .bulk_operations import BulkOperations
+from .bulk_transitions import ClientStatusTransition
+from .cache_tags import TaggedCache, tagged_cache
+from .compression import CompressedVariants, compressed_variants, negotiate
+from .database_router import PartitionRouter
+from .exports import StreamingExporter
+from .fast_serializers import compile_serializer
+from .middleware import CompressionMiddleware, QueryInstrumentationMiddleware, ReadYourWritesMiddleware
+from .models import ClientModel, CustomUser, DesignationModel, LeadModel
+from .pagination import KeysetPagination
+from .parsers import FastJSONParser
+from .query_planner import query_planner
+from .performance_monitoring import QueryBudgetExceeded, query_metrics
+from .response_cache import response_cache
+from .read_through import ReadThroughCache
+from .renderers import FastJSONRenderer, RenderedJSON
+from .replicas import replica_pool, use_primary
+from .serializers import (
+    ClientSerializer,
+    ClientUpsertSerializer,
+    DesignationSerializer,
+    LeadClientSerializer,
+    LeadSerializer,
+)
+from .scatter_gather import ScatterGather, get_executor
+from .sharding import get_shard_map, partition_for
+from .tiered_cache import TieredCache
+from .testing import QueryBudgetMixin, ShardedTestCase, assert_max_queries
+from .views import ClientRetrieveUpdateDestroyed, LeadRetrieveUpdateDestroyed
+
+
+# Users are created by the dozen; the hasher is not under test here
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# In-process Redis behind the django-redis alias of the async cache tests
+SHARED_REDIS = fakeredis.FakeServer()
+
+
+class ShardedDataMixin:
+    """Users, leads and clients on the shards their partition_key maps to"""
+
+    def create_designation(self, name='Engineer'):
+        # Reference data exists on every shard, so leads keep their foreign key local
+        designation = DesignationModel(name=name)
+        for alias in dict.fromkeys([*self.shard_aliases(), 'default']):
+            designation.save_base(using=alias, raw=True, force_insert=True)
+        return designation
+
+    def clear_caches(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+    def auth_headers(self, user):
+        return {'HTTP_AUTHORIZATION': f"Bearer {ShardedRefreshToken.for_user(user).access_token}"}
+
+    def create_lead(self, email, designation, clients=0):
+        user = CustomUser.objects.create_user(email, 'password', first_name='Lead', last_name=email)
+        lead = LeadModel.objects.create(user=user, designation=designation, salary=Decimal('50000'))
+        for i in range(clients):
+            ClientModel.objects.create(manage_by=lead, full_name=f"Client {i}", email=f"client{i}.{email}")
+        return user, lead
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class PartitionKeyBackfillTests(ShardedDataMixin, ShardedTestCase):
+    def make_legacy(self, user, lead):
+        """Store the user's rows as the salted hash() left them: another key, on that key's shard"""
+        legacy_key = (user.partition_key + 1) % settings.SHARDING['PARTITION_COUNT']
+        source, target = user._state.db, get_shard_map().shard_for(legacy_key)
+        rows = [user, lead, *ClientModel.objects.using(source).filter(manage_by=lead)]
+        for instance in rows:
+            type(instance).objects.using(source).filter(pk=instance.pk).update(partition_key=legacy_key)
+        if source != target:
+            for instance in rows:
+                instance.partition_key = legacy_key
+                instance.save_base(using=target, raw=True, force_insert=True)
+            ClientModel.objects.using(source).filter(manage_by=lead).delete()
+            CustomUser.objects.using(source).filter(pk=user.pk).delete()
+        return legacy_key
+
+    def test_legacy_keys_are_found_and_backfilled(self):
+        user, lead = self.create_lead('legacy@example.com', self.create_designation(), clients=2)
+        legacy_key = self.make_legacy(user, lead)
+
+        # Found through the unfiltered fallback until the backfill has run
+        self.assertEqual(CustomUser.objects.get_by_natural_key(user.email).partition_key, legacy_key)
+        with self.settings(SHARDING={**settings.SHARDING, 'LEGACY_PARTITION_KEYS': False}):
+            with self.assertRaises(CustomUser.DoesNotExist):
+                CustomUser.objects.get_by_natural_key(user.email)
+
+        call_command('backfill_partition_keys', '--move', stdout=StringIO())
+
+        key = partition_for(user.email)
+        backfilled = CustomUser.objects.get_by_natural_key(user.email)
+        self.assertEqual(backfilled.partition_key, key)
+        self.assertStoredOn(backfilled, get_shard_map().shard_for(key))
+        self.assertEqual(backfilled.created_at, user.created_at)
+        self.assertEqual(LeadModel.objects.get(user_id=user.pk).partition_key, key)
+        self.assertEqual(
+            list(ClientModel.objects.filter(manage_by_id=lead.pk).values_list('partition_key', flat=True)),
+            [key, key]
+        )
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryBudgetTests(ShardedDataMixin, QueryBudgetMixin, ShardedTestCase):
+    """
+    Pin the list endpoints to their views' query_budget. The sharded test
+    settings also turn on QUERY_INSTRUMENTATION['STRICT'], so any request
+    in the suite that repeats a statement fails too.
+    """
+
+    def setUp(self):
+        self.clear_caches()
+        self.user, self.lead = self.create_lead('budget@example.com', self.create_designation(), clients=12)
+        self.headers = self.auth_headers(self.user)
+
+    def test_leads_within_budget(self):
+        response = self.assertWithinQueryBudget('/leads/', **self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_clients_within_budget(self):
+        response = self.assertWithinQueryBudget('/clients/', **self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['results']), 12)
+
+    def test_cached_page_runs_no_queries(self):
+        self.client.get('/clients/', **self.headers)
+        with assert_max_queries(0):
+            response = self.client.get('/clients/', **self.headers)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryInstrumentationTests(ShardedDataMixin, ShardedTestCase):
+    outside = {'REMOTE_ADDR': '203.0.113.7'}
+
+    def setUp(self):
+        self.clear_caches()
+        self.user, self.lead = self.create_lead('instrumented@example.com', self.create_designation(), clients=2)
+        self.headers = self.auth_headers(self.user)
+
+    def test_server_timing_is_only_for_metrics_viewers(self):
+        self.assertNotIn('Server-Timing', self.client.get('/clients/', **self.headers, **self.outside))
+        self.clear_caches()
+        self.assertIn('queries', self.client.get('/clients/', **self.headers)['Server-Timing'])
+
+        CustomUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.clear_caches()
+        self.assertIn('Server-Timing', self.client.get('/clients/', **self.headers, **self.outside))
+
+    @override_settings(QUERY_INSTRUMENTATION={**settings.QUERY_INSTRUMENTATION, 'SERVER_TIMING': True})
+    def test_server_timing_can_be_sent_to_everyone(self):
+        self.assertIn('Server-Timing', self.client.get('/clients/', **self.headers, **self.outside))
+
+    def test_strict_mode_raises_on_an_n_plus_one(self):
+        def get_response(request):
+            for client in ClientModel.objects.filter(manage_by=self.lead):
+                for _ in range(3):
+                    LeadModel.objects.filter(pk=client.manage_by_id).exists()
+            return HttpResponse()
+
+        middleware = QueryInstrumentationMiddleware(get_response)
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'queries'):
+                middleware(RequestFactory().get('/n-plus-one/'))
+            with self.settings(QUERY_INSTRUMENTATION={**settings.QUERY_INSTRUMENTATION, 'STRICT': False}):
+                self.assertEqual(middleware(RequestFactory().get('/n-plus-one/')).status_code, 200)
+        self.assertIn('Possible N+1 in unresolved', logs.output[-1])
+        self.assertIn('django_view_n_plus_one_total{view="unresolved"}', query_metrics.render())
+
+    def test_strict_mode_raises_over_the_views_budget(self):
+        with mock.patch.object(ClientListCreateAPIView, 'query_budget', {'get': 1}):
+            with self.assertLogs('core.middleware', 'WARNING'), self.assertRaisesMessage(QueryBudgetExceeded, '(budget 1)'):
+                self.client.get('/clients/', **self.headers)
+
+    def test_metrics_are_for_allowed_ips_and_staff(self):
+        self.assertEqual(self.client.get('/metrics/', **self.outside).status_code, 404)
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('django_view_db_queries', response.content.decode())
+
+        staff = CustomUser.objects.create_user('staff@example.com', 'password', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/metrics/', **self.outside).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ShardRoutingTests(ShardedDataMixin, ShardedTestCase):
+    def setUp(self):
+        designation = self.create_designation()
+        self.users = [self.create_lead(f"user{i}@example.com", designation, clients=2)[0] for i in range(12)]
+
+    def test_rows_follow_their_partition(self):
+        shard_map = get_shard_map()
+        for user in self.users:
+            alias = shard_map.shard_for(user.partition_key)
+            self.assertStoredOn(user, alias)
+            self.assertStoredOn(user.lead_profile, alias)
+            self.assertRoutedTo(CustomUser.objects.for_partition(user.partition_key), alias)
+            for client in ClientModel.objects.using(alias).filter(manage_by__user=user):
+                self.assertEqual(client.partition_key, user.partition_key)
+
+    def test_unhinted_reads_span_every_shard(self):
+        self.assertEqual(CustomUser.objects.count(), 12)
+        self.assertEqual(ClientModel.objects.filter(full_name='Client 1').count(), 12)
+        self.assertTrue(LeadModel.objects.filter(user=self.users[-1]).exists())
+        self.assertEqual(ClientModel.objects.filter(email__startswith='client0.').update(status='active'), 12)
+
+    def test_scatter_gather_merges_ordered_pages(self):
+        everyone = sorted(self.users, key=lambda user: user.email, reverse=True)
+        page = ScatterGather().fetch(CustomUser.objects.order_by('-email'), limit=5, offset=3)
+        self.assertEqual([user.email for user in page], [user.email for user in everyone[3:8]])
+
+        totals = ScatterGather().aggregate(LeadModel.objects.all(), leads=Count('id'), salaries=Sum('salary'))
+        self.assertEqual(totals, {'leads': 12, 'salaries': Decimal('600000')})
+        self.assertEqual(
+            ScatterGather().aggregate(CustomUser.objects.all(), latest=Max('email'))['latest'], everyone[0].email
+        )
+
+    def test_scatter_gather_merges_values_rows_with_vendor_null_order(self):
+        ClientModel.objects.filter(full_name='Client 0', email__startswith='client0.user1').update(phone='5550001111')
+        ClientModel.objects.filter(full_name='Client 1', email__endswith='user2@example.com').update(phone='5550002222')
+        rows = sorted(ClientModel.objects.values_list('email', 'phone'), key=lambda row: row[0])
+
+        # SQLite sorts NULLs first; the merge has to agree with the shards
+        page = ScatterGather().fetch(ClientModel.objects.order_by('phone', 'email').values_list('email', 'phone'))
+        self.assertEqual(page, sorted(rows, key=lambda row: (row[1] is not None, row[1] or '')))
+
+        queryset = ClientModel.objects.order_by(F('phone').desc(nulls_last=True), 'email').values('email', 'phone')
+        page = ScatterGather().fetch(queryset, limit=6)
+        expected = sorted(rows, key=lambda row: row[1] or '', reverse=True)
+        self.assertEqual([(row['email'], row['phone']) for row in page], expected[:6])
+
+        pks = ScatterGather().fetch(ClientModel.objects.order_by('-pk').values_list('pk', flat=True), limit=3)
+        self.assertEqual(pks, sorted(ClientModel.objects.values_list('pk', flat=True), reverse=True)[:3])
+
+    def test_scatter_gather_refuses_orderings_it_cannot_merge(self):
+        for queryset in (CustomUser.objects.order_by('?'), CustomUser.objects.order_by(Lower('email'))):
+            with self.assertRaises(ValueError):
+                ScatterGather().fetch(queryset, limit=5)
+
+    def test_scatter_gather_orders_on_columns_it_does_not_return(self):
+        everyone = sorted(self.users, key=lambda user: user.email)
+        page = ScatterGather().fetch(CustomUser.objects.order_by('email').values_list('last_name', flat=True), limit=4)
+        self.assertEqual(page, [user.last_name for user in everyone[:4]])
+        page = ScatterGather().fetch(CustomUser.objects.order_by('-email').values('last_name'), limit=2)
+        self.assertEqual(page, [{'last_name': user.last_name} for user in everyone[:-3:-1]])
+
+
+class ScatterGatherPoolTests(SimpleTestCase):
+    """Outside a transaction, so the shard reads really go to the pool"""
+    databases = '__all__'
+
+    def setUp(self):
+        # In-memory SQLite ignores close(), so watch the calls instead
+        patcher = mock.patch.object(type(connections['default']), 'close', autospec=True)
+        self.close = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def probe(self, alias):
+        connection = connections[alias]
+        connection.ensure_connection()
+        return connection
+
+    def test_pool_threads_keep_their_connections(self):
+        used = ScatterGather().scatter(self.probe)
+        self.assertEqual(set(used), set(get_shard_map().shards))
+        self.assertTrue(all(connection is not connections[alias] for alias, connection in used.items()))
+        self.close.assert_not_called()
+
+        threads = ScatterGather().scatter(lambda alias: threading.current_thread())
+        self.assertTrue(all(thread in get_executor()._threads for thread in threads.values()))
+
+    def test_failed_read_closes_its_connection(self):
+        used = []
+
+        def fail(alias):
+            used.append(self.probe(alias))
+            raise RuntimeError('shard read failed')
+
+        with self.assertRaises(RuntimeError):
+            ScatterGather().scatter(fail)
+        self.assertEqual(len(used), len(get_shard_map().shards))
+        self.assertCountEqual([call.args[0] for call in self.close.call_args_list], used)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class KeysetPaginationTests(ShardedDataMixin, ShardedTestCase):
+    def setUp(self):
+        self.clear_caches()
+        self.user, self.lead = self.create_lead('pages@example.com', self.create_designation(), clients=7)
+        self.headers = self.auth_headers(self.user)
+
+    def get_page(self, **params):
+        response = self.client.get('/clients/', params, **self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, page_size):
+        emails, params = [], {'page_size': page_size}
+        while True:
+            page = self.get_page(**params)
+            self.assertLessEqual(len(page['results']), page_size)
+            emails += [row['email'] for row in page['results']]
+            if page['next'] is None:
+                return emails
+            params['cursor'] = page['next']
+
+    def expected_emails(self):
+        clients = ClientModel.objects.filter(manage_by=self.lead).order_by('-created_at', '-id')
+        return list(clients.values_list('email', flat=True))
+
+    def test_cursors_walk_every_row_once_in_order(self):
+        self.assertEqual(set(self.get_page()), {'results', 'next'})
+        self.assertEqual(self.walk(page_size=3), self.expected_emails())
+
+    def test_created_at_ties_are_broken_by_id(self):
+        ClientModel.objects.filter(manage_by=self.lead).update(created_at=timezone.now())
+        ids = ClientModel.objects.filter(manage_by=self.lead).values_list('email', 'id')
+        by_id = [email for email, pk in sorted(ids, key=lambda row: row[1], reverse=True)]
+        self.assertEqual(self.walk(page_size=2), by_id)
+
+    def test_invalid_cursors_are_rejected(self):
+        for cursor in ('not a cursor', 'bm90LWpzb24', 'WyJ5ZXN0ZXJkYXkiLCIxIl0'):
+            response = self.client.get('/clients/', {'cursor': cursor}, **self.headers)
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json(), {'cursor': 'Invalid cursor'})
+
+    def test_page_size_bounds(self):
+        for page_size in ('0', '-1', 'ten'):
+            response = self.client.get('/clients/', {'page_size': page_size}, **self.headers)
+            self.assertEqual(response.status_code, 400, page_size)
+            self.assertIn('page_size', response.json())
+
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get('/', {'page_size': 50000}))
+        self.assertEqual(paginator.get_page_size(request), paginator.max_page_size)
+        self.assertEqual(len(self.get_page(page_size=50000)['results']), 7)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class StreamingExportTests(ShardedDataMixin, ShardedTestCase):
+    def setUp(self):
+        self.clear_caches()
+        designation = self.create_designation()
+        self.user, self.lead = self.create_lead('exporter@example.com', designation, clients=5)
+        self.create_lead('someone.else@example.com', designation, clients=3)
+        self.headers = self.auth_headers(self.user)
+        self.emails = set(ClientModel.objects.filter(manage_by=self.lead).values_list('email', flat=True))
+
+    def export(self, path, export_format):
+        response = self.client.get(path, {'export': export_format}, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_streams_only_the_owners_rows(self):
+        with mock.patch.object(StreamingExporter, 'rows_per_write', 2):
+            response, body = self.export('/clients/', 'ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="clients.ndjson"')
+
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual({row['email'] for row in rows}, self.emails)
+        self.assertEqual(list(rows[0]), ClientListCreateAPIView.export_fields)
+        self.assertEqual(rows[0]['lifetime_value'], '0.00')
+
+        _, body = self.export('/leads/', 'ndjson')
+        self.assertEqual([json.loads(line)['user__email'] for line in body.splitlines()], [self.user.email])
+
+    def test_csv_has_a_header_and_one_line_per_row(self):
+        response, body = self.export('/clients/', 'csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        header, *rows = list(csv.reader(StringIO(body)))
+        self.assertEqual(header, ClientListCreateAPIView.export_fields)
+        self.assertEqual({row[header.index('email')] for row in rows}, self.emails)
+
+    def test_unsupported_format_is_a_400(self):
+        response = self.client.get('/clients/', {'export': 'xlsx'}, **self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'export': "Unsupported export format 'xlsx'"})
+
+
+@override_settings(DATABASE_REPLICAS={'partition_0': {'partition_0_replica': 1}})
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    Routing decisions only, against a replica alias that exists for the
+    duration of each test. Its health probe is mocked, so nothing connects.
+    """
+
+    def setUp(self):
+        replica = {**connections.databases['partition_0'], 'TEST': {'MIRROR': 'partition_0'}}
+        patcher = mock.patch.dict(connections.databases, {'partition_0_replica': replica})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        replica_pool._health.clear()
+        self.addCleanup(replica_pool._health.clear)
+        patcher = mock.patch.object(replica_pool, 'measure_lag', return_value=0.0)
+        self.measure_lag = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.router = PartitionRouter()
+        shard_map = get_shard_map()
+        self.partition_key = next(
+            key for key in range(settings.SHARDING['PARTITION_COUNT']) if shard_map.shard_for(key) == 'partition_0'
+        )
+
+    def read(self):
+        return self.router.db_for_read(ClientModel, partition_key=self.partition_key)
+
+    def write(self):
+        return self.router.db_for_write(ClientModel, partition_key=self.partition_key)
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        self.assertEqual(self.read(), 'partition_0_replica')
+        self.assertEqual(self.write(), 'partition_0')
+        self.assertEqual(replica_pool.primary_of('partition_0_replica'), 'partition_0')
+        with mock.patch.object(connections['partition_0'], 'in_atomic_block', True):
+            self.assertEqual(self.read(), 'partition_0')
+        with use_primary():
+            self.assertEqual(self.read(), 'partition_0')
+
+    def test_lagging_replica_leaves_rotation_until_a_later_probe(self):
+        self.measure_lag.return_value = 30.0
+        with self.assertLogs('core.replicas', 'WARNING'):
+            self.assertEqual(self.read(), 'partition_0')
+
+        # Not probed again within HEALTH_CHECK_INTERVAL
+        self.measure_lag.return_value = 0.0
+        self.assertEqual(self.read(), 'partition_0')
+        self.assertEqual(self.measure_lag.call_count, 1)
+
+        later = time.monotonic() + settings.REPLICA_ROUTING['HEALTH_CHECK_INTERVAL']
+        with mock.patch('core.replicas.time.monotonic', return_value=later):
+            self.assertEqual(self.read(), 'partition_0_replica')
+
+    def test_failed_probe_takes_the_replica_out(self):
+        self.measure_lag.side_effect = ConnectionError('replica is down')
+        with self.assertLogs('core.replicas', 'WARNING'):
+            self.assertEqual(self.read(), 'partition_0')
+
+    def test_writes_pin_the_client_and_the_user_to_the_primary(self):
+        routes = []
+
+        def get_response(request):
+            routes.append(self.read())
+            if request.method == 'POST':
+                self.write()
+            routes.append(self.read())
+            return HttpResponse()
+
+        middleware = ReadYourWritesMiddleware(get_response)
+        user = mock.Mock(pk=42, is_authenticated=True)
+
+        request = RequestFactory().post('/clients/')
+        request.user = user
+        response = middleware(request)
+        self.assertEqual(routes, ['partition_0_replica', 'partition_0'])
+        self.assertEqual(response.cookies['db_pin']['max-age'], settings.REPLICA_ROUTING['PIN_SECONDS'])
+
+        # The same browser, by cookie
+        routes.clear()
+        request = RequestFactory().get('/clients/')
+        request.COOKIES['db_pin'] = '1'
+        middleware(request)
+        self.assertEqual(routes, ['partition_0', 'partition_0'])
+
+        # Another device of the same user, by the cached pin; other users are not pinned
+        for request_user, expected in ((user, 'partition_0'), (mock.Mock(pk=7, is_authenticated=True), 'partition_0_replica')):
+            routes.clear()
+            request = RequestFactory().get('/clients/')
+            request.user = request_user
+            self.assertNotIn('db_pin', middleware(request).cookies)
+            self.assertEqual(routes, [expected, expected])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AsyncViewTests(ShardedDataMixin, ShardedTestCase):
+    """The /async/ twins through AsyncClient, against the sync views' responses"""
+
+    def setUp(self):
+        self.clear_caches()
+        designation = self.create_designation()
+        self.user, self.lead = self.create_lead('async@example.com', designation, clients=3)
+        self.other, self.other_lead = self.create_lead('async.other@example.com', designation, clients=1)
+        self.headers = self.auth_headers(self.user)
+        self.async_headers = {'Authorization': self.headers['HTTP_AUTHORIZATION']}
+        self.client_row = ClientModel.objects.filter(manage_by=self.lead).first()
+
+    async def test_lists_match_the_sync_views_and_honour_etags(self):
+        for path in ('/clients/', '/leads/'):
+            response = await self.async_client.get(f"/async{path}", headers=self.async_headers)
+            self.assertEqual(response.status_code, 200, response.content)
+            sync_response = await sync_to_async(self.client.get)(path, **self.headers)
+            self.assertEqual(response.json(), sync_response.json())
+
+            headers = {**self.async_headers, 'If-None-Match': response['ETag']}
+            self.assertEqual((await self.async_client.get(f"/async{path}", headers=headers)).status_code, 304)
+
+    async def test_detail_serves_the_owner_with_etags(self):
+        path = f"/async/clients/{self.client_row.pk}/"
+        response = await self.async_client.get(path, headers=self.async_headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['email'], self.client_row.email)
+        # A cached hit carries the same validators
+        cached = await self.async_client.get(path, headers=self.async_headers)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+        headers = {**self.async_headers, 'If-None-Match': response['ETag']}
+        self.assertEqual((await self.async_client.get(path, headers=headers)).status_code, 304)
+
+    async def test_detail_refuses_other_users_and_missing_rows(self):
+        other_client = await ClientModel.objects.filter(manage_by=self.other_lead).afirst()
+        for path in (f"/async/clients/{other_client.pk}/", f"/async/leads/{self.other_lead.pk}/"):
+            response = await self.async_client.get(path, headers=self.async_headers)
+            self.assertEqual(response.status_code, 403, path)
+            self.assertNotIn('ETag', response)
+
+        for path in (f"/async/clients/{uuid.uuid4()}/", f"/async/leads/{uuid.uuid4()}/"):
+            self.assertEqual((await self.async_client.get(path, headers=self.async_headers)).status_code, 404, path)
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'shared': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://shared-cache:6379/0',
+        'KEY_PREFIX': 'crm',
+        'OPTIONS': {'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection, 'server': SHARED_REDIS}},
+    },
+})
+class AsyncCacheTests(SimpleTestCase):
+    """The native redis.asyncio path shares keys and encoding with the sync django-redis client"""
+
+    def setUp(self):
+        self.cache = caches['shared']
+        self.cache.clear()
+        self.async_cache = AsyncCache('shared')
+        client = fakeredis.aioredis.FakeRedis(server=SHARED_REDIS)
+        patcher = mock.patch.object(AsyncCache, 'client', new_callable=mock.PropertyMock, return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_entries_are_shared_with_the_sync_client(self):
+        self.assertTrue(self.async_cache.native)
+        await sync_to_async(self.cache.set)('envelope', ('value', 0.1, 123.0), 60)
+        self.assertEqual(await self.async_cache.aget('envelope'), ('value', 0.1, 123.0))
+
+        await self.async_cache.aset('page', {'results': [], 'next': None}, 60)
+        self.assertEqual(await sync_to_async(self.cache.get)('page'), {'results': [], 'next': None})
+        self.assertEqual(
+            await self.async_cache.aget_many(['envelope', 'page', 'missing']),
+            {'envelope': ('value', 0.1, 123.0), 'page': {'results': [], 'next': None}}
+        )
+
+    async def test_add_incr_and_delete(self):
+        self.assertTrue(await self.async_cache.aadd('lock', 1, 10))
+        self.assertFalse(await self.async_cache.aadd('lock', 1, 10))
+        await self.async_cache.adelete('lock')
+        self.assertIsNone(await sync_to_async(self.cache.get)('lock'))
+
+    async def test_delete_if_equal(self):
+        await sync_to_async(self.cache.set)('lock', 'token-a', 10)
+        self.assertFalse(await self.async_cache.adelete_if_equal('lock', 'token-b'))
+        self.assertEqual(await sync_to_async(self.cache.get)('lock'), 'token-a')
+        self.assertTrue(await self.async_cache.adelete_if_equal('lock', 'token-a'))
+        self.assertIsNone(await sync_to_async(self.cache.get)('lock'))
+
+        with self.assertRaises(ValueError):
+            await self.async_cache.aincr('tagver:missing')
+        await sync_to_async(self.cache.set)('tagver:clients', 5, None)
+        self.assertEqual(await self.async_cache.aincr('tagver:clients'), 6)
+        self.assertEqual(await sync_to_async(self.cache.get)('tagver:clients'), 6)
+
+        # A non-positive timeout deletes, as Django's backends do
+        await self.async_cache.aset('tagver:clients', 7, 0)
+        self.assertIsNone(await sync_to_async(self.cache.get)('tagver:clients'))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ConditionalGetTests(ShardedDataMixin, ShardedTestCase):
+    def setUp(self):
+        self.clear_caches()
+        self.user, self.lead = self.create_lead('etag@example.com', self.create_designation(), clients=2)
+        self.headers = self.auth_headers(self.user)
+
+    def get_clients(self, etag=None):
+        headers = {**self.headers, **({'HTTP_IF_NONE_MATCH': etag} if etag else {})}
+        return self.client.get('/clients/', **headers)
+
+    def test_orm_save_changes_the_list_etag(self):
+        etag = self.get_clients()['ETag']
+        self.assertEqual(self.get_clients(etag).status_code, 304)
+
+        client = ClientModel.objects.filter(manage_by=self.lead).first()
+        client.full_name = 'Renamed Client'
+        with self.captureOnCommitCallbacks(using=client._state.db, execute=True):
+            client.save()
+
+        response = self.get_clients(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed Client', [row['full_name'] for row in response.json()['results']])
+
+    def test_untagged_writes_expire_with_the_cache_timeout(self):
+        etag = self.get_clients()['ETag']
+        ClientModel.objects.filter(manage_by=self.lead).update(full_name='Bulk Renamed')
+        self.assertEqual(self.get_clients(etag).status_code, 304)
+
+        later = mock.patch('core.base_views.time.time', return_value=time.time() + ClientListCreateAPIView.cache_timeout)
+        with later:
+            self.assertEqual(self.get_clients(etag).status_code, 200)
+
+    def test_view_writes_invalidate_once_after_commit(self):
+        client = ClientModel.objects.filter(manage_by=self.lead).first()
+        with mock.patch.object(tagged_cache, 'invalidate', wraps=tagged_cache.invalidate) as invalidate:
+            with self.captureOnCommitCallbacks(using=client._state.db, execute=True):
+                response = self.client.put(
+                    f"/clients/{client.pk}/", {'full_name': 'Renamed Client'},
+                    content_type='application/json', **self.headers
+                )
+        self.assertEqual(response.status_code, 200, response.content)
+        invalidate.assert_called_once_with(f"clients:user:{self.user.pk}")
+
+    def test_detail_etag_belongs_to_the_cached_body(self):
+        client = ClientModel.objects.filter(manage_by=self.lead).first()
+        path = f"/clients/{client.pk}/"
+        cached = self.client.get(path, **self.headers)
+
+        # No signal, so the cached body outlives the row it was rendered from
+        ClientModel.objects.filter(pk=client.pk).update(
+            full_name='Bulk Renamed', updated_at=client.updated_at + timedelta(seconds=5)
+        )
+        response = self.client.get(path, **self.headers)
+        self.assertEqual(response.json()['full_name'], client.full_name)
+        self.assertEqual(response['ETag'], cached['ETag'])
+
+        client.refresh_from_db()
+        with self.captureOnCommitCallbacks(using=client._state.db, execute=True):
+            client.save()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=cached['ETag'], **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['full_name'], 'Bulk Renamed')
+        self.assertNotEqual(response['ETag'], cached['ETag'])
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'], **self.headers).status_code, 304)
+
+    def test_detail_validators_are_for_the_owner_only(self):
+        path = f"/leads/{self.lead.pk}/"
+        owner_response = self.client.get(path, **self.headers)
+        self.assertEqual(owner_response.status_code, 200)
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=owner_response['ETag'], **self.headers).status_code, 304)
+
+        other, _ = self.create_lead('other@example.com', DesignationModel.objects.using('default').get())
+        response = self.client.get(
+            path,
+            HTTP_IF_NONE_MATCH=owner_response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=owner_response['Last-Modified'],
+            **self.auth_headers(other)
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ResponseCacheNamespaceTests(ShardedDataMixin, ShardedTestCase):
+    """The byte cache and the read-through cache both name detail entries `<model>_<pk>`"""
+
+    def setUp(self):
+        self.clear_caches()
+        self.user, self.lead = self.create_lead('namespace@example.com', self.create_designation(), clients=1)
+        self.headers = self.auth_headers(self.user)
+        self.client_row = ClientModel.objects.filter(manage_by=self.lead).get()
+
+    def get_legacy(self, view_class, pk):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        response = view_class.as_view()(request, pk=pk)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def get_generic(self, path):
+        response = self.client.get(path, **self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_both_paths_share_a_pk_without_reading_each_others_entries(self):
+        client_path, lead_path = f"/clients/{self.client_row.pk}/", f"/leads/{self.lead.pk}/"
+        for _ in range(2):
+            self.assertEqual(self.get_legacy(ClientRetrieveUpdateDestroyed, self.client_row.pk)['email'], self.client_row.email)
+            self.assertEqual(self.get_generic(client_path)['email'], self.client_row.email)
+            self.assertEqual(self.get_generic(lead_path)['salary'], '50000.00')
+            self.assertEqual(self.get_legacy(LeadRetrieveUpdateDestroyed, self.lead.pk)['salary'], '50000.00')
+        self.assertIsNotNone(response_cache.get(f"client_{self.client_row.pk}"))
+
+        self.client_row.full_name = 'Renamed Client'
+        with self.captureOnCommitCallbacks(using=self.client_row._state.db, execute=True):
+            self.client_row.save()
+        self.assertEqual(self.get_legacy(ClientRetrieveUpdateDestroyed, self.client_row.pk)['full_name'], 'Renamed Client')
+        self.assertEqual(self.get_generic(client_path)['full_name'], 'Renamed Client')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ClientUpsertTests(ShardedDataMixin, ShardedTestCase):
+    def setUp(self):
+        self.clear_caches()
+        designation = self.create_designation()
+        self.user, self.lead = self.create_lead('upsert@example.com', designation)
+        # A second lead in the same partition, so the two compete for one (email, partition_key)
+        email = next(
+            f"rival{i}@example.com" for i in range(1000)
+            if partition_for(f"rival{i}@example.com") == self.user.partition_key
+        )
+        self.rival_user, self.rival = self.create_lead(email, designation)
+        self.headers = self.auth_headers(self.user)
+
+    def upsert(self, rows):
+        response = self.client.post('/clients/bulk-upsert/', {'clients': rows}, content_type='application/json', **self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_case_variants_update_one_client(self):
+        self.upsert([{'full_name': 'First Client', 'email': 'Mixed@Example.com'}])
+        result = self.upsert([{'full_name': 'Renamed Client', 'email': 'mixed@example.COM', 'status': 'active'}])
+
+        self.assertEqual(result['results'][0]['status'], 'updated')
+        client = ClientModel.objects.get(email='mixed@example.com')
+        self.assertEqual((client.full_name, client.status, client.manage_by_id), ('Renamed Client', 'active', self.lead.pk))
+
+    def test_another_leads_client_is_a_conflict(self):
+        ClientModel.objects.create(manage_by=self.rival, full_name='Rival Client', email='taken@example.com')
+        result = self.upsert([
+            {'full_name': 'Hijacked Client', 'email': 'taken@example.com'},
+            {'full_name': 'Fresh Client', 'email': 'fresh@example.com'},
+        ])
+
+        self.assertEqual([row['status'] for row in result['results']], ['conflict', 'created'])
+        self.assertEqual(result['failed'], 1)
+        client = ClientModel.objects.get(email='taken@example.com')
+        self.assertEqual((client.full_name, client.manage_by_id), ('Rival Client', self.rival.pk))
+
+    def test_upsert_never_updates_a_row_taken_after_the_read(self):
+        ClientModel.objects.create(manage_by=self.rival, full_name='Rival Client', email='raced@example.com')
+        alias = get_shard_map().shard_for(self.lead.partition_key)
+        obj = ClientModel(
+            full_name='Late Client', email='raced@example.com', manage_by=self.lead, partition_key=self.lead.partition_key
+        )
+
+        written = BulkOperations.upsert_managed_clients(alias, [obj], ['full_name', 'updated_at'])
+        self.assertEqual(written, set())
+        self.assertEqual(ClientModel.objects.get(email='raced@example.com').full_name, 'Rival Client')
+
+    def test_create_lowercases_and_rejects_duplicates(self):
+        response = self.client.post(
+            '/clients/', {'full_name': 'Posted Client', 'email': 'Posted@Example.com'},
+            content_type='application/json', **self.headers
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['email'], 'posted@example.com')
+
+        response = self.client.post(
+            '/clients/', {'full_name': 'Posted Again', 'email': 'POSTED@example.com'},
+            content_type='application/json', **self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ClientModel.objects.filter(email='posted@example.com').count(), 1)
+
+
+class UpsertManagedClientsCases(ShardedDataMixin):
+    """BulkOperations.upsert_managed_clients' raw ON CONFLICT statement, run against one `vendor`'s shard"""
+    vendor = None
+
+    def setUp(self):
+        aliases = [alias for alias in self.shard_aliases() if connections[alias].vendor == self.vendor]
+        if not aliases:
+            self.skipTest(f"No {self.vendor} shard configured")
+        self.alias = aliases[0]
+        self.clear_caches()
+        designation = self.create_designation()
+        shard_map = get_shard_map()
+        emails = [f"upsert{i}@example.com" for i in range(10000)]
+        email = next(email for email in emails if shard_map.shard_for(partition_for(email)) == self.alias)
+        # A second lead in the same partition, so the two compete for one (email, partition_key)
+        rival_email = next(
+            other for other in emails if other != email and partition_for(other) == partition_for(email)
+        )
+        _, self.lead = self.create_lead(email, designation)
+        _, self.rival = self.create_lead(rival_email, designation)
+        self.assertEqual(self.lead._state.db, self.alias)
+
+    def client_for(self, lead, email, **fields):
+        return ClientModel(email=email, manage_by=lead, partition_key=lead.partition_key, **fields)
+
+    def stored(self, email):
+        return ClientModel.objects.using(self.alias).get(email=email, partition_key=self.lead.partition_key)
+
+    def test_inserts_new_rows(self):
+        written = BulkOperations.upsert_managed_clients(self.alias, [
+            self.client_for(self.lead, 'first@example.com', full_name='First'),
+            self.client_for(self.lead, 'second@example.com', full_name='Second', lifetime_value=Decimal('12.50')),
+        ], ['full_name', 'updated_at'])
+
+        self.assertEqual(written, {'first@example.com', 'second@example.com'})
+        second = self.stored('second@example.com')
+        self.assertEqual((second.full_name, second.lifetime_value, second.manage_by_id), ('Second', Decimal('12.50'), self.lead.pk))
+
+    def test_updates_only_the_given_fields_of_own_rows(self):
+        existing = ClientModel.objects.create(
+            manage_by=self.lead, full_name='Before', email='own@example.com', status='active', country_code='GB'
+        )
+        written = BulkOperations.upsert_managed_clients(self.alias, [
+            self.client_for(self.lead, 'own@example.com', full_name='After', status='cancelled'),
+        ], ['full_name', 'updated_at'])
+
+        self.assertEqual(written, {'own@example.com'})
+        stored = self.stored('own@example.com')
+        self.assertEqual(stored.pk, existing.pk)
+        self.assertEqual((stored.full_name, stored.status, stored.country_code), ('After', 'active', 'GB'))
+        self.assertGreaterEqual(stored.updated_at, existing.updated_at)
+
+    def test_rejects_a_row_owned_by_another_lead(self):
+        ClientModel.objects.create(manage_by=self.rival, full_name='Rival Client', email='taken@example.com')
+        written = BulkOperations.upsert_managed_clients(self.alias, [
+            self.client_for(self.lead, 'taken@example.com', full_name='Hijacked'),
+            self.client_for(self.lead, 'fresh@example.com', full_name='Fresh'),
+        ], ['full_name', 'manage_by', 'updated_at'])
+
+        self.assertEqual(written, {'fresh@example.com'})
+        taken = self.stored('taken@example.com')
+        self.assertEqual((taken.full_name, taken.manage_by_id), ('Rival Client', self.rival.pk))
+        self.assertEqual(ClientModel.objects.using(self.alias).filter(email='taken@example.com').count(), 1)
+
+    def test_rows_are_written_in_batches(self):
+        objs = [self.client_for(self.lead, f"batch{i}@example.com", full_name=f"Batch {i}") for i in range(5)]
+        with mock.patch.object(connections[self.alias].ops, 'bulk_batch_size', return_value=2), \
+                self.assertNumQueries(3, using=self.alias):
+            written = BulkOperations.upsert_managed_clients(self.alias, objs, ['full_name', 'updated_at'])
+        self.assertEqual(written, {obj.email for obj in objs})
+
+
+class SQLiteUpsertManagedClientsTests(UpsertManagedClientsCases, ShardedTestCase):
+    vendor = 'sqlite'
+
+    def test_other_vendors_fall_back_to_bulk_create(self):
+        ClientModel.objects.create(manage_by=self.lead, full_name='Before', email='own@example.com')
+        with mock.patch.object(connections[self.alias], 'vendor', 'mysql'):
+            written = BulkOperations.upsert_managed_clients(self.alias, [
+                self.client_for(self.lead, 'own@example.com', full_name='After'),
+                self.client_for(self.lead, 'fresh@example.com', full_name='Fresh'),
+            ], ['full_name', 'updated_at'])
+
+        self.assertEqual(written, {'own@example.com', 'fresh@example.com'})
+        self.assertEqual(self.stored('own@example.com').full_name, 'After')
+
+
+@skipUnless(
+    any(db['ENGINE'] == 'django.db.backends.postgresql' for db in settings.DATABASES.values()),
+    'No PostgreSQL database configured'
+)
+class PostgreSQLUpsertManagedClientsTests(UpsertManagedClientsCases, ShardedTestCase):
+    vendor = 'postgresql'
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class BulkTransitionTests(ShardedDataMixin, ShardedTestCase):
+    def test_job_resumes_from_its_checkpoint_after_a_cache_flush(self):
+        _user, lead = self.create_lead('transition@example.com', self.create_designation(), clients=3)
+        job = ClientStatusTransition('job1', {'manager': str(lead.pk)}, 'active', chunk_size=1)
+        job.save()
+        self.assertFalse(job.run(max_chunks=2))
+
+        self.clear_caches()
+        job = ClientStatusTransition.load('job1')
+        self.assertEqual(job.state['updated'], 2)
+        self.assertTrue(job.run())
+
+        self.assertEqual(ClientStatusTransition.load('job1').state['status'], 'completed')
+        self.assertEqual(ClientStatusTransition.load('job1').state['updated'], 3)
+        statuses = ClientModel.objects.filter(manage_by_id=lead.pk).values_list('status', flat=True)
+        self.assertEqual(set(statuses), {'active'})
+
+
+class BulkImportTests(ShardedTestCase):
+    def test_over_long_value_rejects_only_its_row(self):
+        pipeline = ClientImportPipeline()
+        stats = pipeline.run_rows([
+            {'full_name': 'Ada Lovelace', 'email': 'ada@example.com'},
+            {'full_name': 'x' * 101, 'email': 'long@example.com'},
+            {'full_name': 'Grace Hopper', 'email': 'grace@example.com', 'country_code': 'USA1'},
+        ])
+        self.assertEqual((stats.rows_imported, stats.rows_rejected), (1, 2))
+        self.assertEqual(
+            pipeline.rejects,
+            [
+                ('long@example.com', 'full_name is longer than 100 characters'),
+                ('grace@example.com', 'country_code is longer than 3 characters'),
+            ]
+        )
+        self.assertTrue(ClientModel.objects.filter(email='ada@example.com').exists())
+
+
+class CompressedVariantTests(SimpleTestCase):
+
+    def setUp(self):
+        self.variants = CompressedVariants(alias='default')
+        self.variants.cache.clear()
+
+    def test_variants_are_keyed_on_the_body(self):
+        # Same ETag and length, different bytes: each gets its own variant
+        first, second = b'{"name": "aaaa"}' * 100, b'{"name": "bbbb"}' * 100
+        self.assertEqual(self.variants.get_or_compress('gzip', first, '"v1"'), self.variants.compress('gzip', first))
+        self.assertEqual(
+            self.variants.get_or_compress('gzip', second, '"v1"'), self.variants.compress('gzip', second)
+        )
+
+    def test_repeated_body_is_served_from_the_cache(self):
+        body = b'{"name": "aaaa"}' * 100
+        self.variants.get_or_compress('gzip', body, '"v1"')
+        with mock.patch.object(self.variants, 'compress') as compress:
+            self.variants.get_or_compress('gzip', body, '"v2"')
+        compress.assert_not_called()
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"name": "aaaa", "email": "ada@example.com"}' * 100
+
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+
+    def get_response(self, request):
+        return HttpResponse(self.body, content_type='application/json')
+
+    def test_negotiation(self):
+        preference = ['zstd', 'br', 'gzip']
+        cases = [
+            ('', None),
+            ('identity', None),
+            ('gzip', 'gzip'),
+            ('gzip, br', 'br'),                       # Tie: server preference
+            ('gzip, deflate, br, zstd', 'zstd'),
+            ('gzip;q=1.0, br;q=0.5', 'gzip'),         # Client q-values win
+            ('br;q=0, gzip', 'gzip'),                 # q=0 means not acceptable
+            ('*', 'zstd'),
+            ('*;q=0.5, gzip;q=0.8', 'gzip'),
+            ('*, zstd;q=0, br;q=0', 'gzip'),
+            ('GZIP ; Q=0.9', 'gzip'),
+            ('gzip;q=oops', None),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(negotiate(header, preference), expected)
+
+    def test_compressed_response(self):
+        response = CompressionMiddleware(self.get_response)(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br'))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+    def test_identity_response_still_varies(self):
+        # A shared cache must not hand this uncompressed body to a client that accepts gzip, or the reverse
+        response = CompressionMiddleware(self.get_response)(self.factory.get('/'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, self.body)
+
+    def test_vary_is_merged(self):
+        def get_response(request):
+            response = self.get_response(request)
+            response['Vary'] = 'Cookie'
+            return response
+
+        response = CompressionMiddleware(get_response)(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Vary'], 'Cookie, Accept-Encoding')
+
+    def test_small_and_streaming_responses_pass_through(self):
+        def small(request):
+            return HttpResponse(b'{}', content_type='application/json')
+
+        def streaming(request):
+            return StreamingHttpResponse(iter([self.body]), content_type='application/json')
+
+        for get_response in (small, streaming):
+            response = CompressionMiddleware(get_response)(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertFalse(response.has_header('Vary'))
+
+    def test_etag_is_weakened(self):
+        def get_response(request):
+            response = self.get_response(request)
+            response['ETag'] = '"v1"'
+            return response
+
+        response = CompressionMiddleware(get_response)(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['ETag'], 'W/"v1"')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_async_offloads_large_bodies(self):
+        threads = {}
+        compress = compressed_variants.compress
+
+        async def get_response(request):
+            threads['loop'] = threading.current_thread()
+            return self.get_response(request)
+
+        def recording_compress(coding, body):
+            threads['compress'] = threading.current_thread()
+            return compress(coding, body)
+
+        middleware = CompressionMiddleware(get_response)
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        compression = {**settings.RESPONSE_COMPRESSION, 'OFFLOAD_SIZE': 1024}
+        with override_settings(RESPONSE_COMPRESSION=compression), \
+                mock.patch.object(compressed_variants, 'compress', side_effect=recording_compress):
+            response = async_to_sync(middleware)(request)
+
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIsNot(threads['compress'], threads['loop'])
+
+    def test_async_compresses_small_bodies_inline(self):
+        threads = {}
+        compress = compressed_variants.compress
+
+        async def get_response(request):
+            threads['loop'] = threading.current_thread()
+            return self.get_response(request)
+
+        def recording_compress(coding, body):
+            threads['compress'] = threading.current_thread()
+            return compress(coding, body)
+
+        middleware = CompressionMiddleware(get_response)
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        with mock.patch.object(compressed_variants, 'compress', side_effect=recording_compress):
+            async_to_sync(middleware)(request)
+        self.assertIs(threads['compress'], threads['loop'])
+
+class FastJSONTests(SimpleTestCase):
+    payload = {
+        'amount': Decimal('1234.50'),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'created_at': timezone.datetime(2024, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.get_fixed_timezone(60)),
+        'day': timezone.datetime(2024, 3, 1).date(),
+        'elapsed': timedelta(minutes=5),
+        'name': 'Zo\u00eb \u2028 line',
+        'nested': [{'total': Decimal('0.10')}, None, True],
+        1: 'non-string key',
+    }
+
+    def test_output_matches_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_indented_output_matches_drf(self):
+        accepted = 'application/json; indent=2'
+        data = {'amount': Decimal('1.5'), 'nested': {'id': self.payload['id']}}
+        self.assertEqual(FastJSONRenderer().render(data, accepted), JSONRenderer().render(data, accepted))
+
+    def test_falls_back_to_drf_without_orjson(self):
+        with mock.patch('core.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_falls_back_to_drf_on_big_integers(self):
+        data = {'count': 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_prerendered_body_is_returned_as_is(self):
+        body = b'{"cached":true}'
+        self.assertIs(FastJSONRenderer().render(RenderedJSON(body)), body)
+
+    def test_parser_matches_drf(self):
+        body = FastJSONRenderer().render(self.payload)
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        with mock.patch('core.parsers.orjson', None):
+            self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+    def test_parser_rejects_what_drf_rejects(self):
+        for body in (b'{"amount": NaN}', b'{"amount": 1', b'[Infinity]'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    FastJSONParser().parse(BytesIO(body))
+                with mock.patch('core.parsers.orjson', None), self.assertRaises(ParseError):
+                    FastJSONParser().parse(BytesIO(body))
+
+class TaggedCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.tagged = TaggedCache(backend=self.cache)
+
+    def test_bumping_a_tag_orphans_every_key_carrying_it(self):
+        self.tagged.set('page:1', 'one', ['clients:user:1', 'leads:user:1'], 60)
+        self.tagged.set('page:2', 'two', ['clients:user:1'], 60)
+        self.tagged.set('page:3', 'three', ['clients:user:2'], 60)
+        before = self.tagged.make_key('page:1', ['leads:user:1', 'clients:user:1'])
+
+        self.tagged.invalidate('clients:user:1')
+        self.assertIsNone(self.tagged.get('page:1', ['clients:user:1', 'leads:user:1']))
+        self.assertIsNone(self.tagged.get('page:2', ['clients:user:1']))
+        self.assertEqual(self.tagged.get('page:3', ['clients:user:2']), 'three')
+        # Orphans stay in the cache until their TTL; they are only unreachable
+        self.assertEqual(self.cache.get(before), 'one')
+
+    def test_evicted_counter_restarts_from_a_new_generation(self):
+        with mock.patch.object(self.tagged, 'new_generation', side_effect=[1000, 5000]):
+            self.assertEqual(self.tagged.make_key('page', ['tag']), 'page@1000')
+            self.tagged.invalidate('tag')
+            self.assertEqual(self.tagged.make_key('page', ['tag']), 'page@1001')
+
+            # incr raises on the missing key, so invalidate() adds a fresh generation
+            self.cache.delete(self.tagged.version_key('tag'))
+            self.tagged.invalidate('tag')
+            self.assertEqual(self.tagged.make_key('page', ['tag']), 'page@5000')
+
+    def test_async_keys_and_invalidation_match_the_sync_path(self):
+        key = async_to_sync(self.tagged.amake_key)('page', ['b', 'a'])
+        self.assertEqual(key, self.tagged.make_key('page', ['a', 'b']))
+        async_to_sync(self.tagged.ainvalidate)('a')
+        self.assertNotEqual(self.tagged.make_key('page', ['a', 'b']), key)
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'worker_a': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-worker-a'},
+    'worker_b': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-worker-b'},
+})
+class TieredCacheTests(SimpleTestCase):
+    """Two workers' L1s over one L2, with fakeredis carrying the invalidations"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+        caches['default'].clear()
+        self.worker_a, self.worker_b = self.make_worker('worker_a'), self.make_worker('worker_b')
+
+    def make_worker(self, l1_alias):
+        worker = TieredCache(l1_alias=l1_alias, l1_timeout=60)
+        worker.l1.clear()
+        # Listener threads are daemons blocked on their own fake server; they end with the process
+        patcher = mock.patch.object(worker, 'get_redis_connection', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return worker
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, 'timed out')
+            time.sleep(0.01)
+
+    def subscribers(self):
+        return self.redis.pubsub_numsub(TieredCache.channel)[0][1]
+
+    def test_l2_hits_fill_l1(self):
+        caches['default'].set_many({'one': 1, 'two': 2})
+        self.assertEqual(self.worker_a.get('one'), 1)
+        self.assertEqual(self.worker_a.get_many(['one', 'two', 'three']), {'one': 1, 'two': 2})
+        caches['default'].clear()
+        # Served from this worker's L1 only
+        self.assertEqual(self.worker_a.get_many(['one', 'two']), {'one': 1, 'two': 2})
+        self.assertIsNone(self.worker_b.get('one'))
+
+    def test_listener_starts_once_and_subscribes(self):
+        self.worker_a.get('key')
+        listener = self.worker_a._listener
+        self.assertTrue(listener.is_alive())
+        self.wait_for(lambda: self.subscribers() == 1)
+        self.worker_a.get('key')
+        self.assertIs(self.worker_a._listener, listener)
+
+    def test_writes_drop_other_workers_l1_copies(self):
+        self.worker_a.set('key', 'old')
+        self.worker_a.set('counter', 1)
+        self.assertEqual(self.worker_b.get('key'), 'old')
+        self.assertEqual(self.worker_b.get('counter'), 1)
+        # Reads start the listener; worker_a has only written
+        self.wait_for(lambda: self.subscribers() == 1)
+
+        self.worker_a.delete('key')
+        self.wait_for(lambda: 'key' not in self.worker_b.l1)
+        self.assertIsNone(self.worker_b.get('key'))
+
+        self.assertEqual(self.worker_a.incr('counter'), 2)
+        self.wait_for(lambda: 'counter' not in self.worker_b.l1)
+        self.assertEqual(self.worker_b.get('counter'), 2)
+
+    def test_read_through_locks_skip_l1_and_pub_sub(self):
+        read_through = ReadThroughCache(self.worker_a)
+        with mock.patch.object(self.redis, 'publish') as publish:
+            self.assertEqual(read_through.get_or_compute('designations', lambda: 'fresh', 60), 'fresh')
+            token = read_through.acquire('designations')
+            self.assertIsNotNone(token)
+            self.assertIn('designations:lock', caches['default'])
+            read_through.release('designations', token)
+        publish.assert_not_called()
+        self.assertNotIn('designations:lock', caches['default'])
+        self.assertNotIn('designations:lock', self.worker_a.l1)
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'shared': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://shared-cache:6379/0',
+        'KEY_PREFIX': 'crm',
+        'OPTIONS': {'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection, 'server': SHARED_REDIS}},
+    },
+})
+class ReadThroughCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.read_through = ReadThroughCache(backend=self.cache, wait_timeout=0.05, poll_interval=0.01)
+        self.compute = mock.Mock(return_value='fresh')
+
+    def test_miss_computes_once_and_hits_are_cached(self):
+        self.assertEqual(self.read_through.get_or_compute('key', self.compute, 60), 'fresh')
+        self.assertEqual(self.read_through.get_or_compute('key', self.compute, 60), 'fresh')
+        self.compute.assert_called_once()
+        self.assertIsNone(self.cache.get('key:lock'))
+
+    def test_stale_value_is_served_while_another_reader_refreshes(self):
+        self.cache.set('key', ('stale', 0.1, time.time() - 1), 60)
+        token = self.read_through.acquire('key')
+        self.assertIsNotNone(token)
+        self.assertEqual(self.read_through.get_or_compute('key', self.compute, 60), 'stale')
+        self.compute.assert_not_called()
+
+        self.read_through.release('key', token)
+        self.assertEqual(self.read_through.get_or_compute('key', self.compute, 60), 'fresh')
+
+    def test_cold_miss_waits_for_the_lock_holder_then_computes(self):
+        self.assertIsNotNone(self.read_through.acquire('key'))
+        self.assertEqual(self.read_through.get_or_compute('key', self.compute, 60), 'fresh')
+        self.compute.assert_called_once()
+        # The lock holder stores the value; the reader that gave up does not
+        self.assertIsNone(self.cache.get('key'))
+
+    def take_over_lock(self, cache):
+        """What happens when a slow holder's lock expires and another reader wins it"""
+        cache.delete('key:lock')
+        self.assertTrue(cache.add('key:lock', 'next-holder', 60))
+
+    def test_release_leaves_a_lock_it_no_longer_holds(self):
+        for alias in ('default', 'shared'):
+            with self.subTest(alias=alias):
+                cache = caches[alias]
+                cache.clear()
+                read_through = ReadThroughCache(backend=cache)
+
+                def compute():
+                    self.take_over_lock(cache)
+                    return 'fresh'
+
+                self.assertEqual(read_through.get_or_compute('key', compute, 60), 'fresh')
+                self.assertEqual(cache.get('key:lock'), 'next-holder')
+                read_through.release('key', 'next-holder')
+                self.assertIsNone(cache.get('key:lock'))
+
+    def test_async_release_leaves_a_lock_it_no_longer_holds(self):
+        read_through = ReadThroughCache(backend=self.cache, async_backend=AsyncCache('default'))
+
+        async def compute():
+            await sync_to_async(self.take_over_lock)(self.cache)
+            return 'fresh'
+
+        self.assertEqual(async_to_sync(read_through.aget_or_compute)('key', compute, 60), 'fresh')
+        self.assertEqual(self.cache.get('key:lock'), 'next-holder')
+
+
+class LeadProfileSerializer(serializers.ModelSerializer):
+    """source= through forward foreign keys, a nested serializer and a UUID foreign key"""
+    email = serializers.EmailField(source='user.email', read_only=True)
+    designation_name = serializers.CharField(source='designation.name', read_only=True)
+    designation_detail = DesignationSerializer(source='designation', read_only=True)
+
+    class Meta:
+        model = LeadModel
+        fields = ['id', 'email', 'designation', 'designation_name', 'designation_detail', 'salary', 'created_at']
+
+
+class ClientActivitySerializer(serializers.ModelSerializer):
+    """Nullable foreign key, nullable datetime and Decimal columns"""
+    class Meta:
+        model = ClientModel
+        fields = ['id', 'manage_by', 'lifetime_value', 'last_purchase_date', 'phone', 'updated_at']
+
+
+class ClientGreetingSerializer(serializers.ModelSerializer):
+    greeting = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ClientModel
+        fields = ['full_name', 'greeting']
+
+    def get_greeting(self, obj):
+        return f"Hello {obj.full_name}"
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class FastSerializerParityTests(ShardedDataMixin, ShardedTestCase):
+    """compile_serializer(S).serialize() must give exactly S(queryset, many=True).data"""
+
+    def setUp(self):
+        designation = self.create_designation()
+        _user, self.lead = self.create_lead('parity@example.com', designation, clients=3)
+        self.alias = self.lead._state.db
+        clients = ClientModel.objects.using(self.alias).filter(manage_by=self.lead).order_by('email')
+        clients.filter(email__startswith='client0.').update(
+            phone='5550001111', lifetime_value=Decimal('1234.50'), last_purchase_date=timezone.now()
+        )
+        # A client without a lead, for the nullable foreign key
+        ClientModel.objects.using(self.alias).create(
+            full_name='Nobody Managed', email='unmanaged@example.com', partition_key=self.lead.partition_key
+        )
+
+    def assertParity(self, serializer_class, queryset):
+        compiled = compile_serializer(serializer_class)
+        self.assertIsNotNone(compiled, f"{serializer_class.__name__} did not compile")
+        rows = list(compiled.get_queryset(queryset))
+        self.assertEqual(compiled.serialize(rows, self.alias), serializer_class(queryset, many=True).data)
+
+    def test_list_serializers_match_drf(self):
+        leads = LeadModel.objects.using(self.alias).order_by('created_at')
+        clients = ClientModel.objects.using(self.alias).order_by('email')
+        for serializer_class, queryset in (
+            (DesignationSerializer, DesignationModel.objects.using(self.alias).order_by('name')),
+            (ClientSerializer, clients),
+            (ClientUpsertSerializer, clients),
+            (LeadSerializer, leads),
+            (LeadClientSerializer, leads),
+            (LeadProfileSerializer, leads),
+            (ClientActivitySerializer, clients),
+        ):
+            with self.subTest(serializer=serializer_class.__name__):
+                self.assertParity(serializer_class, queryset)
+
+    def test_nested_many_renders_each_parents_children(self):
+        compiled = compile_serializer(LeadClientSerializer)
+        data = compiled.serialize(list(compiled.get_queryset(LeadModel.objects.using(self.alias))), self.alias)
+        self.assertEqual(len(data[0]['clients']), 3)
+
+    def test_uncompilable_serializers_fall_back_to_drf(self):
+        self.assertIsNone(compile_serializer(ClientGreetingSerializer))
+
+        class CustomRepresentation(ClientSerializer):
+            def to_representation(self, instance):
+                return {'email': instance.email}
+
+        self.assertIsNone(compile_serializer(CustomRepresentation))
+
+        # The list view answers the same either way
+        headers = self.auth_headers(self.lead.user)
+        fast = self.client.get('/clients/', **headers).json()
+        self.clear_caches()
+        with mock.patch.object(ClientListCreateAPIView, 'use_fast_serializer', False):
+            slow = self.client.get('/clients/', **headers).json()
+        self.assertEqual(len(fast['results']), 3)
+        self.assertEqual(fast, slow)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryPlannerTests(ShardedDataMixin, ShardedTestCase):
+    """The planned queryset renders the same data in a fixed number of queries, whatever the row count"""
+
+    def setUp(self):
+        designation = self.create_designation()
+        _user, self.lead = self.create_lead('planner@example.com', designation, clients=3)
+        self.alias = self.lead._state.db
+        self.leads = LeadModel.objects.using(self.alias).order_by('created_at')
+        self.clients = ClientModel.objects.using(self.alias).order_by('email')
+
+    def assertPlanned(self, serializer_class, queryset, queries):
+        expected = serializer_class(queryset, many=True).data
+        planned = query_planner.apply(queryset, serializer_class)
+        with self.assertNumQueries(queries, using=self.alias):
+            self.assertEqual(serializer_class(planned, many=True).data, expected)
+        return planned
+
+    def test_plain_columns_are_loaded_with_only(self):
+        planned = self.assertPlanned(ClientSerializer, self.clients, 1)
+        self.assertEqual(
+            query_planner.plan(ClientSerializer).get_only(), ['email', 'full_name', 'id', 'partition_key', 'phone']
+        )
+        self.assertIn('status', planned[0].get_deferred_fields())
+
+    def test_foreign_keys_rendered_as_pks_are_not_joined(self):
+        planned = self.assertPlanned(LeadSerializer, self.leads, 1)
+        self.assertEqual(planned.query.select_related, False)
+        self.assertEqual(
+            query_planner.plan(LeadSerializer).get_only(), ['designation', 'experience', 'id', 'partition_key', 'salary']
+        )
+
+    def test_dotted_sources_and_nested_serializers_are_joined(self):
+        planned = self.assertPlanned(LeadProfileSerializer, self.leads, 1)
+        self.assertEqual(planned.query.select_related, {'designation': {}, 'user': {}})
+        self.assertEqual(
+            query_planner.plan(LeadProfileSerializer).get_only(),
+            ['created_at', 'designation', 'designation__name', 'id', 'partition_key', 'salary', 'user', 'user__email']
+        )
+
+    def test_reverse_relations_are_prefetched_with_their_own_plan(self):
+        planned = self.assertPlanned(LeadClientSerializer, self.leads, 2)
+        [prefetch] = planned._prefetch_related_lookups
+        self.assertEqual(prefetch.prefetch_to, 'managed_clients')
+        self.assertEqual(
+            sorted(prefetch.queryset.query.deferred_loading[0]),
+            ['email', 'full_name', 'id', 'manage_by', 'partition_key', 'phone']
+        )
+
+    def test_method_fields_load_the_whole_row(self):
+        planned = self.assertPlanned(ClientGreetingSerializer, self.clients, 1)
+        self.assertEqual(planned[0].get_deferred_fields(), set())
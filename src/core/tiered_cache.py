@@ -0,0 +1,147 @@
+# tiered_cache.py
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class TieredCache:
+    """
+    Two-tier cache: in-process L1 (the `local_memory` LocMem alias, a
+    size-bounded LRU) in front of the shared L2 (the `default` Redis alias).
+
+    Reads that hit L1 do no network I/O at all. Every delete/incr is broadcast
+    over Redis pub/sub so the other workers drop their L1 copy; if the
+    broadcast channel is unavailable, the short L1 TTL bounds staleness.
+    """
+    channel = 'cache:l1:invalidate'
+    clear_all = '*'
+
+    def __init__(self, l1_alias='local_memory', l2_alias='default', l1_timeout=None):
+        self.l1_alias = l1_alias
+        self.l2_alias = l2_alias
+        self._l1_timeout = l1_timeout
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    @property
+    def l1(self):
+        return caches[self.l1_alias]
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    @property
+    def l1_timeout(self):
+        if self._l1_timeout is None:
+            return getattr(settings, 'CACHE_TTL', {}).get('L1', 60)
+        return self._l1_timeout
+
+    def get_redis_connection(self):
+        """Raw Redis client behind the L2 alias, or None for non-Redis backends"""
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection(self.l2_alias)
+        except (ImportError, NotImplementedError):
+            return None
+
+    def get(self, key, default=None):
+        self.ensure_listener()
+        value = self.l1.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        value = self.l2.get(key, MISSING)
+        if value is MISSING:
+            return default
+        self.l1.set(key, value, self.l1_timeout)
+        return value
+
+    def get_many(self, keys):
+        self.ensure_listener()
+        found = self.l1.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            from_l2 = self.l2.get_many(missing)
+            if from_l2:
+                self.l1.set_many(from_l2, self.l1_timeout)
+            found.update(from_l2)
+        return found
+
+    def set(self, key, value, timeout=None):
+        self.l2.set(key, value, timeout)
+        l1_timeout = self.l1_timeout if timeout is None else min(timeout, self.l1_timeout)
+        self.l1.set(key, value, l1_timeout)
+
+    def add(self, key, value, timeout=None):
+        # Used for locks and counters: the shared tier is the source of truth
+        return self.l2.add(key, value, timeout)
+
+    def incr(self, key, delta=1):
+        value = self.l2.incr(key, delta)
+        self.broadcast(key)
+        return value
+
+    def delete(self, key):
+        self.l2.delete(key)
+        self.broadcast(key)
+
+    def broadcast(self, key):
+        """Drop `key` from this worker's L1 and tell every other worker to do the same"""
+        self.l1.delete(key)
+        connection = self.get_redis_connection()
+        if connection is None:
+            return
+        try:
+            connection.publish(self.channel, key)
+        except Exception as e:
+            logger.warning(f"L1 invalidation broadcast failed for {key}: {str(e)}")
+
+    def ensure_listener(self):
+        if self._listener is not None:
+            return
+        with self._listener_lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(
+                target=self.listen, name='tiered-cache-listener', daemon=True
+            )
+            self._listener.start()
+
+    def listen(self):
+        """Apply invalidations broadcast by other workers to this worker's L1"""
+        backoff = 1
+        while True:
+            connection = self.get_redis_connection()
+            if connection is None:
+                return
+
+            try:
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                backoff = 1
+                for message in pubsub.listen():
+                    key = message['data']
+                    if isinstance(key, bytes):
+                        key = key.decode()
+                    if key == self.clear_all:
+                        self.l1.clear()
+                    else:
+                        self.l1.delete(key)
+            except Exception as e:
+                logger.warning(f"L1 invalidation listener disconnected: {str(e)}")
+
+            # Messages may have been missed while disconnected
+            self.l1.clear()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+designation_cache = TieredCache()
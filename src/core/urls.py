@@ -6,7 +6,14 @@ from .apiviewset import (
     LeadListCreateAPIView,
     LeadDetailAPIView,
     ClientListCreateAPIView,
+    ClientBulkUpsertAPIView,
+    ClientStatusTransitionAPIView,
     ClientDetailAPIView,
+    AsyncLeadListCreateAPIView,
+    AsyncLeadDetailAPIView,
+    AsyncClientListCreateAPIView,
+    AsyncClientDetailAPIView,
+    MetricsView,
 )
 
 # Using Router for better URL management
@@ -15,13 +22,24 @@ router = DefaultRouter()
 urlpatterns = [
     # Designation endpoints
     path('designations/', DesignationListAPIView.as_view(), name='designation-list'),
-    path('designations/<int:pk>/', DesignationDetailAPIView.as_view(), name='designation-detail'),
+    path('designations/<uuid:pk>/', DesignationDetailAPIView.as_view(), name='designation-detail'),
 
     # Lead endpoints
     path('leads/', LeadListCreateAPIView.as_view(), name='lead-list-create'),
-    path('leads/<int:pk>/', LeadDetailAPIView.as_view(), name='lead-detail'),
+    path('leads/<uuid:pk>/', LeadDetailAPIView.as_view(), name='lead-detail'),
 
     # Client endpoints
     path('clients/', ClientListCreateAPIView.as_view(), name='client-list-create'),
-    path('clients/<int:pk>/', ClientDetailAPIView.as_view(), name='client-detail'),
-]
\ No newline at end of file
+    path('clients/bulk-upsert/', ClientBulkUpsertAPIView.as_view(), name='client-bulk-upsert'),
+    path('clients/bulk-status/', ClientStatusTransitionAPIView.as_view(), name='client-bulk-status'),
+    path('clients/bulk-status/<str:job_id>/', ClientStatusTransitionAPIView.as_view(), name='client-bulk-status-detail'),
+    path('clients/<uuid:pk>/', ClientDetailAPIView.as_view(), name='client-detail'),
+
+    # Async variants of the lead and client endpoints, for ASGI deployments
+    path('async/leads/', AsyncLeadListCreateAPIView.as_view(), name='async-lead-list-create'),
+    path('async/leads/<uuid:pk>/', AsyncLeadDetailAPIView.as_view(), name='async-lead-detail'),
+    path('async/clients/', AsyncClientListCreateAPIView.as_view(), name='async-client-list-create'),
+    path('async/clients/<uuid:pk>/', AsyncClientDetailAPIView.as_view(), name='async-client-detail'),
+
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+]
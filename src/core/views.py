@@ -6,7 +6,7 @@ from rest_framework.permissions import IsAuthenticated,IsAuthenticatedOrReadOnly
 from .models import DesignationModel,LeadModel,ClientModel
 from .serializers import DesignationSerializer,LeadSerializer,ClientSerializer,LeadClientSerializer
 from .permission_mixin import AuthenticationBasePermissionMixin
-from django.core.cache import cache
+from .response_cache import response_cache
 from .tasks import send_email_task, send_welcome_email
 from django.contrib.auth.decorators import login_required
 from rest_framework.views import APIView
@@ -15,17 +15,14 @@ class DesignationApiView(APIView):
     permission_classes = [IsAuthenticated]  # Fixed duplicate permission
 
     def get(self, request):
-        cache_key = 'designation_list'
-        instance = cache.get(cache_key)
-
-        if instance is None:
-            # Using select_related/prefetch_related if there are foreign keys
+        # Cached as rendered JSON bytes: hits skip unpickling models and serializing
+        return response_cache.get_or_set(
+            'designation_list',
             # Using indexed field 'name' for ordering
-            instance = list(DesignationModel.objects.all().order_by('name'))
-            cache.set(cache_key, instance, timeout=3600)
-
-        serializer = DesignationSerializer(instance, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            lambda: DesignationSerializer(DesignationModel.objects.all().order_by('name'), many=True).data,
+            timeout=3600,
+            request=request
+        )
 
 
 class DesignationAPIViewRetrieve(APIView):
@@ -53,16 +50,16 @@ class LeadCreateRetrieveAPIView(APIView):
         user = request.user
         cache_key = f'user_leads_{user.id}'
 
-        instance = cache.get(cache_key)
-        if instance is None:
-            # Using indexed field 'user' and ordering by indexed 'created_at'
-            instance = LeadModel.objects.filter(user=user).select_related(
-                'user'
-            ).order_by('-created_at')
-            cache.set(cache_key, list(instance), timeout=300)  # 5 minutes cache
-
-        serializer = LeadClientSerializer(instance=instance, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Using indexed field 'user' and ordering by indexed 'created_at'
+        return response_cache.get_or_set(
+            cache_key,
+            lambda: LeadClientSerializer(
+                LeadModel.objects.for_partition(user.partition_key).filter(user=user).select_related('user').order_by('-created_at'),
+                many=True
+            ).data,
+            timeout=300,  # 5 minutes cache
+            request=request
+        )
 
     def post(self, request, *args, **kwargs):
         try:
@@ -70,7 +67,7 @@ class LeadCreateRetrieveAPIView(APIView):
             if serializer.is_valid():
                 serializer.save(user=request.user)
                 # Invalidate user-specific lead cache
-                cache.delete(f'user_leads_{request.user.id}')
+                response_cache.delete(f'user_leads_{request.user.id}')
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
@@ -89,16 +86,16 @@ class LeadRetrieveUpdateDestroyed(APIView):
 
     def get(self, request, *args, **kwargs):
         cache_key = f'lead_{kwargs["pk"]}'
-        instance = cache.get(cache_key)
+        entry = response_cache.get(cache_key)
 
-        if not instance:
+        if entry is None:
             instance = self.get_object(kwargs['pk'])
             if not instance:
                 return Response(status=status.HTTP_404_NOT_FOUND)
-            cache.set(cache_key, instance, timeout=300)  # Cache individual lead
+            # Cache individual lead as rendered bytes
+            entry = response_cache.set(cache_key, LeadSerializer(instance=instance).data, timeout=300)
 
-        serializer = LeadSerializer(instance=instance)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return response_cache.to_response(entry, request)
 
     def put(self, request, *args, **kwargs):
         instance = self.get_object(kwargs['pk'])
@@ -109,8 +106,7 @@ class LeadRetrieveUpdateDestroyed(APIView):
         if serializer.is_valid():
             serializer.save()
             # Invalidate caches
-            cache.delete(f'lead_{kwargs["pk"]}')
-            cache.delete(f'user_leads_{request.user.id}')
+            response_cache.delete(f'lead_{kwargs["pk"]}', f'user_leads_{request.user.id}')
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -122,8 +118,7 @@ class LeadRetrieveUpdateDestroyed(APIView):
         user_id = request.user.id
         instance.delete()
         # Invalidate caches
-        cache.delete(f'lead_{kwargs["pk"]}')
-        cache.delete(f'user_leads_{user_id}')
+        response_cache.delete(f'lead_{kwargs["pk"]}', f'user_leads_{user_id}')
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -134,23 +129,23 @@ class ClientCreateRetrieveAPIView(APIView):
         user = request.user
         cache_key = f'user_clients_{user.id}'
 
-        instance = cache.get(cache_key)
-        if instance is None:
-            # Using indexed field 'manage_by' and ordering by indexed 'created_at'
-            instance = ClientModel.objects.filter(manage_by=user).select_related(
-                'manage_by'
-            ).order_by('-created_at')
-            cache.set(cache_key, list(instance), timeout=300)
-
-        serializer = ClientSerializer(instance=instance, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Using indexed field 'manage_by' and ordering by indexed 'created_at'
+        return response_cache.get_or_set(
+            cache_key,
+            lambda: ClientSerializer(
+                ClientModel.objects.for_partition(user.partition_key).filter(manage_by__user=user).select_related('manage_by').order_by('-created_at'),
+                many=True
+            ).data,
+            timeout=300,
+            request=request
+        )
 
     def post(self, request, *args, **kwargs):
         serializer = ClientSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save(manage_by=request.user)
             # Invalidate user-specific client cache
-            cache.delete(f'user_clients_{request.user.id}')
+            response_cache.delete(f'user_clients_{request.user.id}')
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -167,16 +162,15 @@ class ClientRetrieveUpdateDestroyed(APIView):
 
     def get(self, request, *args, **kwargs):
         cache_key = f'client_{kwargs["pk"]}'
-        instance = cache.get(cache_key)
+        entry = response_cache.get(cache_key)
 
-        if not instance:
+        if entry is None:
             instance = self.get_object(kwargs['pk'])
             if not instance:
                 return Response(status=status.HTTP_404_NOT_FOUND)
-            cache.set(cache_key, instance, timeout=300)
+            entry = response_cache.set(cache_key, ClientSerializer(instance=instance).data, timeout=300)
 
-        serializer = ClientSerializer(instance=instance)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return response_cache.to_response(entry, request)
 
     def put(self, request, *args, **kwargs):
         instance = self.get_object(kwargs['pk'])
@@ -187,8 +181,7 @@ class ClientRetrieveUpdateDestroyed(APIView):
         if serializer.is_valid():
             serializer.save()
             # Invalidate caches
-            cache.delete(f'client_{kwargs["pk"]}')
-            cache.delete(f'user_clients_{request.user.id}')
+            response_cache.delete(f'client_{kwargs["pk"]}', f'user_clients_{request.user.id}')
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -200,8 +193,7 @@ class ClientRetrieveUpdateDestroyed(APIView):
         user_id = request.user.id
         instance.delete()
         # Invalidate caches
-        cache.delete(f'client_{kwargs["pk"]}')
-        cache.delete(f'user_clients_{user_id}')
+        response_cache.delete(f'client_{kwargs["pk"]}', f'user_clients_{user_id}')
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
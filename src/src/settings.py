@@ -20,12 +20,15 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'core',
+    'account',
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
     'django_celery_results',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryInstrumentationMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -33,6 +36,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
 ]
 
 ROOT_URLCONF = 'src.urls'
@@ -63,6 +67,59 @@ DATABASES = {
     }
 }
 
+# Sharding: logical partitions are mapped onto these database aliases with a
+# consistent-hash ring (core.sharding.ShardMap). Aliases missing from
+# DATABASES are skipped, so a single-database setup routes everything to
+# 'default'.
+SHARDING = {
+    'PARTITION_COUNT': 10,
+    'SHARDS': {'partition_0': 1, 'partition_1': 1},  # alias: weight
+    'VIRTUAL_NODES': 64,
+    'HASH': 'crc32',  # or 'xxhash' (requires the xxhash package)
+    # Rows written before partition_for() may carry another key: email lookups that miss their
+    # partition retry unfiltered. Turn off once `manage.py backfill_partition_keys` has run
+    'LEGACY_PARTITION_KEYS': True,
+    # Threads for cross-shard reads (default 4 per shard). Each keeps a connection to every shard it
+    # reads from, reused for CONN_MAX_AGE seconds, so budget the databases' max_connections for it
+    'SCATTER_WORKERS': None,
+}
+
+DATABASE_ROUTERS = ['core.database_router.PartitionRouter']
+
+# Read replicas per primary alias, as {replica_alias: weight}. Aliases missing
+# from DATABASES are skipped.
+DATABASE_REPLICAS = {
+    'default': {'read_replica_1': 1},
+}
+
+REPLICA_ROUTING = {
+    'MAX_LAG_SECONDS': 5,        # Replicas further behind are taken out of rotation
+    'HEALTH_CHECK_INTERVAL': 10,  # Seconds between lag probes per replica
+    'PIN_SECONDS': 5,            # Read-your-writes window after a write
+    'PIN_COOKIE': 'db_pin',
+}
+
+# Always-on query instrumentation (core.middleware.QueryInstrumentationMiddleware)
+QUERY_INSTRUMENTATION = {
+    'N_PLUS_ONE_THRESHOLD': 5,     # Same statement this many times in one request is logged as N+1
+    'SLOW_REQUEST_SECONDS': 1.0,
+    'EXPLAIN_SAMPLE_RATE': 0.1,    # Share of slow requests whose slowest SELECT is EXPLAINed
+    'METRICS_ALLOWED_IPS': ['127.0.0.1', '::1'],  # Scrapers allowed on /metrics/ (staff always are)
+    'STRICT': False,               # Raise on N+1s and query_budget overruns (enabled in test settings)
+    'SERVER_TIMING': False,        # db Server-Timing header for every client, not only DEBUG/staff/METRICS_ALLOWED_IPS
+}
+
+# Negotiated response compression (core.middleware.CompressionMiddleware).
+# br and zstd are used when the brotli/zstandard packages are installed.
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,                      # Smaller bodies go out as they are
+    'OFFLOAD_SIZE': 64 * 1024,             # ASGI: larger bodies are compressed off the event loop
+    'ENCODINGS': ['zstd', 'br', 'gzip'],   # Server preference when q-values tie
+    'LEVELS': {'zstd': 3, 'br': 5, 'gzip': 6},
+    'CACHE_ALIAS': 'default',              # Compressed variants of ETagged responses
+    'CACHE_TIMEOUT': 300,
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -83,9 +140,44 @@ AUTH_PASSWORD_VALIDATORS = [
 AUTH_USER_MODEL = 'core.CustomUser'  # app_name.ModelName
 
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    'account.backends.PooledModelBackend',
+]
+
+# account.throttling: sliding-window limits on the credential endpoints,
+# checked before any database lookup or password hash.
+# RATES: scope -> {key kind: (attempts, window seconds)}; kinds are ip, subnet and email.
+LOGIN_THROTTLE = {
+    'CACHE_ALIAS': 'default',  # Redis runs one Lua script per attempt; other backends use add/incr
+    'IPV4_SUBNET': 24,
+    'IPV6_SUBNET': 64,
+    'RATES': {  # Every attempt counts
+        'login': {'ip': (10, 60), 'subnet': (50, 60)},
+        'register': {'ip': (5, 3600), 'subnet': (20, 3600)},
+    },
+    'FAILURE_RATES': {  # Only failed attempts count, so well above the IP limit: anyone can fail as anyone
+        'login': {'email': (50, 900)},
+    },
+}
+
+# The first hasher hashes new passwords; logins rehash the others to it
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
 ]
 
+# account.hashing.HashingExecutor: password hashing off the request threads
+PASSWORD_HASHING_POOL = {
+    'ENABLED': True,
+    'WORKERS': 2,           # Processes per web worker: a host runs web workers x WORKERS hashing processes
+    'QUEUE_SIZE': None,     # Hashes waiting behind the running ones; None means two per process
+    'QUEUE_TIMEOUT': 0.5,   # Seconds to wait for a slot before answering 429
+    'RETRY_AFTER': 1,       # Retry-After on those 429s
+    'START_METHOD': 'spawn',  # Forking a threaded web worker can copy held locks
+}
+
 
 LANGUAGE_CODE = 'en-us'
 
@@ -116,9 +208,14 @@ CACHES = {
         },
         'KEY_PREFIX': 'crm_1m',
     },
+    # In-process L1 in front of 'default' for read-heavy data (LRU, size-bounded)
     'local_memory': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 10,  # Evict the least recently used 10% when full
+        },
     }
 }
 
@@ -132,6 +229,7 @@ CACHE_TTL = {
     'LEAD_LIST': 300,      # 5 minutes
     'CLIENT_LIST': 300,    # 5 minutes
     'DESIGNATION_LIST': 7200,  # 2 hours
+    'L1': 60,  # Upper bound on in-process staleness if an invalidation broadcast is missed
 }
 
 SESSION_CACHE_ALIAS = 'session'
@@ -140,7 +238,18 @@ SESSION_CACHE_ALIAS = 'session'
 # authentication setup
 REST_FRAMEWORK = {
 
-'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',)
+'DEFAULT_AUTHENTICATION_CLASSES': ('account.authentication.CachedJWTAuthentication',),
+
+# orjson-backed JSON; both fall back to DRF's stdlib json when orjson is not installed
+'DEFAULT_RENDERER_CLASSES': (
+    'core.renderers.FastJSONRenderer',
+    'rest_framework.renderers.BrowsableAPIRenderer',
+),
+'DEFAULT_PARSER_CLASSES': (
+    'core.parsers.FastJSONParser',
+    'rest_framework.parsers.FormParser',
+    'rest_framework.parsers.MultiPartParser',
+),
 
 }
 
@@ -148,6 +257,28 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': True,
+    'TOKEN_REFRESH_SERIALIZER': 'account.serializers.WatermarkTokenRefreshSerializer',
+}
+
+# account.authentication.CachedJWTAuthentication
+JWT_AUTH_CACHE = {
+    'PRINCIPAL_TIMEOUT': 60,          # Seconds a user's id/is_active/is_staff/partition_key stay cached
+    'DENYLIST_CACHE_ALIAS': 'default',  # Revoked jtis; Redis also carries the Bloom filter sync
+    'BLOOM_CAPACITY': 100000,         # Revoked, unexpired jtis per filter before false positives rise
+    'BLOOM_ERROR_RATE': 0.001,
+    'BLOOM_REBUILD_SECONDS': 300,     # Rebuild from Redis so expired jtis drop out
+    'BROADCAST_RETRIES': 3,           # Retries before a logout whose revocation can't be published fails with 503
+    'DEFER_LOGOUT_ALL_BLACKLIST': True,  # Logout-all blacklists refresh tokens in Celery; the watermark is immediate
+}
+
+# account.pruning.ExpiredTokenPruner, run by CELERY_BEAT_SCHEDULE
+TOKEN_BLACKLIST_PRUNING = {
+    'GRACE_SECONDS': 3600,         # Keep rows this long past expiry
+    'BATCH_SIZE': 1000,            # Starting rows per DELETE transaction
+    'MAX_BATCH_SIZE': 10000,
+    'TARGET_BATCH_SECONDS': 0.1,   # Batch size adapts so no transaction holds locks much longer
+    'THROTTLE_RATIO': 1.0,         # Sleep this multiple of each batch's time (1.0: at most half the DB time)
+    'MAX_RUNTIME_SECONDS': 60,     # Per task run; it then re-queues itself from its cursor
 }
 
 # Celery Configuration
@@ -157,6 +288,12 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    'prune-expired-jwt-tokens': {
+        'task': 'account.tasks.prune_expired_tokens_task',
+        'schedule': 60 * 60,  # Hourly; a run that is still going makes the next one a no-op
+    },
+}
 
 # Email Configuration (example)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
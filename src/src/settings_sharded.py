@@ -0,0 +1,50 @@
+"""
+Settings for exercising the PartitionRouter locally: every shard is its own
+SQLite database, standing in for the PostgreSQL shards used in production.
+
+    python manage.py test --settings=src.settings_sharded
+"""
+from .settings import *  # noqa: F401,F403
+
+SHARD_ALIASES = ['partition_0', 'partition_1', 'partition_2']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    **{
+        alias: {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / f'{alias}.sqlite3',
+            'CONN_MAX_AGE': 60,  # Persistent, like the production shards; scatter-gather threads reuse them
+        }
+        for alias in SHARD_ALIASES
+    },
+}
+
+SHARDING = {
+    **SHARDING,
+    'SHARDS': {alias: 1 for alias in SHARD_ALIASES},
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sharded-default',
+    },
+    'local_memory': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sharded-l1',
+    },
+    'session': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sharded-session',
+    },
+}
+
+# Build shard schemas straight from the current models
+MIGRATION_MODULES = {'core': None}
+
+# Fail tests on N+1s and on views going over their query_budget
+QUERY_INSTRUMENTATION = {**QUERY_INSTRUMENTATION, 'STRICT': True}